@@ -103,14 +103,14 @@ async def _(request: Request, path: str = ""):
 
 
 class LagrangeOB11Client(Lagrange):
-    def __init__(self, uin: int, sign_url: str):
+    def __init__(self, uin: int, sign_url: Union[str, list[str]]):
         super().__init__(uin, sign_url=sign_url)
 
     async def run(self):
         with self.im as im:
             self.client = Client(self.uin, self.info, im.device, im.sig_info, self.sign, use_ipv6=Config.v6)
-            for event, handler in self.events.items():
-                self.client.events.subscribe(event, handler)
+            self.client.msg_push_filter.ignore_self = Config.ignore_self  # checked before the message is decoded
+            self._bind_events(self.client)
             self.client.connect()
             status = await self.login(self.client)
         if not status:
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the binary layer,
+run from the repository root: python -m benchmarks.<name>
+"""
@@ -0,0 +1,103 @@
+"""
+Protocol codec microbenchmarks over the synthetic fixtures
+
+python -m benchmarks.codec [-k FILTER] [--json PATH]
+"""
+
+import argparse
+import io
+from typing import Callable
+
+from lagrange.client.highway.frame import read_frame
+from lagrange.client.wtlogin.sso import parse_sso_frame, parse_sso_header
+from lagrange.pb.highway.head import HighwayTransRespHead
+from lagrange.pb.message.msg_push import MsgPush
+from lagrange.pb.service.group import GetGrpMemberInfoRsp
+from lagrange.pb.service.oidb import OidbResponse
+from lagrange.utils.binary.protobuf import proto_decode, proto_encode
+from lagrange.utils.crypto import tea
+
+from . import runner
+from .fixtures import D2_KEY, load
+
+MSG_PUSH = ("msg_push_text", "msg_push_image", "msg_push_quote", "msg_push_mini_app")
+
+
+def _member_list(data: bytes) -> GetGrpMemberInfoRsp:
+    return GetGrpMemberInfoRsp.decode(OidbResponse.decode(data).data)
+
+
+def _read_msg_push(data: bytes):
+    return MsgPush.decode(data).body.message.body.content
+
+
+def cases() -> list[tuple[str, Callable[[], object], int]]:
+    ret: list[tuple[str, Callable[[], object], int]] = []
+
+    def add(name: str, fn: Callable[[], object], size: int):
+        ret.append((name, fn, size))
+
+    for name in MSG_PUSH:
+        data = load(name)
+        decoded = proto_decode(data)
+        obj = MsgPush.decode(data)
+        full = MsgPush.decode(data)
+        _ = full.body.message.body  # touch the lazy fields so encode walks the decoded tree
+        add(f"proto_decode[{name}]", lambda d=data: proto_decode(d), len(data))
+        add(f"proto_encode[{name}]", lambda d=decoded.proto: proto_encode(d), len(data))
+        add(f"MsgPush.decode[{name}]", lambda d=data: _read_msg_push(d), len(data))
+        add(f"MsgPush.decode(head)[{name}]", lambda d=data: MsgPush.decode(d).body.content_head, len(data))
+        add(f"MsgPush.encode[{name}]", lambda o=full: o.encode(), len(data))
+        add(f"MsgPush.encode(untouched)[{name}]", lambda o=obj: o.encode(), len(data))
+
+    data = load("member_list_page")
+    page = _member_list(data)
+    add("proto_decode[member_list_page]", lambda d=data: proto_decode(d), len(data))
+    add("OidbResponse+GetGrpMemberInfoRsp.decode", lambda d=data: _member_list(d), len(data))
+    add("GetGrpMemberInfoRsp.encode", page.encode, len(data))
+
+    data = load("highway_resp_frame")
+    add("read_frame[highway_resp_frame]", lambda d=data: read_frame(io.BytesIO(d)), len(data))
+    head = read_frame(io.BytesIO(data))[0]
+    add("HighwayTransRespHead.encode", head.encode, len(data))
+    add("HighwayTransRespHead.decode", lambda b=head.encode(): HighwayTransRespHead.decode(b), len(data))
+
+    for name in ("sso_push", "sso_member_list_zlib"):
+        data = load(name)[4:]  # strip the length prefix, like the read loop does
+        _, _, frame = parse_sso_header(data, D2_KEY)
+        add(f"parse_sso_header[{name}]", lambda d=data: parse_sso_header(d, D2_KEY), len(data))
+        add(f"parse_sso_frame[{name}]", lambda f=frame: parse_sso_frame(f), len(frame))
+
+    for size in (64, 1024, 16384):
+        plain = bytes(range(256)) * (size // 256) or bytes(range(size))
+        enc = tea.qqtea_encrypt(plain, D2_KEY)
+        add(f"qqtea_encrypt[{size}]", lambda p=plain: tea.qqtea_encrypt(p, D2_KEY), size)
+        add(f"qqtea_decrypt[{size}]", lambda e=enc: tea.qqtea_decrypt(e, D2_KEY), size)
+
+    return ret
+
+
+def tea_backend() -> str:
+    return tea.TEA_BACKEND
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.codec")
+    parser.add_argument("-k", dest="filter", default="", help="only run cases whose name contains FILTER")
+    parser.add_argument("--json", metavar="PATH", help="write machine readable results, - for stdout")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing round")
+    args = parser.parse_args()
+
+    results = [
+        runner.run(name, fn, size=size, min_time=args.min_time)
+        for name, fn, size in cases()
+        if args.filter in name
+    ]
+    if args.json:
+        runner.dump_json(args.json, results, tea_backend=tea_backend())
+    if args.json != "-":
+        runner.print_table(results)
+
+
+if __name__ == "__main__":
+    main()
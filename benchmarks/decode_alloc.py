@@ -0,0 +1,79 @@
+"""
+Bytes allocated per decoded MsgPush
+
+python -m benchmarks.decode_alloc
+"""
+
+from lagrange.pb.message.heads import ContentHead, Grp, ResponseHead
+from lagrange.pb.message.msg import Message
+from lagrange.pb.message.msg_push import MsgPush, MsgPushBody
+from lagrange.pb.message.rich_text import Elems, RichText
+from lagrange.pb.message.rich_text.elems import ExtraInfo, Face, Text
+from lagrange.utils.binary.protobuf import ProtoStruct, proto_decode
+from lagrange.utils.binary.reader import Reader
+
+from .runner import measure_alloc
+
+
+def build_msg_push(elem_count: int = 30) -> bytes:
+    elems = []
+    for i in range(elem_count // 3):
+        elems.append(Elems(text=Text(string=f"hello world {i} " * 8)))
+        elems.append(Elems(face=Face(index=i)))
+        elems.append(Elems(extra_info=ExtraInfo(nickname="nickname", group_card="card", level=3)))
+    return MsgPush(
+        body=MsgPushBody(
+            response_head=ResponseHead(
+                from_uin=1234567,
+                from_uid="u_0123456789abcdef",
+                to_uin=7654321,
+                rsp_grp=Grp(gid=999999, sender_name="a"),
+            ),
+            content_head=ContentHead(type=82, seq=100, timestamp=1700000000, rand=5),
+            message=Message(body=RichText(content=elems)),
+        )
+    ).encode()
+
+
+def measure(fn) -> int:
+    return measure_alloc(fn, rounds=200)[0]
+
+
+def _read_nested(data: bytes, zero_copy: bool):
+    """unwrap 16 bytes of header per level, like nested messages do"""
+    levels = []
+    reader = Reader(data, zero_copy=zero_copy)
+    while reader.remain > 16:
+        reader.read_bytes(16)
+        levels.append(reader.read_bytes(reader.remain))
+        reader = Reader(levels[-1], zero_copy=zero_copy)
+    return levels
+
+
+def _decode_all(data: bytes):
+    return MsgPush.decode(data).body.message.body.content
+
+
+def main():
+    data = build_msg_push()
+    print(f"MsgPush payload: {len(data)} bytes")
+
+    rows = [
+        ("Reader, nested (copy)", lambda: _read_nested(data, False)),
+        ("Reader, nested (zero_copy)", lambda: _read_nested(data, True)),
+        ("proto_decode", lambda: proto_decode(data)),
+        ("MsgPush.decode, head only", lambda: MsgPush.decode(data).body.content_head.type),
+        ("MsgPush.decode, full", lambda: _decode_all(data)),
+    ]
+    for name, fn in rows:
+        print(f"{name:<36}{measure(fn):>10} bytes")
+
+    ProtoStruct.__proto_compiled__ = False
+    try:
+        print(f"{'MsgPush.decode, full (reflective)':<36}{measure(lambda: _decode_all(data)):>10} bytes")
+    finally:
+        ProtoStruct.__proto_compiled__ = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Event handling under a burst of pushes
+
+python -m benchmarks.event_burst [--events N] [--concurrency N]
+
+emits N group messages at once to a handler that takes a while (like forwarding to OneBot)
+and reports live handler tasks, peak traced memory and drops of each `Events` mode
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from lagrange.client.event import Events, Overflow
+from lagrange.client.events.group import GroupMessage, GroupNudge
+
+
+def _message(seq: int) -> GroupMessage:
+    return GroupMessage(
+        uin=10000 + seq % 50,
+        uid="u_" + "x" * 22,
+        seq=seq,
+        time=int(time.time()),
+        rand=seq,
+        grp_id=123456,
+        grp_name="bench",
+        nickname="member",
+        sub_id=0,
+        sender_type=0,
+        msg="hello " * 20,
+        msg_chain=[],
+    )
+
+
+async def _handler(_, event):
+    await asyncio.sleep(0.001)
+
+
+async def _run(events: Events, count: int) -> dict:
+    events.subscribe(GroupMessage, _handler)
+    events.subscribe(GroupNudge, _handler)
+    tracemalloc.start()
+    peak_tasks = 0
+    for seq in range(count):
+        await events.dispatch(_message(seq), None)  # type: ignore
+        peak_tasks = max(peak_tasks, len(asyncio.all_tasks()))
+    while events.running or events.queue_depth:
+        await asyncio.sleep(0.001)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    events.stop()
+    return {"tasks": peak_tasks, "peak": peak, "dropped": events.stats.dropped}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.event_burst")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    modes = {
+        "unbounded": lambda: Events(),
+        "bounded, block": lambda: Events(args.concurrency, overflow=Overflow.BLOCK),
+        "bounded, drop oldest": lambda: Events(args.concurrency, overflow=Overflow.DROP_OLDEST),
+    }
+    for name, factory in modes.items():
+        r = asyncio.run(_run(factory(), args.events))
+        print(
+            f"{name:<22} peak tasks {r['tasks']:>6}, "
+            f"peak {r['peak'] / 2**20:6.2f} MiB, dropped {r['dropped']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Synthetic protocol payloads for the benchmarks
+
+these are not captured traffic, the builders below assemble them from the pb structs
+in the shape of real pushes and responses (field layout, sizes, nesting) with made-up content;
+the .bin files next to this module are their output, regenerate them after a pb layout change with:
+    python -m benchmarks.fixtures
+"""
+
+import json
+import zlib
+from pathlib import Path
+from typing import Callable
+
+from lagrange.client.highway.frame import write_frame
+from lagrange.client.packet import PacketBuilder
+from lagrange.pb.highway.head import DataHighwayHead, HighwayTransRespHead, SegHead
+from lagrange.pb.message.heads import ContentHead, Grp, ResponseHead
+from lagrange.pb.message.msg import Message
+from lagrange.pb.message.msg_push import MsgPush, MsgPushBody
+from lagrange.pb.message.rich_text import Elems, RichText
+from lagrange.pb.message.rich_text.elems import (
+    CustomFace,
+    ExtraInfo,
+    Face,
+    MiniApp,
+    NotOnlineImage,
+    SrcMsg,
+    SrcMsgArgs,
+    Text,
+)
+from lagrange.pb.service.group import AccountInfo, GetGrpMemberInfoRsp, GetGrpMemberInfoRspBody, MemberInfoName
+from lagrange.pb.service.oidb import OidbResponse
+from lagrange.utils.crypto.tea import qqtea_encrypt
+
+FIXTURE_DIR = Path(__file__).parent
+D2_KEY = bytes(range(16))
+UIN = 1234567
+GRP_ID = 999999
+
+
+def _msg_push(elems: list[Elems], seq: int = 100) -> bytes:
+    elems.append(Elems(extra_info=ExtraInfo(nickname="nickname", group_card="card", level=3)))
+    return MsgPush(
+        body=MsgPushBody(
+            response_head=ResponseHead(
+                from_uin=UIN, from_uid="u_0123456789abcdef", to_uin=7654321, rsp_grp=Grp(gid=GRP_ID, sender_name="a")
+            ),
+            content_head=ContentHead(type=82, seq=seq, timestamp=1700000000, rand=5),
+            message=Message(body=RichText(attrs={3: 5}, content=elems)),
+        )
+    ).encode()
+
+
+def msg_push_text() -> bytes:
+    return _msg_push(
+        [
+            Elems(text=Text(string="short text")),
+            Elems(face=Face(index=14)),
+            Elems(text=Text(string="a somewhat longer line of chat text " * 4)),
+        ]
+    )
+
+
+def msg_push_image() -> bytes:
+    md5 = bytes(range(16))
+    return _msg_push(
+        [
+            Elems(
+                not_online_image=NotOnlineImage(
+                    file_path=md5.hex() + ".jpg",
+                    file_len=123456,
+                    download_path="/download?appid=1407&fileid=" + "A" * 120,
+                    image_type=1000,
+                    file_md5=md5,
+                    height=1080,
+                    width=1920,
+                    res_id="/" + md5.hex(),
+                )
+            ),
+            Elems(
+                custom_face=CustomFace(
+                    file_path=md5.hex() + ".png",
+                    fileid=12345678,
+                    file_type=66,
+                    md5=md5,
+                    original_url="/gchatpic_new/0/0-0-" + md5.hex().upper() + "/0",
+                    width=640,
+                    height=480,
+                    size=65536,
+                )
+            ),
+        ]
+    )
+
+
+def msg_push_quote() -> bytes:
+    return _msg_push(
+        [
+            Elems(
+                src_msg=SrcMsg(
+                    seq=99,
+                    uin=UIN,
+                    timestamp=1699999990,
+                    elems=[{1: {1: b"quoted message"}}],
+                    pb_reserved=SrcMsgArgs(uid="u_0123456789abcdef"),
+                )
+            ),
+            Elems(text=Text(string="reply to the quoted message")),
+        ]
+    )
+
+
+def msg_push_mini_app() -> bytes:
+    template = {
+        "app": "com.tencent.miniapp_01",
+        "view": "view_8C8E89B49BE609866298ADDFF2DBABA4",
+        "meta": {"detail_1": {"title": "mini app", "desc": "description " * 8, "url": "https://m.q.qq.com/a/s/x"}},
+        "prompt": "[QQ小程序]mini app",
+        "ver": "1.0.0.19",
+    }
+    return _msg_push([Elems(mini_app=MiniApp(template=b"\x01" + zlib.compress(json.dumps(template).encode())))])
+
+
+def member_list_page(count: int = 50) -> bytes:
+    members = [
+        GetGrpMemberInfoRspBody(
+            account=AccountInfo(uid=f"u_{i:016x}", uin=10000 + i),
+            nickname=f"member {i}",
+            name=MemberInfoName(string=f"card {i}") if i % 2 else None,
+            permission=2 if i == 0 else 1,
+            joined_time=1600000000 + i,
+            last_seen=1700000000 - i,
+            is_admin=i % 10 == 1,
+        )
+        for i in range(count)
+    ]
+    page = GetGrpMemberInfoRsp(grp_id=GRP_ID, body=members, next_key=b"bmV4dF9rZXk=")
+    return OidbResponse(cmd=0xFE7, sub_cmd=3, data=page.encode(), ret_code=0, err_msg="").encode()
+
+
+def highway_resp_frame() -> bytes:
+    head = HighwayTransRespHead(
+        msg_head=DataHighwayHead(uin=str(UIN), command="PicUp.DataUp", seq=1, app_id=1600001604, command_id=1004),
+        seg_head=SegHead(
+            service_id=0,
+            file_size=1 << 20,
+            data_offset=0,
+            data_length=1 << 19,
+            md5=bytes(16),
+            file_md5=bytes(range(16)),
+        ),
+        err_code=0,
+        allow_retry=1,
+        ext_info=b"\x0a\x10" + bytes(16),
+    )
+    return bytes(write_frame(head.encode(), b""))
+
+
+def sso_frame(cmd: str, payload: bytes, compress_type: int = 0, seq: int = 100) -> bytes:
+    """a whole frame as read off the socket, length prefix included, encrypted with D2_KEY"""
+    if compress_type == 1:
+        payload = zlib.compress(payload)
+    frame = PacketBuilder()
+    with frame.length_prefixed("u32"):
+        frame.write_struct("ii", seq, 0)
+        frame.write_string("").write_string(cmd).write_bytes(b"\x02\xb0\x5b\x8b", "u32")
+        frame.write_u32(compress_type)
+        frame.write_u32(0)
+    frame.write_bytes(payload, "u32", False)
+
+    packet = PacketBuilder()
+    with packet.length_prefixed("u32"):
+        packet.write_u32(12).write_u8(1).write_u8(0)
+        packet.write_string(str(UIN))
+        packet.write_bytes(qqtea_encrypt(frame.pack(), D2_KEY))
+    return packet.pack()
+
+
+def sso_push() -> bytes:
+    return sso_frame("trpc.msg.olpush.OlPushService.MsgPush", msg_push_text(), seq=-1)
+
+
+def sso_member_list_zlib() -> bytes:
+    return sso_frame("OidbSvcTrpcTcp.0xfe7_3", member_list_page(), compress_type=1)
+
+
+FIXTURES: dict[str, Callable[[], bytes]] = {
+    "msg_push_text": msg_push_text,
+    "msg_push_image": msg_push_image,
+    "msg_push_quote": msg_push_quote,
+    "msg_push_mini_app": msg_push_mini_app,
+    "member_list_page": member_list_page,
+    "highway_resp_frame": highway_resp_frame,
+    "sso_push": sso_push,
+    "sso_member_list_zlib": sso_member_list_zlib,
+}
+
+
+def load(name: str) -> bytes:
+    path = FIXTURE_DIR / f"{name}.bin"
+    if not path.exists():
+        raise FileNotFoundError(f"fixture {name} not generated, run: python -m benchmarks.fixtures")
+    return path.read_bytes()
+
+
+def record() -> None:
+    for name, build in FIXTURES.items():
+        data = build()
+        (FIXTURE_DIR / f"{name}.bin").write_bytes(data)
+        print(f"{name:<24}{len(data):>8} bytes")
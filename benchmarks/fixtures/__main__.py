@@ -0,0 +1,3 @@
+from . import record
+
+record()
@@ -0,0 +1,126 @@
+"""
+Local stand-in for a highway upload server
+
+takes highway frames over keep-alive http, checks every block against its md5 and puts the file back together:
+    async with HighwayServer(delay=0.02) as server:
+        await session.upload_controller(file, cmd_id=1004, ticket=b"", addrs=[server.addr])
+
+each answer carries a fresh ext_info and ticket tagged with the offset of the block it answers
+"""
+
+import asyncio
+import struct
+from hashlib import md5
+from typing import Optional
+
+from lagrange.client.highway.frame import write_frame
+from lagrange.pb.highway.head import HighwayTransReqHead, HighwayTransRespHead, SegHead
+
+
+class HighwayServer:
+    """
+    delay: seconds before answering a block, a stand-in for the round trip
+    fail_after: drop the connection instead of answering once that many blocks were taken, None never does
+    max_connections: connections beyond that many at once are dropped, like a server rejecting parallel uploads
+    """
+
+    def __init__(
+        self,
+        delay: float = 0.0,
+        fail_after: Optional[int] = None,
+        max_connections: Optional[int] = None,
+        host: str = "127.0.0.1",
+    ):
+        self.delay = delay
+        self.fail_after = fail_after
+        self.max_connections = max_connections
+        self.host = host
+        self.port = 0
+        self.blocks = 0
+        self.connections = 0
+        self.received: dict[int, bytes] = {}  # file offset -> block
+        self.ext_seen: list[bytes] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    @property
+    def addr(self) -> tuple[str, int]:
+        return self.host, self.port
+
+    def assembled(self) -> bytes:
+        return b"".join(self.received[off] for off in sorted(self.received))
+
+    @staticmethod
+    def _answer(req: HighwayTransReqHead, err_code: int = 0) -> bytes:
+        tag = struct.pack("!Q", req.seg_head.data_offset)
+        head = HighwayTransRespHead(
+            msg_head=req.msg_head,
+            seg_head=SegHead(
+                file_size=req.seg_head.file_size,
+                data_offset=req.seg_head.data_offset,
+                data_length=req.seg_head.data_length,
+                ticket=b"ticket" + tag,
+                md5=req.seg_head.md5,
+                file_md5=req.seg_head.file_md5,
+            ),
+            err_code=err_code,
+            allow_retry=1,
+            ext_info=b"ext" + tag,
+        )
+        return bytes(write_frame(head.encode(), b""))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        if self.max_connections is not None and len(self._writers) >= self.max_connections:
+            writer.close()
+            return
+        self._writers.add(writer)
+        try:
+            while await reader.readline():
+                header = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    k, v = line.decode().rstrip("\r\n").split(": ", 1)
+                    header[k.title()] = v
+                frame = await reader.readexactly(int(header.get("Content-Length", 0)))
+                hl, bl = struct.unpack("!II", frame[1:9])
+                req = HighwayTransReqHead.decode(frame[9 : 9 + hl])
+                block = frame[9 + hl : 9 + hl + bl]
+                self.blocks += 1
+                if self.fail_after is not None and self.blocks > self.fail_after:
+                    break
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                ok = md5(block).digest() == req.seg_head.md5 and len(block) == req.seg_head.data_length
+                if ok:
+                    self.received[req.seg_head.data_offset] = block
+                    self.ext_seen.append(req.req_ext_info)
+                body = self._answer(req, 0 if ok else 1)
+                writer.write(
+                    f"HTTP/1.1 200 OK\r\nContent-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def start(self, port: int = 0) -> "HighwayServer":
+        self._server = await asyncio.start_server(self._handle, self.host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            self._server = None
+        for writer in list(self._writers):
+            writer.close()
+        while self._writers:
+            await asyncio.sleep(0)
+
+    async def __aenter__(self) -> "HighwayServer":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
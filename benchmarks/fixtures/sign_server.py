@@ -0,0 +1,121 @@
+"""
+Local stand-in for a sign server
+
+answers the sign protocol with a dummy signature, latency and failures can be dialed in:
+    async with SignServer(delay=0.01) as server:
+        provider = sign_provider(server.url)
+
+python -m benchmarks.fixtures.sign_server [--port N] [--delay SEC] runs one in the foreground
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from typing import Optional
+
+_SIGN = {"sign": "00" * 32, "extra": "", "token": ""}
+
+
+class SignServer:
+    """
+    delay, jitter: seconds before answering
+    fail_rate: share of requests answered with 500
+    down: drop every connection without an answer
+    keep_alive: close a connection idle for that many seconds, like uvicorn's timeout_keep_alive, None never does
+    """
+
+    def __init__(
+        self,
+        delay: float = 0.0,
+        jitter: float = 0.0,
+        fail_rate: float = 0.0,
+        keep_alive: Optional[float] = None,
+        host: str = "127.0.0.1",
+    ):
+        self.delay = delay
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.keep_alive = keep_alive
+        self.down = False
+        self.host = host
+        self.port = 0
+        self.requests = 0
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/sign"
+
+    async def _respond(self, writer: asyncio.StreamWriter, code: int, body: bytes):
+        status = "OK" if code == 200 else "Internal Server Error"
+        writer.write(
+            f"HTTP/1.1 {code} {status}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while not self.down and (await asyncio.wait_for(reader.readline(), self.keep_alive)):
+                header = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    k, v = line.decode().rstrip("\r\n").split(": ", 1)
+                    header[k.title()] = v
+                params = json.loads(await reader.readexactly(int(header.get("Content-Length", 0))))
+                self.requests += 1
+                if self.delay or self.jitter:
+                    await asyncio.sleep(self.delay + random.random() * self.jitter)
+                if self.down:
+                    break
+                if random.random() < self.fail_rate:
+                    await self._respond(writer, 500, b'{"error": "stand-in failure"}')
+                else:
+                    value = {**_SIGN, "cmd": params["cmd"], "seq": params["seq"]}
+                    await self._respond(writer, 200, json.dumps({"platform": "Linux", "value": value}).encode())
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def start(self, port: int = 0) -> "SignServer":
+        self._server = await asyncio.start_server(self._handle, self.host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            self._server = None
+        for writer in list(self._writers):  # lets the handlers see eof and return
+            writer.close()
+        while self._writers:
+            await asyncio.sleep(0)
+
+    async def __aenter__(self) -> "SignServer":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+
+async def _serve(port: int, delay: float):
+    server = await SignServer(delay=delay).start(port)
+    print(f"stand-in sign server on {server.url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fixtures.sign_server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args.port, args.delay))
+    except KeyboardInterrupt:
+        pass
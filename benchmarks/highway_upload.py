@@ -0,0 +1,82 @@
+"""
+Highway uploads against stand-in highway servers with a simulated round trip
+
+python -m benchmarks.highway_upload [--size MiB] [--rtt MS] [--connections N]
+
+compares the block-by-block upload on one connection with the parallel one,
+and checks the servers put the same file back together; given two servers the parallel upload stays on the first,
+the last scenario's server takes one connection at a time, the upload carries on over the one that got through
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from io import BytesIO
+
+from lagrange.client.client import Client
+from lagrange.info import DeviceInfo, SigInfo
+from lagrange.info.app import app_list
+
+from .fixtures import UIN
+from .fixtures.highway_server import HighwayServer
+
+_BS = 1048576
+
+
+async def _scenario(name: str, data: bytes, servers: list[HighwayServer], connections: int):
+    sig = SigInfo.new()
+    sig.tgt = bytes(64)
+    client = Client(UIN, app_list["linux"], DeviceInfo.generate(UIN), sig)
+    session = client._highway
+    for server in servers:
+        await server.start()
+    try:
+        start = time.perf_counter()
+        ext = await session.upload_controller(
+            BytesIO(data),
+            cmd_id=1004,
+            ticket=bytes(16),
+            ext=b"ext-initial",
+            addrs=[s.addr for s in servers],
+            bs=_BS,
+            connections=connections,
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        for server in servers:
+            await server.stop()
+    received = {}
+    for server in servers:
+        received.update(server.received)
+    intact = b"".join(received[off] for off in sorted(received)) == data
+    share = "/".join(str(s.blocks) for s in servers)
+    print(
+        f"{name:<28} {elapsed * 1000:8.1f} ms  {len(data) / _BS / elapsed:7.2f} MiB/s  "
+        f"blocks {share:<7} final ext {ext!r}  intact {intact}"
+    )
+
+
+async def _main(size: int, rtt: float, connections: int):
+    data = os.urandom(size * _BS)
+    await _scenario("sequential", data, [HighwayServer(delay=rtt)], 1)
+    await _scenario(f"parallel x{connections}, one server", data, [HighwayServer(delay=rtt)], connections)
+    await _scenario(
+        f"parallel x{connections}, two servers", data, [HighwayServer(delay=rtt), HighwayServer(delay=rtt)], connections
+    )
+    await _scenario(
+        f"parallel x{connections}, one allowed", data, [HighwayServer(delay=rtt, max_connections=1)], connections
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.highway_upload")
+    parser.add_argument("--size", type=int, default=16, help="MiB uploaded")
+    parser.add_argument("--rtt", type=float, default=40, help="ms a server waits before answering a block")
+    parser.add_argument("--connections", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(_main(args.size, args.rtt / 1000, args.connections))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+RSS and GC pauses while a burst of large-group pushes is kept alive
+
+the pushes are synthetic, built like benchmarks.fixtures with `--elems` text and face elems each, not replayed traffic
+
+python -m benchmarks.push_replay [--count N] [--elems N] [--no-slots]
+
+--no-slots rebuilds every ProtoStruct with `slots=False` to compare against the dict layout
+"""
+
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+import types
+
+
+def rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:  # not linux, fall back to the peak
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _disable_slots():
+    # the package __init__ imports every pb module, patch the metaclass before that happens
+    assert "lagrange" not in sys.modules
+    package = types.ModuleType("lagrange")
+    package.__path__ = [os.path.join(os.path.dirname(os.path.dirname(__file__)), "lagrange")]
+    sys.modules["lagrange"] = package
+    from lagrange.utils.binary.protobuf import models
+
+    meta_new = models._ProtoMeta.__new__
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        kwargs["slots"] = False
+        return meta_new(mcs, name, bases, namespace, **kwargs)
+
+    models._ProtoMeta.__new__ = __new__  # type: ignore
+
+
+def _build_push(elem_count: int) -> bytes:
+    from lagrange.pb.message.rich_text import Elems
+    from lagrange.pb.message.rich_text.elems import Face, Text
+
+    from .fixtures import _msg_push
+
+    elems = []
+    for i in range(elem_count // 2):
+        elems.append(Elems(text=Text(string=f"line {i}")))
+        elems.append(Elems(face=Face(index=i)))
+    return _msg_push(elems)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.push_replay")
+    parser.add_argument("--count", type=int, default=20000, help="pushes kept alive in the burst")
+    parser.add_argument("--elems", type=int, default=40, help="Elems per push")
+    parser.add_argument("--no-slots", action="store_true")
+    args = parser.parse_args()
+
+    if args.no_slots:
+        _disable_slots()
+    from lagrange.pb.message.msg_push import MsgPush
+    from lagrange.utils.binary.protobuf.models import evaluate_all
+
+    evaluate_all()
+
+    data = _build_push(args.elems)
+    pauses: list[float] = []
+    started = 0.0
+
+    def on_gc(phase, info):
+        nonlocal started
+        if phase == "start":
+            started = time.perf_counter()
+        else:
+            pauses.append(time.perf_counter() - started)
+
+    gc.collect()
+    base = rss()
+    gc.callbacks.append(on_gc)
+    start = time.perf_counter()
+    burst = []
+    for _ in range(args.count):
+        push = MsgPush.decode(data)
+        _ = push.body.message.body.content
+        burst.append(push)
+    elapsed = time.perf_counter() - start
+    gc.callbacks.remove(on_gc)
+
+    full_start = time.perf_counter()
+    gc.collect()
+    full = time.perf_counter() - full_start
+
+    print(f"layout: {'dict' if args.no_slots else 'slots'}, {args.count} pushes x {args.elems} elems")
+    print(f"decode: {elapsed * 1e3:.0f} ms, {args.count / elapsed:.0f} pushes/sec")
+    print(f"rss: +{(rss() - base) / 2**20:.1f} MiB ({(rss() - base) / args.count:.0f} bytes/push)")
+    print(
+        f"gc during burst: {len(pauses)} runs, "
+        f"total {sum(pauses) * 1e3:.1f} ms, max {max(pauses, default=0) * 1e3:.2f} ms"
+    )
+    print(f"full collection with burst alive: {full * 1e3:.1f} ms")
+    print(f"tracked objects: {len(gc.get_objects())}")
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Overhead of tracking request timeouts with many requests in flight
+
+python -m benchmarks.request_timeouts [--requests N]
+
+compares ClientNetwork.send against the previous asyncio.wait_for per request,
+the socket is a stub and every request is answered once all are in flight
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from lagrange.client.network import ClientNetwork
+from lagrange.client.wtlogin.sso import SSOPacket
+from lagrange.info import SigInfo
+
+
+class _StubWriter:
+    def write(self, buf):
+        pass
+
+    def writelines(self, bufs):
+        pass
+
+    async def drain(self):
+        pass
+
+
+async def _noop(*_):
+    pass
+
+
+def _network() -> ClientNetwork:
+    net = ClientNetwork(SigInfo.new(), asyncio.Queue(), _noop, _noop)
+    net._writer = _StubWriter()  # type: ignore
+    net.conn_event.set()
+    return net
+
+
+async def _send_wait_for(net: ClientNetwork, buf: bytes, wait_seq: int, timeout: int = 10):
+    """ClientNetwork.send before the shared deadline heap"""
+    await net.write(buf)
+    fut: asyncio.Future[SSOPacket] = asyncio.Future()
+    net._wait_fut_map[wait_seq] = fut
+    try:
+        await asyncio.wait_for(fut, timeout=timeout)
+        return fut.result()
+    finally:
+        net._wait_fut_map.pop(wait_seq)
+
+
+async def _run(count: int, legacy: bool) -> dict:
+    net = _network()
+    loop = asyncio.get_running_loop()
+    send = (lambda seq: _send_wait_for(net, b"", seq)) if legacy else (lambda seq: net.send(b"", seq))
+    packets = [SSOPacket(seq=seq, ret_code=0, extra="", session_id=b"") for seq in range(1, count + 1)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    requests = [asyncio.ensure_future(send(seq)) for seq in range(1, count + 1)]
+    while len(net._wait_fut_map) < count:
+        await asyncio.sleep(0)
+    for _ in range(5):  # let the writer flush and every request start waiting
+        await asyncio.sleep(0)
+    in_flight = time.perf_counter() - start
+    tasks = len(asyncio.all_tasks())
+    timers = len(loop._scheduled)  # type: ignore
+    _, peak = tracemalloc.get_traced_memory()
+    for packet in packets:
+        await net._dispatch(packet)
+    await asyncio.gather(*requests)
+    total = time.perf_counter() - start
+    tracemalloc.stop()
+    if net._write_task:
+        net._write_task.cancel()
+    return {"in_flight": in_flight, "total": total, "tasks": tasks, "timers": timers, "peak": peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.request_timeouts")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    for name, legacy in (("wait_for per request", True), ("deadline heap", False)):
+        r = asyncio.run(_run(args.requests, legacy))
+        print(
+            f"{name:<22} all in flight {r['in_flight'] * 1e3:7.1f} ms, answered {r['total'] * 1e3:7.1f} ms, "
+            f"tasks {r['tasks']:>6}, timers {r['timers']:>6}, peak {r['peak'] / 2**20:6.2f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
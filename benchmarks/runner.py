@@ -0,0 +1,94 @@
+"""
+Shared timing / allocation helpers for the benchmark scripts
+"""
+
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Optional
+
+
+@dataclass
+class Result:
+    name: str
+    ops_per_sec: float
+    usec_per_op: float
+    alloc_bytes: int  # peak bytes allocated by one call
+    alloc_blocks: int  # memory blocks still alive right after one call
+    size: Optional[int] = None  # input size in bytes, if any
+
+
+def measure_time(fn: Callable[[], object], min_time: float = 0.2) -> float:
+    """seconds per call, the loop count grows until one round takes min_time"""
+    fn()  # warm up caches
+    number = 1
+    while True:
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            elapsed = time.perf_counter() - start
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        if elapsed >= min_time:
+            return elapsed / number
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+
+
+def measure_alloc(fn: Callable[[], object], rounds: int = 20) -> tuple[int, int]:
+    """(peak bytes, live blocks) of one call, averaged"""
+    fn()
+    total_peak = total_blocks = 0
+    tracemalloc.start()
+    try:
+        for _ in range(rounds):
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            before = sys.getallocatedblocks()
+            ret = fn()
+            after = sys.getallocatedblocks()
+            _, peak = tracemalloc.get_traced_memory()
+            del ret
+            total_peak += peak - base
+            total_blocks += max(after - before, 0)
+    finally:
+        tracemalloc.stop()
+    return total_peak // rounds, total_blocks // rounds
+
+
+def run(name: str, fn: Callable[[], object], *, size: Optional[int] = None, min_time: float = 0.2) -> Result:
+    per_op = measure_time(fn, min_time)
+    peak, blocks = measure_alloc(fn)
+    return Result(name, 1 / per_op, per_op * 1e6, peak, blocks, size)
+
+
+def environ() -> dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def print_table(results: list[Result]) -> None:
+    print(f"{'name':<44}{'ops/sec':>12}{'us/op':>10}{'alloc':>10}{'blocks':>8}")
+    for r in results:
+        print(f"{r.name:<44}{r.ops_per_sec:>12.0f}{r.usec_per_op:>10.2f}{r.alloc_bytes:>10}{r.alloc_blocks:>8}")
+
+
+def dump_json(path: str, results: list[Result], **extra: Any) -> None:
+    doc = {"env": environ(), **extra, "results": [asdict(r) for r in results]}
+    if path == "-":
+        json.dump(doc, sys.stdout, indent=2)
+        print()
+    else:
+        with open(path, "w") as f:
+            json.dump(doc, f, indent=2)
@@ -0,0 +1,96 @@
+"""
+Sign provider against stand-in sign servers
+
+python -m benchmarks.sign [--signs N] [--concurrency N]
+
+scenarios: one healthy upstream, a slow upstream next to a healthy one,
+a flaky upstream and one that goes down halfway
+"""
+
+import argparse
+import asyncio
+import time
+
+from lagrange.utils.httpcat import ConnectionPool
+from lagrange.utils.sign import SignProvider
+
+from .fixtures.sign_server import SignServer
+
+_CMD = "MessageSvc.PbSendMsg"
+
+
+async def _drive(provider: SignProvider, signs: int, concurrency: int, halfway=None) -> tuple[float, int]:
+    sem = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one(seq: int):
+        nonlocal errors
+        async with sem:
+            if halfway and seq == signs // 2:
+                halfway()
+            try:
+                await provider(_CMD, seq, b"\x00" * 64)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(seq) for seq in range(signs)))
+    return time.perf_counter() - start, errors
+
+
+async def _scenario(name: str, servers: list[SignServer], signs: int, concurrency: int, halfway=None, **kwargs):
+    for server in servers:
+        await server.start()
+    provider = SignProvider([s.url for s in servers], ConnectionPool(max_per_host=4), report_every=0, **kwargs)
+    try:
+        elapsed, errors = await _drive(provider, signs, concurrency, halfway)
+    finally:
+        await provider.close()
+        for server in servers:
+            await server.stop()
+    p = provider.latency_percentiles()
+    share = "/".join(str(s.requests) for s in servers)
+    conns = "/".join(str(s.connections) for s in servers)
+    print(
+        f"{name:<34} {elapsed:6.2f}s  p50 {p['p50']:7.2f}  p99 {p['p99']:7.2f} ms  "
+        f"requests {share:<11} hedged {provider.hedged:>4} won {provider.hedge_wins:>4} "
+        f"failover {provider.failovers:>3} conns {conns:<7} errors {errors}"
+    )
+
+
+async def _main(signs: int, concurrency: int):
+    await _scenario("single", [SignServer(delay=0.002)], signs, concurrency)
+    await _scenario(
+        "slow + fast, no hedge", [SignServer(delay=0.08), SignServer(delay=0.002)], signs, concurrency, hedge_after=None
+    )
+    await _scenario(
+        "slow + fast, ewma, hedge 50ms",
+        [SignServer(delay=0.08), SignServer(delay=0.002)],
+        signs,
+        concurrency,
+        balance="ewma",
+        hedge_after=0.05,
+    )
+    await _scenario(
+        "flaky (30% 500s) + fast", [SignServer(delay=0.002, fail_rate=0.3), SignServer(delay=0.002)], signs, concurrency
+    )
+    dying = SignServer(delay=0.002)
+    await _scenario(
+        "one goes down halfway",
+        [dying, SignServer(delay=0.002)],
+        signs,
+        concurrency,
+        halfway=lambda: setattr(dying, "down", True),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.sign")
+    parser.add_argument("--signs", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(_main(args.signs, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Cold start: ECDH setup and the time from interpreter start to the first register() packet
+
+python -m benchmarks.startup [--runs N] [--json PATH]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from . import runner
+
+# runs in a fresh interpreter, the network is replaced so nothing leaves the box
+_CHILD = """
+import time
+start = time.perf_counter()
+
+import asyncio
+import lagrange
+from lagrange.client.client import Client
+from lagrange.info import DeviceInfo, SigInfo
+from lagrange.info.app import app_list
+
+imported = time.perf_counter()
+
+
+class Sent(Exception):
+    pass
+
+
+async def send(buf, wait_seq, timeout=10):
+    raise Sent
+
+
+async def main():
+    sig = SigInfo.new()
+    sig.d2 = bytes(64)
+    client = Client(1234567, app_list["linux"], DeviceInfo.generate(1234567), sig)
+    client._network.send = send
+    try:
+        await client.register()
+    except Sent:
+        pass
+
+
+asyncio.run(main())
+print(imported - start, time.perf_counter() - start)
+"""
+
+
+def cold_start(runs: int) -> tuple[float, float]:
+    """median seconds of (import lagrange, first register packet built)"""
+    imports, registers = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _CHILD], capture_output=True, text=True, check=True).stdout
+        imported, registered = map(float, out.split()[-2:])
+        imports.append(imported)
+        registers.append(registered)
+    return statistics.median(imports), statistics.median(registers)
+
+
+def ecdh_cases():
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    from lagrange.utils.crypto.ecdh.curve import CURVE
+    from lagrange.utils.crypto.ecdh.ecdh import ECDHProvider, NativeECDHProvider
+    from lagrange.utils.crypto.ecdh.impl import ECDH_PRIME_PUBLIC, ECDH_SECP_PUBLIC
+
+    secp, prime = CURVE["secp192k1"], CURVE["prime256v1"]
+    return [
+        ("ECDHProvider[secp192k1]", lambda: ECDHProvider(secp).key_exchange(ECDH_SECP_PUBLIC, True)),
+        ("ECDHProvider[prime256v1]", lambda: ECDHProvider(prime).key_exchange(ECDH_PRIME_PUBLIC, False)),
+        (
+            "NativeECDHProvider[prime256v1]",
+            lambda: NativeECDHProvider(prime, ec.SECP256R1()).key_exchange(ECDH_PRIME_PUBLIC, False),
+        ),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument("--json", metavar="PATH", help="write machine readable results, - for stdout")
+    args = parser.parse_args()
+
+    results = [runner.run(name, fn) for name, fn in ecdh_cases()]
+    imported, registered = cold_start(args.runs)
+    if args.json:
+        runner.dump_json(args.json, results, import_lagrange=imported, first_register=registered)
+    if args.json != "-":
+        runner.print_table(results)
+        print(json.dumps({"import_lagrange": round(imported, 4), "first_register": round(registered, 4)}))
+
+
+if __name__ == "__main__":
+    main()
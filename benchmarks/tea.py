@@ -0,0 +1,50 @@
+"""
+QQ TEA backends throughput, their equivalence is checked by tests/test_tea.py
+
+python -m benchmarks.tea [--json PATH]
+"""
+
+import argparse
+import os
+
+from lagrange.utils.crypto import tea
+
+from . import runner
+
+SIZES = (16, 256, 4096, 65536)
+
+
+def backends() -> dict[str, type]:
+    """the shipped cipher classes, ftea only where it is installed"""
+    ret = {"reference": tea._TEA, "python": tea._WordTEA}
+    if tea.TEA_BACKEND == "ftea":
+        ret["ftea"] = tea._FTEACipher
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.tea")
+    parser.add_argument("--json", metavar="PATH", help="write machine readable results, - for stdout")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing round")
+    args = parser.parse_args()
+
+    key = bytes(range(16))
+    results = []
+    for name, impl in backends().items():
+        for size in SIZES:
+            data = os.urandom(size)
+            enc = impl(key).encrypt(data)
+            for op, fn in (
+                ("encrypt", lambda i=impl, d=data: i(key).encrypt(d)),
+                ("decrypt", lambda i=impl, e=enc: i(key).decrypt(e)),
+            ):
+                r = runner.run(f"{name}.{op}[{size}]", fn, size=size, min_time=args.min_time)
+                results.append(r)
+                if args.json != "-":
+                    print(f"{r.name:<28}{r.usec_per_op:>12.1f} us{size / r.usec_per_op:>10.2f} MB/s")
+    if args.json:
+        runner.dump_json(args.json, results, tea_backend=tea.TEA_BACKEND)
+
+
+if __name__ == "__main__":
+    main()
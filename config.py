@@ -1,6 +1,6 @@
 import yaml
 import os
-from typing import Literal
+from typing import Literal, Union
 from pydantic import BaseModel
 from lagrange.utils.log import LoggerProvider, install_loguru
 
@@ -11,7 +11,7 @@ install_loguru()
 class config(BaseModel):
     uin: int = 0
     protocol: Literal["windows", "macos", "linux"] = "linux"
-    sign_server: str = ""
+    sign_server: Union[str, list[str]] = ""  # one url or a list of them
     ws_url: str = ""
     http_host: str = ""
     http_port: str = ""
@@ -1,4 +1,4 @@
-from typing import Literal, Optional
+from typing import Literal, Optional, Union
 import asyncio
 
 from .client.client import Client as Client
@@ -19,7 +19,7 @@ class Lagrange:
         self,
         uin: int,
         protocol: Literal["linux", "macos", "windows"] = "linux",
-        sign_url: Optional[str] = None,
+        sign_url: Optional[Union[str, list[str]]] = None,
         device_info_path="./device.json",
         signinfo_path="./sig.bin",
     ):
@@ -27,11 +27,21 @@ class Lagrange:
         self.uin = uin
         self.info = app_list[protocol]
         self.sign = sign_provider(sign_url) if sign_url else None
-        self.events = {}
+        self.events: list[tuple] = []
+        self.filters: list[tuple] = []
         self.log = log
 
-    def subscribe(self, event, handler):
-        self.events[event] = handler
+    def subscribe(self, event, handler, order: int = 0):
+        self.events.append((event, handler, order))
+
+    def add_filter(self, event, func):
+        self.filters.append((event, func))
+
+    def _bind_events(self, client: Client):
+        for event, handler, order in self.events:
+            client.events.subscribe(event, handler, order)
+        for event, func in self.filters:
+            client.events.add_filter(event, func)
 
     async def login(self, client: Client):
         if self.im.sig_info.d2:
@@ -51,8 +61,7 @@ class Lagrange:
                 self.sign,
                 use_ipv6=False
             )
-            for event, handler in self.events.items():
-                self.client.events.subscribe(event, handler)
+            self._bind_events(self.client)
             self.client.connect()
             status = await self.login(self.client)
         if not status:
@@ -2,7 +2,7 @@ import asyncio
 import hashlib
 import time
 from typing import Callable, Optional, Union, overload
-from collections.abc import Coroutine
+from collections.abc import Coroutine, Hashable
 
 from typing_extensions import Literal
 
@@ -14,8 +14,10 @@ from lagrange.client.wtlogin.ntlogin import (
     parse_ntlogin_response,
 )
 
+from .dispatcher import PushDispatcher
 from .network import ClientNetwork
 from .packet import PacketBuilder
+from .scheduler import Priority, SendScheduler, classify
 from .wtlogin.enum import LoginErrorCode, QrCodeResult
 from .wtlogin.exchange import build_key_exchange_request, parse_key_exchange_response
 from .wtlogin.oicq import (
@@ -49,6 +51,7 @@ class BaseClient:
             Callable[[str, int, bytes], Coroutine[None, None, dict]]
         ] = None,
         use_ipv6=True,
+        push_shards: int = 8,
     ):
         if uin and not sig_info.uin:
             sig_info.uin = uin
@@ -70,6 +73,8 @@ class BaseClient:
             use_v6=use_ipv6,
         )
         self._sign_provider = sign_provider
+        self._scheduler = SendScheduler()
+        self._push_dispatcher = PushDispatcher(self.push_handler, self.push_key, push_shards)
 
         self._t106 = b""
         self._t16a = b""
@@ -100,6 +105,7 @@ class BaseClient:
         if "loop" not in self._tasks:
             self._tasks["loop"] = asyncio.create_task(self._network.loop())
             self._tasks["push_handle"] = asyncio.create_task(self._push_handle_loop())
+            self._push_dispatcher.start()
             self._tasks["heartbeat"] = asyncio.create_task(self._heartbeat_task())
         else:
             raise RuntimeError("connect call twice")
@@ -113,6 +119,7 @@ class BaseClient:
         self._task_clear()
 
     def _task_clear(self):
+        self._push_dispatcher.stop()
         for _, task in self._tasks.items():
             if not task.done():
                 task.cancel()
@@ -141,11 +148,7 @@ class BaseClient:
 
     async def _push_handle_loop(self):
         while True:
-            sso = await self._server_push_queue.get()
-            try:
-                await self.push_handler(sso)
-            except Exception as e:
-                log.root.exception("Unhandled exception on push handler", exc_info=e)
+            await self._push_dispatcher.put(await self._server_push_queue.get())
 
     async def wait_closed(self) -> None:
         try:
@@ -181,39 +184,50 @@ class BaseClient:
     def using_ipv6(self) -> bool:
         return self._network.using_v6
 
+    @property
+    def scheduler(self) -> SendScheduler:
+        return self._scheduler
+
+    @property
+    def push_dispatcher(self) -> PushDispatcher:
+        return self._push_dispatcher
+
     @overload
     async def send_uni_packet(
-        self, cmd: str, buf: bytes, *, timeout=10
+        self, cmd: str, buf: bytes, *, timeout=10, priority: Optional[Priority] = None
     ) -> SSOPacket: ...
 
     @overload
     async def send_uni_packet(
-        self, cmd: str, buf: bytes, send_only: Literal[False], timeout=10
+        self, cmd: str, buf: bytes, send_only: Literal[False], timeout=10, priority: Optional[Priority] = None
     ) -> SSOPacket: ...
 
     @overload
     async def send_uni_packet(
-        self, cmd: str, buf: bytes, send_only: Literal[True], timeout=10
+        self, cmd: str, buf: bytes, send_only: Literal[True], timeout=10, priority: Optional[Priority] = None
     ) -> None: ...
 
-    async def send_uni_packet(self, cmd, buf, send_only: bool = False, timeout=10):
-        seq = self.get_seq()
-        sign = None
-        if self._sign_provider:
-            sign = await self._sign_provider(cmd, seq, buf)
-        packet = build_uni_packet(
-            uin=self.uin,
-            seq=seq,
-            cmd=cmd,
-            sign=sign or {},
-            app_info=self.app_info,
-            device_info=self.device_info,
-            sig_info=self._sig,
-            body=buf,
-        )
-        if send_only:
-            return await self._network.send(packet, wait_seq=-1, timeout=timeout)
-        return await self._network.send(packet, wait_seq=seq, timeout=timeout)
+    async def send_uni_packet(self, cmd, buf, send_only: bool = False, timeout=10, priority=None):
+        """priority: scheduling class, guessed from cmd if None"""
+        async with self._scheduler.slot(classify(cmd) if priority is None else priority):
+            seq = self.get_seq()
+            sign = None
+            if self._sign_provider:
+                sign = await self._sign_provider(cmd, seq, buf)
+            packet = build_uni_packet(
+                uin=self.uin,
+                seq=seq,
+                cmd=cmd,
+                sign=sign or {},
+                app_info=self.app_info,
+                device_info=self.device_info,
+                sig_info=self._sig,
+                body=buf,
+                cipher=self._network.d2_cipher,
+            )
+            if send_only:
+                return await self._network.send(packet, wait_seq=-1, timeout=timeout)
+            return await self._network.send(packet, wait_seq=seq, timeout=timeout)
 
     async def fetch_qrcode(self) -> Union[int, tuple[bytes, str]]:
         tlv = QrCodeTlvBuilder()
@@ -420,3 +434,7 @@ class BaseClient:
 
     async def push_handler(self, sso: SSOPacket):
         pass
+
+    def push_key(self, sso: SSOPacket) -> Optional[Hashable]:
+        """pushes with the same key are handled in order, None for no particular conversation"""
+        return None
@@ -10,7 +10,7 @@ from typing import (
     overload,
     Literal,
 )
-from collections.abc import Coroutine
+from collections.abc import Coroutine, Hashable
 
 from lagrange.info import AppInfo, DeviceInfo, SigInfo
 from lagrange.pb.message.msg_push import MsgPushBody
@@ -73,7 +73,9 @@ from .message.elems import Audio, Image
 from .message.encoder import build_message
 from .message.types import Element
 from .models import UserInfo, BotFriend
-from .server_push import PushDeliver, bind_services
+from .scheduler import Priority
+from .server_push import MsgPushFilter, PushDeliver, bind_services
+from .singleflight import IDEMPOTENT_OIDB, SingleFlight
 from .wtlogin.sso import SSOPacket
 
 
@@ -86,11 +88,16 @@ class Client(BaseClient):
         sig_info: SigInfo,
         sign_provider: Optional[Callable[[str, int, bytes], Coroutine[None, None, dict]]] = None,
         use_ipv6=True,
+        push_shards: int = 8,
+        events: Optional[Events] = None,
     ):
-        super().__init__(uin, app_info, device_info, sig_info, sign_provider, use_ipv6)
+        super().__init__(uin, app_info, device_info, sig_info, sign_provider, use_ipv6, push_shards)
 
-        self._events = Events()
+        self._events = events or Events()
         self._push_deliver = PushDeliver(self)
+        self._msg_push_filter = MsgPushFilter()
+        self._oidb_flight: SingleFlight[OidbResponse] = SingleFlight()
+        self.coalesce_oidb: set[tuple[int, int]] = set(IDEMPOTENT_OIDB)
         self._highway = HighWaySession(self)
         bind_services(self._push_deliver)
 
@@ -102,17 +109,29 @@ class Client(BaseClient):
     def push_deliver(self) -> PushDeliver:
         return self._push_deliver
 
+    @property
+    def msg_push_filter(self) -> MsgPushFilter:
+        return self._msg_push_filter
+
+    @property
+    def oidb_flight(self) -> SingleFlight[OidbResponse]:
+        return self._oidb_flight
+
     async def register(self) -> bool:
         if await super().register():
-            self._events.emit(ClientOnline(), self)
+            await self._events.dispatch(ClientOnline(), self)
             return True
-        self._events.emit(ClientOffline(recoverable=False), self)
+        await self._events.dispatch(ClientOffline(recoverable=False), self)
         return False
 
     async def _disconnect_cb(self, recover: bool):
-        self._events.emit(ClientOffline(recoverable=recover), self)
+        await self._events.dispatch(ClientOffline(recoverable=recover), self)
         await super()._disconnect_cb(recover)
 
+    def _task_clear(self):
+        super()._task_clear()
+        self._events.stop()
+
     async def easy_login(self) -> bool:
         if self._sig.temp_pwd:  # EasyLogin
             await self._key_exchange()
@@ -164,12 +183,26 @@ class Client(BaseClient):
                     return await self.register()
         return False
 
-    async def send_oidb_svc(self, cmd: int, sub_cmd: int, buf: bytes, is_uid=False) -> OidbResponse:
+    async def send_oidb_svc(
+        self, cmd: int, sub_cmd: int, buf: bytes, is_uid=False, priority: Optional[Priority] = None
+    ) -> OidbResponse:
+        """identical concurrent requests of a command in `coalesce_oidb` share one round trip"""
+        if (cmd, sub_cmd) in self.coalesce_oidb:
+            return await self._oidb_flight.do(
+                (cmd, sub_cmd, is_uid, bytes(buf)),
+                lambda: self._send_oidb_svc(cmd, sub_cmd, buf, is_uid, priority),
+            )
+        return await self._send_oidb_svc(cmd, sub_cmd, buf, is_uid, priority)
+
+    async def _send_oidb_svc(
+        self, cmd: int, sub_cmd: int, buf: bytes, is_uid: bool, priority: Optional[Priority]
+    ) -> OidbResponse:
         rsp = OidbResponse.decode(
             (
                 await self.send_uni_packet(
                     f"OidbSvcTrpcTcp.0x{cmd:0>2X}_{sub_cmd}",
                     OidbRequest(cmd=cmd, sub_cmd=sub_cmd, data=bytes(buf), is_uid=is_uid).encode(),
+                    priority=priority,
                 )
             ).data
         )
@@ -179,7 +212,10 @@ class Client(BaseClient):
 
     async def push_handler(self, sso: SSOPacket):
         if rsp := await self._push_deliver.execute(sso.cmd, sso):
-            self._events.emit(rsp, self)
+            await self._events.dispatch(rsp, self)  # a full event queue holds back this push shard
+
+    def push_key(self, sso: SSOPacket) -> Optional[Hashable]:
+        return self._push_deliver.key_of(sso.cmd, sso)
 
     async def _send_msg_raw(self, pb: dict, *, grp_id=0, uid="") -> SendMsgRsp:
         seq = self.seq + 1
@@ -293,6 +329,7 @@ class Client(BaseClient):
                     0xFE7,
                     4,
                     PBGetGrpMemberInfoReq.build(grp_id, next_key=next_key).encode(),
+                    priority=Priority.BULK,
                 )
             ).data
         )
@@ -379,7 +416,7 @@ class Client(BaseClient):
             "trpc.msg.msg_svc.MsgService.SsoGroupRecallMsg",
             PBGroupRecallRequest.build(grp_id, seq).encode(),
         )
-        result = proto_decode(payload.data)
+        result = proto_decode(payload.data, 0)
         if result.into(2, bytes) != b"Success":
             raise AssertionError(result)
 
@@ -596,5 +633,5 @@ class Client(BaseClient):
             4: {1: [10, 20, 2]},
         }
         rsp = await self.send_oidb_svc(0x9067, 202, proto_encode(body), True)
-        temp = proto_decode(rsp.data).into((4, 1), dict[int, list[bytes]])
+        temp = proto_decode(rsp.data, 0).into((4, 1), list[dict[int, bytes]])
         return temp[0][1].decode(), temp[1][1].decode()
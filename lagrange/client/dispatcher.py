@@ -0,0 +1,82 @@
+"""
+Sharded handling of server pushes
+"""
+
+import asyncio
+from typing import Callable, Optional
+from collections.abc import Coroutine, Hashable
+
+from lagrange.utils.log import log
+
+from .wtlogin.sso import SSOPacket
+
+
+class PushDispatcher:
+    """
+    run pushes on `shards` worker tasks, pushes with the same key (a conversation)
+    always land on the same worker so they are handled in order,
+    pushes of unrelated conversations do not wait for each other
+
+    each shard holds at most `max_queue` pushes, `put` waits for room so a slow shard holds back
+    whoever feeds it instead of buffering without limit
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[SSOPacket], Coroutine[None, None, None]],
+        key_func: Callable[[SSOPacket], Optional[Hashable]],
+        shards: int = 8,
+        max_queue: int = 256,
+    ):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        if max_queue < 1:
+            raise ValueError("max_queue must be at least 1")
+        self._handler = handler
+        self._key_func = key_func
+        self._queues: list[asyncio.Queue[SSOPacket]] = [asyncio.Queue(max_queue) for _ in range(shards)]
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def shards(self) -> int:
+        return len(self._queues)
+
+    def queue_depths(self) -> list[int]:
+        return [q.qsize() for q in self._queues]
+
+    def shard_of(self, sso: SSOPacket) -> int:
+        try:
+            key = self._key_func(sso)
+        except Exception as e:  # a broken push still has to reach its handler
+            log.root.debug(f"cannot key push {sso.cmd}: {e!r}")
+            key = None
+        if key is None:
+            return 0
+        return hash(key) % len(self._queues)
+
+    def submit(self, sso: SSOPacket):
+        """never waits, asyncio.QueueFull if the shard is full"""
+        self._queues[self.shard_of(sso)].put_nowait(sso)
+
+    async def put(self, sso: SSOPacket):
+        """like `submit`, but waits for room in the shard"""
+        await self._queues[self.shard_of(sso)].put(sso)
+
+    def start(self):
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker(q), name=f"push_shard_{i}") for i, q in enumerate(self._queues)
+            ]
+
+    def stop(self):
+        for task in self._workers:
+            task.cancel()
+        self._workers.clear()
+
+    async def _worker(self, queue: "asyncio.Queue[SSOPacket]"):
+        while True:
+            sso = await queue.get()
+            try:
+                await self._handler(sso)
+            except Exception as e:
+                log.root.exception("Unhandled exception on push handler", exc_info=e)
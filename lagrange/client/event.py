@@ -1,6 +1,10 @@
 import asyncio
-from typing import TYPE_CHECKING, Any, Callable, TypeVar
-from collections.abc import Awaitable
+from collections import Counter, deque
+from functools import partial
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar, Union
+from collections.abc import Awaitable, Iterable
 
 from lagrange.utils.log import log
 
@@ -10,38 +14,227 @@ if TYPE_CHECKING:
 
 T = TypeVar("T", bound="BaseEvent")
 EVENT_HANDLER = Callable[["Client", T], Awaitable[Any]]
+EVENT_FILTER = Callable[["Client", T], bool]
+# (client, event, call_next), call `await call_next()` to run the rest of the chain and the handlers
+EVENT_MIDDLEWARE = Callable[["Client", "BaseEvent", Callable[[], Awaitable[None]]], Awaitable[Any]]
+
+
+class Overflow(Enum):
+    BLOCK = "block"  # the emitter waits for queue space
+    DROP_OLDEST = "drop_oldest"
+    DROP_TYPE = "drop_type"  # drop events of the `droppable` types first, block if there is none
+
+
+@dataclass
+class EventStats:
+    emitted: int = 0
+    filtered: int = 0  # rejected by a filter before being queued
+    queued: int = 0  # events that went through the queue, bounded mode only
+    blocked: int = 0  # times an emitter waited for queue space
+    dropped: int = 0
+    dropped_by_type: Counter = field(default_factory=Counter)
 
 
 class Events:
-    def __init__(self):
+    """
+    handlers of an event type run one after another in `order`,
+    filters run synchronously on emit and can drop an event before any task is created,
+    middlewares wrap the handlers of every event, the first added is the outermost
+
+    unbounded by default, every event runs on its own task;
+    with `max_concurrency` events are queued (up to `max_queue`) and run on that many workers,
+    `overflow` decides what happens to a full queue
+
+    for pushes, BLOCK holds back the push shard that produced the event, a full shard (see `PushDispatcher`)
+    holds back the client's push loop; frames behind that wait in the inbound push queue of the connection,
+    which is not bounded as the connection keeps reading to deliver responses
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_queue: int = 1024,
+        overflow: Overflow = Overflow.BLOCK,
+        droppable: Iterable[type["BaseEvent"]] = (),
+    ):
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if max_queue < 1:
+            raise ValueError("max_queue must be at least 1")
         self._task_group: set[asyncio.Task] = set()
-        self._handle_map: dict[type["BaseEvent"], EVENT_HANDLER] = {}
-
-    def subscribe(self, event: type[T], handler: EVENT_HANDLER[T]):
-        if event not in self._handle_map:
-            self._handle_map[event] = handler
-        else:
-            raise AssertionError(
-                f"Event already subscribed to {self._handle_map[event]}"
-            )
-
-    def unsubscribe(self, event: type["BaseEvent"]):
-        return self._handle_map.pop(event)
-
-    async def _task_exec(self, client: "Client", event: "BaseEvent", handler: EVENT_HANDLER):
-        # try:
-            await handler(client, event)
-        # except Exception as e:
-        #     log.root.error(
-        #         "Unhandled exception on task {}".format(event), exc_info=e
-        #     )
+        self._handle_map: dict[type["BaseEvent"], list[tuple[int, EVENT_HANDLER]]] = {}
+        self._filters: list[tuple[type["BaseEvent"], EVENT_FILTER]] = []
+        self._middlewares: list[EVENT_MIDDLEWARE] = []
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._overflow = Overflow(overflow)
+        self._droppable = tuple(droppable)
+        self._queue: deque[tuple["Client", "BaseEvent", list[EVENT_HANDLER]]] = deque()
+        self._queue_ready = asyncio.Event()
+        self._space_waiters: deque[asyncio.Future[None]] = deque()
+        self._workers: list[asyncio.Task] = []
+        self._running = 0
+        self.stats = EventStats()
 
-    def emit(self, event: "BaseEvent", client: "Client"):
+    @property
+    def bounded(self) -> bool:
+        return self._max_concurrency is not None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def running(self) -> int:
+        return self._running if self.bounded else len(self._task_group)
+
+    def subscribe(self, event: type[T], handler: EVENT_HANDLER[T], order: int = 0):
+        """handlers with a lower order run first, equal orders run in subscription order"""
+        handlers = self._handle_map.setdefault(event, [])
+        if any(h == handler for _, h in handlers):
+            raise AssertionError(f"{handler} already subscribed to {event.__name__}")
+        handlers.append((order, handler))
+        handlers.sort(key=lambda item: item[0])
+
+    def unsubscribe(
+        self, event: type["BaseEvent"], handler: Optional[EVENT_HANDLER] = None
+    ) -> Union[EVENT_HANDLER, list[EVENT_HANDLER]]:
+        """
+        remove `handler` and return it, or every handler of `event` if not given,
+        returned as is if it was the only one, else as a list in run order;
+        KeyError if nothing was subscribed
+        """
+        handlers = self._handle_map[event]
+        if handler is None:
+            del self._handle_map[event]
+            return handlers[0][1] if len(handlers) == 1 else [h for _, h in handlers]
+        if not any(h == handler for _, h in handlers):
+            raise KeyError(handler)
+        handlers[:] = [(o, h) for o, h in handlers if h != handler]
+        if not handlers:
+            del self._handle_map[event]
+        return handler
+
+    def add_filter(self, event: type[T], func: EVENT_FILTER[T]):
+        """`func` returns False to drop the event, applies to subclasses of `event` too"""
+        self._filters.append((event, func))
+
+    def remove_filter(self, func: EVENT_FILTER):
+        self._filters = [(e, f) for e, f in self._filters if f != func]
+
+    def add_middleware(self, middleware: EVENT_MIDDLEWARE):
+        self._middlewares.append(middleware)
+
+    def remove_middleware(self, middleware: EVENT_MIDDLEWARE):
+        self._middlewares.remove(middleware)
+
+    async def _task_exec(self, client: "Client", event: "BaseEvent", handlers: list[EVENT_HANDLER]):
+        async def run_handlers():
+            for handler in handlers:
+                try:
+                    await handler(client, event)
+                except Exception as e:
+                    log.root.exception(f"Unhandled exception on {handler} for {type(event).__name__}", exc_info=e)
+
+        chain = run_handlers
+        for middleware in reversed(self._middlewares):
+            chain = partial(middleware, client, event, chain)
+        try:
+            await chain()
+        except Exception as e:
+            log.root.exception(f"Unhandled exception on middleware for {type(event).__name__}", exc_info=e)
+
+    def _drop(self, event: "BaseEvent"):
+        self.stats.dropped += 1
+        self.stats.dropped_by_type[type(event).__name__] += 1
+        log.root.debug(f"event queue full, {event} dropped")
+
+    def _admit(self, event: "BaseEvent") -> Optional[bool]:
+        """make room for `event`, False if it was dropped, None if the emitter has to wait"""
+        if len(self._queue) < self._max_queue:
+            return True
+        if self._overflow is Overflow.DROP_OLDEST:
+            self._drop(self._queue.popleft()[1])
+            return True
+        if self._overflow is Overflow.DROP_TYPE and self._droppable:
+            if isinstance(event, self._droppable):
+                self._drop(event)
+                return False
+            for i, (_, queued, _) in enumerate(self._queue):
+                if isinstance(queued, self._droppable):
+                    del self._queue[i]
+                    self._drop(queued)
+                    return True
+        return None
+
+    def _enqueue(self, client: "Client", event: "BaseEvent", handlers: list[EVENT_HANDLER]):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self._max_concurrency or 0)]
+        self._queue.append((client, event, handlers))
+        self.stats.queued += 1
+        self._queue_ready.set()
+
+    async def _worker(self):
+        while True:
+            while not self._queue:
+                self._queue_ready.clear()
+                await self._queue_ready.wait()
+            client, event, handlers = self._queue.popleft()
+            while self._space_waiters:
+                if not (fut := self._space_waiters.popleft()).done():
+                    fut.set_result(None)
+                    break
+            self._running += 1
+            try:
+                await self._task_exec(client, event, handlers)
+            finally:
+                self._running -= 1
+
+    def _handlers_of(self, event: "BaseEvent", client: "Client") -> Optional[list[EVENT_HANDLER]]:
         typ = type(event)
         if typ not in self._handle_map:
             log.root.debug(f"Unhandled event: {event}")
+            return None
+        for event_type, func in self._filters:
+            if isinstance(event, event_type) and not func(client, event):
+                self.stats.filtered += 1
+                return None
+        self.stats.emitted += 1
+        return [h for _, h in self._handle_map[typ]]
+
+    def emit(self, event: "BaseEvent", client: "Client"):
+        """never waits, drops `event` where the overflow policy would block, use `dispatch` to wait instead"""
+        if not (handlers := self._handlers_of(event, client)):
+            return
+        if self.bounded:
+            if (admitted := self._admit(event)) is None:
+                self._drop(event)
+            elif admitted:
+                self._enqueue(client, event, handlers)
             return
 
-        t = asyncio.create_task(self._task_exec(client, event, self._handle_map[typ]))
+        t = asyncio.create_task(self._task_exec(client, event, handlers))
         self._task_group.add(t)
         t.add_done_callback(self._task_group.discard)
+
+    async def dispatch(self, event: "BaseEvent", client: "Client"):
+        """like `emit`, but waits for queue space when the overflow policy blocks"""
+        if not self.bounded:
+            return self.emit(event, client)
+        if not (handlers := self._handlers_of(event, client)):
+            return
+        if (admitted := self._admit(event)) is None:
+            self.stats.blocked += 1
+            while admitted is None:
+                fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+                self._space_waiters.append(fut)
+                await fut
+                admitted = self._admit(event)
+        if admitted:
+            self._enqueue(client, event, handlers)
+
+    def stop(self):
+        """cancel the workers of bounded mode, queued events are kept for the next emit"""
+        for task in self._workers:
+            task.cancel()
+        self._workers.clear()
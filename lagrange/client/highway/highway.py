@@ -1,17 +1,19 @@
 import asyncio
 import time
+from collections import deque
 from hashlib import md5
 from io import BytesIO
 from typing import TYPE_CHECKING, BinaryIO, Optional, Union
 
 from lagrange.client.message.elems import Audio, Image
 from lagrange.pb.highway.comm import IndexNode
+from lagrange.pb.highway.head import HighwayTransRespHead
 from lagrange.pb.highway.ext import NTV2RichMediaHighwayExt
 from lagrange.pb.highway.httpconn import HttpConn0x6ffReq, HttpConn0x6ffRsp
 from lagrange.pb.highway.rsp import NTV2RichMediaResp, DownloadRsp
 from lagrange.utils.binary.protobuf import proto_decode
 from lagrange.utils.crypto.tea import qqtea_encrypt
-from lagrange.utils.httpcat import HttpCat
+from lagrange.utils.httpcat import HttpCat, HttpResponse
 from lagrange.utils.image import decoder as decoder_img
 from lagrange.utils.audio import decoder as decoder_audio
 from lagrange.utils.log import log
@@ -25,7 +27,7 @@ from .encoders import (
     encode_pri_img_download_req,
 )
 from .frame import read_frame, write_frame
-from .utils import calc_file_hash_and_length, timeit
+from .utils import calc_file_hash_and_length, calc_files_length, split_blocks, timeit
 
 if TYPE_CHECKING:
     from lagrange.client.client import Client
@@ -38,6 +40,7 @@ class HighWaySession:
         self._session_sig: Optional[bytes] = None
         self._session_key: Optional[bytes] = None
         self._session_addr_list: list[tuple[str, int]] = []
+        self.upload_connections = 4
 
     async def _get_bdh_session(self):
         rsp = await self._client.send_uni_packet(
@@ -65,6 +68,11 @@ class HighWaySession:
             f"{rsp.url_path}{info.rkey}"
         )
 
+    _upload_headers = {
+        "Accept-Encoding": "identity",
+        "User-Agent": "Mozilla/5.0 (compatible; MSIE 10.0; Windows NT 6.2)",
+    }
+
     def _encrypt_ext(self, ext: bytes) -> bytes:
         if not self._session_key:
             raise KeyError("session key not set, try again later?")
@@ -78,9 +86,33 @@ class HighWaySession:
         ext=None,
         addrs: Optional[list[tuple[str, int]]] = None,
         bs=65535,
+        connections: Optional[int] = None,
     ) -> Optional[bytes]:
+        """
+        connections: blocks sent at once over that many connections to the first of `addrs`,
+        defaults to `upload_connections`; 1 sends them one by one, trying the servers in turn,
+        which is also the fallback when a parallel upload fails
+        """
         if not addrs:
             addrs = self._session_addr_list
+        if connections is None:
+            connections = self.upload_connections
+        fl = calc_files_length(*files)
+        blocks = split_blocks(*files, bs=bs)
+        if connections > 1 and len(blocks) > 1:
+            try:
+                sec, data = await timeit(
+                    self._bdh_parallel_uploader(
+                        "PicUp.DataUp", addrs[0], list(files), blocks, cmd_id, ticket, ext, connections=connections
+                    )
+                )
+                self._log_throughput(fl, sec, min(connections, len(blocks)))
+                return data
+            except (ConnectionError, asyncio.TimeoutError) as e:
+                self.logger.warning(f"parallel upload failed ({e!r}), falling back to one block at a time")
+            finally:
+                for f in files:
+                    f.seek(0)
         for addr in addrs:
             try:
                 sec, data = await timeit(
@@ -94,7 +126,7 @@ class HighWaySession:
                         block_size=bs,
                     )
                 )
-                self.logger.info("upload complete, use %.2fms" % (sec * 1000))
+                self._log_throughput(fl, sec, 1)
                 return data
             except asyncio.TimeoutError:
                 self.logger.error(f"server {addr[0]}:{addr[1]} timeout")
@@ -105,6 +137,57 @@ class HighWaySession:
         else:
             raise ConnectionError("cannot upload, all server failure")
 
+    def _log_throughput(self, length: int, sec: float, connections: int):
+        rate = length / 1048576 / sec if sec else 0
+        self.logger.info(
+            f"upload complete, {length / 1048576:.2f}MiB in {sec * 1000:.2f}ms, "
+            f"{rate:.2f}MiB/s over {connections} connection(s)"
+        )
+
+    def _block_head(
+        self,
+        cmd: str,
+        cmd_id: int,
+        file_size: int,
+        file_md5: bytes,
+        offset: int,
+        bl: bytes,
+        ticket: bytes,
+        ts: int,
+        ext: Optional[bytes],
+    ) -> bytes:
+        return encode_highway_head(
+            uin=self._client.uin,
+            seq=0,
+            cmd=cmd,
+            cmd_id=cmd_id,
+            file_size=file_size,
+            file_offset=offset,
+            file_md5=file_md5,
+            blk_size=len(bl),
+            blk_md5=md5(bl).digest(),
+            ticket=ticket,
+            tgt=self._client._sig.tgt,
+            app_id=self._client.app_info.app_id,
+            sub_app_id=self._client.app_info.sub_app_id,
+            timestamp=ts,
+            ext_info=ext or b"",
+        ).encode()
+
+    async def _send_block(self, session: HttpCat, head: bytes, bl: bytes) -> HttpResponse:
+        return await session.send_request(
+            "POST",
+            f"/cgi-bin/httpconn?htcmd=0x6FF0087&uin={self._client.uin}",
+            write_frame(head, bl),
+        )
+
+    @classmethod
+    def _block_resp(cls, rsp_http: HttpResponse) -> HighwayTransRespHead:
+        resp, _ = read_frame(BytesIO(rsp_http.decompressed_body))
+        if resp.err_code:
+            raise ConnectionError(resp.err_code, "upload error", resp)
+        return resp
+
     async def _bdh_uploader(
         self,
         cmd: str,
@@ -118,16 +201,9 @@ class HighWaySession:
     ) -> Optional[bytes]:
         fmd5, _, fl = calc_file_hash_and_length(*files)
         ts = int(time.time() * 1000)
-        bc = 0
         total_transfer = 0
         current_file = files.pop(0)
-        async with HttpCat(
-            *addr,
-            headers={
-                "Accept-Encoding": "identity",
-                "User-Agent": "Mozilla/5.0 (compatible; MSIE 10.0; Windows NT 6.2)",
-            },
-        ) as session:
+        async with HttpCat(*addr, headers=self._upload_headers) as session:
             while True:
                 bl = current_file.read(block_size)
                 if not bl and not files:
@@ -136,42 +212,74 @@ class HighWaySession:
                     current_file = files.pop(0)
                     continue
 
-                head = encode_highway_head(
-                    uin=self._client.uin,
-                    seq=0,
-                    cmd=cmd,
-                    cmd_id=cmd_id,
-                    file_size=fl,
-                    file_offset=total_transfer,
-                    file_md5=fmd5,
-                    blk_size=len(bl),
-                    blk_md5=md5(bl).digest(),
-                    ticket=ticket,
-                    tgt=self._client._sig.tgt,
-                    app_id=self._client.app_info.app_id,
-                    sub_app_id=self._client.app_info.sub_app_id,
-                    timestamp=ts,
-                    ext_info=ext or b"",
-                ).encode()
-
-                rsp_http = await session.send_request(
-                    "POST",
-                    f"/cgi-bin/httpconn?htcmd=0x6FF0087&uin={self._client.uin}",
-                    write_frame(head, bl),
-                )
+                head = self._block_head(cmd, cmd_id, fl, fmd5, total_transfer, bl, ticket, ts, ext)
+                resp = self._block_resp(await self._send_block(session, head, bl))
                 total_transfer += len(bl)
 
-                resp, data = read_frame(BytesIO(rsp_http.decompressed_body))
-                if resp.err_code:
-                    raise ConnectionError(resp.err_code, "upload error", resp)
-                elif resp and ext:
+                if resp and ext:
                     if resp.ext_info:
                         ext = resp.ext_info
                     if resp.seg_head:
                         if resp.seg_head.ticket:
                             self._session_key = resp.seg_head.ticket
 
-                bc += 1
+    async def _bdh_parallel_uploader(
+        self,
+        cmd: str,
+        addr: tuple[str, int],
+        files: list[BinaryIO],
+        blocks: list[tuple[int, BinaryIO, int, int]],
+        cmd_id: int,
+        ticket: bytes,
+        ext: Optional[bytes] = None,
+        *,
+        connections=4,
+    ) -> Optional[bytes]:
+        """
+        `blocks` (see `split_blocks`) go out on `connections` sessions at once, all to `addr`,
+        blocks of one upload are never split across servers;
+        every block carries its own offset and md5, so the server can take them in any order
+
+        ext_info and the session ticket of a response are only applied if no later block
+        applied its own yet, the same values the sequential upload ends up with;
+        a session that fails puts its block back for the others, an error code from the server
+        ends the parallel upload, `upload_controller` then starts over one block at a time
+        """
+        fmd5, _, fl = calc_file_hash_and_length(*files)
+        ts = int(time.time() * 1000)
+        pending = deque(enumerate(blocks))
+        ext_from, ticket_from = -1, -1
+
+        async def worker():
+            nonlocal ext, ext_from, ticket_from
+            async with HttpCat(*addr, headers=self._upload_headers) as session:
+                while pending:
+                    index, (offset, f, pos, size) = block = pending.popleft()
+                    f.seek(pos)
+                    bl = f.read(size)
+                    head = self._block_head(cmd, cmd_id, fl, fmd5, offset, bl, ticket, ts, ext)
+                    try:
+                        rsp_http = await self._send_block(session, head, bl)
+                    except (OSError, EOFError, asyncio.TimeoutError) as e:
+                        pending.appendleft(block)
+                        self.logger.error(f"server {addr[0]}:{addr[1]} failed on block {index}: {e!r}")
+                        return
+                    resp = self._block_resp(rsp_http)
+                    if resp and ext:
+                        if resp.ext_info and index > ext_from:
+                            ext, ext_from = resp.ext_info, index
+                        if resp.seg_head and resp.seg_head.ticket and index > ticket_from:
+                            self._session_key, ticket_from = resp.seg_head.ticket, index
+
+        tasks = [asyncio.create_task(worker()) for _ in range(min(connections, len(pending)))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        if pending:
+            raise ConnectionError("cannot upload, all server failure")
+        return ext
 
     async def upload_image(self, file: BinaryIO, gid=0, uid="") -> Image:
         if not self._session_addr_list:
@@ -217,10 +325,10 @@ class HighWaySession:
             )
         w, h = info.width, info.height
         if gid:
-            fileid = proto_decode(ret.upload.compat_qmsg).into(7, int)
+            fileid = proto_decode(ret.upload.compat_qmsg, 0).into(7, int)
             url = f"https://gchat.qpic.cn/gchatpic_new/{self._client.uin}/{gid}-{fileid}-{fmd5.hex().upper()}/0?term=2"
         else:
-            path = proto_decode(ret.upload.compat_qmsg).into(29, dict[int, bytes])[30]
+            path = proto_decode(ret.upload.compat_qmsg, 0).into((29, 30), bytes)
             fileid = 0
             url = "https://multimedia.nt.qq.com.cn/" + path.decode()
 
@@ -367,11 +475,13 @@ class HighWaySession:
         url = await self.get_audio_down_url(audio, gid, uid)
 
         # SSLV3_ALERT_HANDSHAKE_FAILURE on ssl env
-        http = await HttpCat.request("GET", url.replace("https", "http"))
-        if http.code != 200:
-            raise ConnectionError(http.code, http.status)
-
-        return BytesIO(http.decompressed_body)
+        async with HttpCat.stream("GET", url.replace("https", "http")) as http:
+            if http.code != 200:
+                raise ConnectionError(http.code, http.status)
+            buf = BytesIO()
+            await http.download_to(buf)  # decompressed as it arrives, no intermediate copy of the body
+        buf.seek(0)
+        return buf
 
 
     # async def upload_video(self, file: BinaryIO, thumb: BinaryIO, gid: int) -> VideoElement:
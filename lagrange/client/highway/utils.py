@@ -20,6 +20,27 @@ def calc_file_hash_and_length(*files: BinaryIO, bs=4096) -> tuple[bytes, bytes,
     return fm.digest(), fs.digest(), length
 
 
+def calc_files_length(*files: BinaryIO) -> int:
+    length = 0
+    for f in files:
+        f.seek(0, 2)
+        length += f.tell()
+        f.seek(0)
+    return length
+
+
+def split_blocks(*files: BinaryIO, bs: int) -> list[tuple[int, BinaryIO, int, int]]:
+    """(offset in the upload, file, position in the file, size), blocks do not span files"""
+    blocks, offset = [], 0
+    for f in files:
+        length = calc_files_length(f)
+        for pos in range(0, length, bs):
+            size = min(bs, length - pos)
+            blocks.append((offset, f, pos, size))
+            offset += size
+    return blocks
+
+
 def itoa(i: int) -> str:  # int to address(str)
     signed = False
     if i < 0:
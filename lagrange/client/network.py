@@ -3,22 +3,64 @@ ClientNetwork Implement
 """
 
 import asyncio
+import heapq
 import ipaddress
+import itertools
 import sys
-from typing import Callable, overload, Optional
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Callable, overload, Optional, Union
 from collections.abc import Coroutine
 from typing_extensions import Literal
 
 from lagrange.info import SigInfo
+from lagrange.utils.crypto.tea import TEACipher, tea_cipher
 from lagrange.utils.log import log
 from lagrange.utils.network import Connection
 
 from .wtlogin.sso import SSOPacket, parse_sso_frame, parse_sso_header
 
 
+class FrameError(ValueError):
+    """a frame that did not parse, seq is None if it did not decrypt or is too short to carry one"""
+
+    def __init__(self, seq: Optional[int], reason: str):
+        super().__init__(seq, reason)
+        self.seq = seq
+
+
+def _parse_packet(raw: bytes, d2_key: Union[bytes, TEACipher]) -> SSOPacket:
+    """module level so it can run in a process pool too"""
+    enc_flag, _, sso_body = parse_sso_header(raw, d2_key)
+    try:
+        return parse_sso_frame(sso_body, enc_flag == 2)
+    except Exception as e:
+        seq = int.from_bytes(sso_body[4:8], "big", signed=True) if sso_body and len(sso_body) >= 8 else None
+        raise FrameError(seq, repr(e)) from e
+
+
+@dataclass
+class FrameStats:
+    """time spent decoding inbound frames, inline decoding blocks the event loop"""
+
+    inline_frames: int = 0
+    inline_time: float = 0.0
+    inline_max: float = 0.0
+    offloaded_frames: int = 0
+    offloaded_time: float = 0.0
+
+    def record_inline(self, cost: float):
+        self.inline_frames += 1
+        self.inline_time += cost
+        if cost > self.inline_max:
+            self.inline_max = cost
+
+
 class ClientNetwork(Connection):
     V4UPSTREAM = ("msfwifi.3g.qq.com", 8080)
     V6UPSTREAM = ("msfwifiv6.3g.qq.com", 8080)
+    SLOW_FRAME = 0.05  # seconds, inline decoding above this is logged
 
     def __init__(
         self,
@@ -29,7 +71,16 @@ class ClientNetwork(Connection):
         use_v6=False,
         *,
         manual_address: Optional[tuple[str, int]] = None,
+        offload_threshold: int = 16 * 1024,
+        executor: Optional[Executor] = None,
+        write_batch_bytes: int = 64 * 1024,
     ):
+        """
+        offload_threshold: frames of at least this many bytes are decrypted and decompressed
+            in `executor` (the loop default thread pool if None), 0 to decode everything inline
+        write_batch_bytes: a write round stops taking queued frames once it holds this many bytes,
+            the rest goes out on the next round; a larger frame still goes out alone
+        """
         if not manual_address:
             host, port = self.V6UPSTREAM if use_v6 else self.V4UPSTREAM
         else:
@@ -42,8 +93,21 @@ class ClientNetwork(Connection):
         self._reconnect_cb = reconnect_cb
         self._disconnect_cb = disconnect_cb
         self._wait_fut_map: dict[int, asyncio.Future[SSOPacket]] = {}
+        # (deadline, order, seq, future) of every waiting request, expired in bulk by one timer
+        self._deadlines: list[tuple[float, int, int, asyncio.Future[SSOPacket]]] = []
+        self._deadline_order = itertools.count()
+        self._expire_handle: Optional[asyncio.TimerHandle] = None
         self._connected = False
         self._sig = sig_info
+        self._d2_cipher: Optional[TEACipher] = None
+        self._offload_threshold = offload_threshold
+        self._executor = executor
+        self._push_tail: Optional[asyncio.Task] = None  # last frame that later pushes must queue behind
+        self._outbox: list[tuple[bytes, asyncio.Future[None]]] = []
+        self._outbox_ready = asyncio.Event()
+        self._write_task: Optional[asyncio.Task] = None
+        self._write_batch_bytes = write_batch_bytes
+        self.frame_stats = FrameStats()
 
     @property
     def using_v6(self) -> bool:
@@ -51,14 +115,71 @@ class ClientNetwork(Connection):
             return self._using_v6
         raise RuntimeError("Network not connect, execute 'connect' first")
 
+    @property
+    def d2_cipher(self) -> TEACipher:
+        """cipher of the current d2_key, rebuilt when the key rotates on login or re-register"""
+        if self._d2_cipher is None or self._d2_cipher.secret_key != self._sig.d2_key:
+            self._d2_cipher = tea_cipher(self._sig.d2_key)
+        return self._d2_cipher
+
     def destroy_connection(self):
         if self._writer:
             self._writer.close()
 
     async def write(self, buf: bytes):
-        await self.conn_event.wait()
-        self.writer.write(buf)
-        await self.writer.drain()
+        """queue buf for the writer task, return once it is flushed to the socket"""
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._outbox.append((buf, fut))
+        self._outbox_ready.set()
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_loop(), name="network_writer")
+        await fut
+
+    def _take_batch(self) -> list[tuple[bytes, asyncio.Future[None]]]:
+        """frames queued first, up to write_batch_bytes and at least one"""
+        size, count = 0, 0
+        for buf, _ in self._outbox:
+            if count and size + len(buf) > self._write_batch_bytes:
+                break
+            size += len(buf)
+            count += 1
+        batch, self._outbox = self._outbox[:count], self._outbox[count:]
+        if not self._outbox:
+            self._outbox_ready.clear()
+        return batch
+
+    async def _write_loop(self):
+        """flush the frames queued since the last round with one writelines and a single drain"""
+        batch: list[tuple[bytes, asyncio.Future[None]]] = []
+        try:
+            while True:
+                await self._outbox_ready.wait()
+                await self.conn_event.wait()
+                batch = self._take_batch()
+                try:
+                    self.writer.writelines([buf for buf, _ in batch])
+                    await self.writer.drain()
+                except Exception as e:
+                    for _, fut in batch:
+                        if not fut.done():
+                            fut.set_exception(e)
+                else:
+                    for _, fut in batch:
+                        if not fut.done():
+                            fut.set_result(None)
+        finally:  # also on cancel mid-drain, the batch taken is no longer in the outbox
+            for _, fut in batch + self._outbox:
+                if not fut.done():
+                    fut.cancel()
+            self._outbox.clear()
+
+    async def stop(self):
+        if self._write_task:
+            self._write_task.cancel()
+        if self._expire_handle:
+            self._expire_handle.cancel()
+            self._expire_handle = None
+        await super().stop()
 
     @overload
     async def send(
@@ -69,15 +190,43 @@ class ClientNetwork(Connection):
     async def send(self, buf: bytes, wait_seq: int, timeout=10) -> SSOPacket: ...  # type: ignore
 
     async def send(self, buf: bytes, wait_seq: int, timeout: int = 10):  # type: ignore
-        await self.write(buf)
-        if wait_seq != -1:
-            fut: asyncio.Future[SSOPacket] = asyncio.Future()
-            self._wait_fut_map[wait_seq] = fut
-            try:
-                await asyncio.wait_for(fut, timeout=timeout)
-                return fut.result()
-            finally:
-                self._wait_fut_map.pop(wait_seq)  # noqa
+        if wait_seq == -1:
+            return await self.write(buf)
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future[SSOPacket] = loop.create_future()
+        self._wait_fut_map[wait_seq] = fut  # before writing, so a fast response always finds it
+        try:
+            await self.write(buf)
+            self._track_deadline(loop, loop.time() + timeout, wait_seq, fut)
+            return await fut
+        finally:
+            if self._wait_fut_map.get(wait_seq) is fut:
+                del self._wait_fut_map[wait_seq]
+
+    def _track_deadline(
+        self, loop: asyncio.AbstractEventLoop, deadline: float, seq: int, fut: asyncio.Future[SSOPacket]
+    ):
+        heap = self._deadlines
+        if len(heap) > 4 * len(self._wait_fut_map) + 64:  # mostly answered requests, drop them
+            heap[:] = [entry for entry in heap if not entry[3].done()]
+            heapq.heapify(heap)
+        heapq.heappush(heap, (deadline, next(self._deadline_order), seq, fut))
+        if heap[0][3] is fut:  # new earliest deadline
+            if self._expire_handle:
+                self._expire_handle.cancel()
+            self._expire_handle = loop.call_at(deadline, self._expire_requests)
+
+    def _expire_requests(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        heap = self._deadlines
+        while heap and heap[0][0] <= now:
+            _, _, seq, fut = heapq.heappop(heap)
+            if not fut.done():
+                fut.set_exception(asyncio.TimeoutError(f"request {seq} timed out"))
+        while heap and heap[0][3].done():  # skip answered ones before arming the next timer
+            heapq.heappop(heap)
+        self._expire_handle = loop.call_at(heap[0][0], self._expire_requests) if heap else None
 
     def _cancel_all_task(self):
         for _, fut in self._wait_fut_map.items():
@@ -119,16 +268,69 @@ class ClientNetwork(Connection):
 
     async def on_message(self, message_length: int):
         raw = await self.reader.readexactly(message_length)
-        enc_flag, uin, sso_body = parse_sso_header(raw, self._sig.d2_key)
+        tail = self._push_tail if self._push_tail and not self._push_tail.done() else None
+        if 0 < self._offload_threshold <= message_length:
+            self._push_tail = asyncio.create_task(self._decode_offloaded(raw, tail))
+            self._push_tail.add_done_callback(self._on_frame_done)
+            return
+
+        start = time.perf_counter()
+        packet = _parse_packet(raw, self.d2_cipher)
+        cost = time.perf_counter() - start
+        self.frame_stats.record_inline(cost)
+        if cost > self.SLOW_FRAME:
+            log.network.debug(f"{packet.cmd}: {message_length} bytes blocked the loop for {cost * 1000:.1f}ms")
+
+        if tail is not None and packet.seq < 0:  # keep pushes in wire order
+            self._push_tail = asyncio.create_task(self._dispatch(packet, tail))
+            self._push_tail.add_done_callback(self._on_frame_done)
+        else:
+            await self._dispatch(packet)
+
+    async def _decode_offloaded(self, raw: bytes, tail: Optional[asyncio.Task]):
+        start = time.perf_counter()
+        try:
+            packet = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _parse_packet, raw, self._sig.d2_key
+            )
+        except FrameError as e:
+            if e.seq is None:
+                self._fail_waiting(e)
+            elif e.seq > 0:  # a response, pushes have no waiter
+                self._fail_waiting(e, e.seq)
+            raise
+        except Exception as e:  # not even decrypted, the seq is lost
+            self._fail_waiting(e)
+            raise
+        self.frame_stats.offloaded_frames += 1
+        self.frame_stats.offloaded_time += time.perf_counter() - start
+        await self._dispatch(packet, tail)
+
+    def _fail_waiting(self, err: Exception, seq: Optional[int] = None):
+        """
+        fail the request `seq` right away instead of letting it time out,
+        every waiting request if the frame that answered one of them is unreadable
+        """
+        for fut_seq, fut in list(self._wait_fut_map.items()):
+            if (seq is None or fut_seq == seq) and not fut.done():
+                fut.set_exception(err)
 
-        packet = parse_sso_frame(sso_body, enc_flag == 2)
+    @staticmethod
+    def _on_frame_done(task: asyncio.Task):
+        if not task.cancelled() and (err := task.exception()):
+            log.network.error(f"Failed to handle frame: {repr(err)}")
 
+    async def _dispatch(self, packet: SSOPacket, after: Optional[asyncio.Task] = None):
+        """after: an earlier frame still being decoded, pushes wait for it"""
         if packet.seq > 0:  # uni rsp
             log.network.debug(
                 f"{packet.seq}({packet.ret_code})-> {packet.cmd or packet.extra}"
             )
-            if packet.ret_code != 0 and packet.seq in self._wait_fut_map:
-                return self._wait_fut_map[packet.seq].set_exception(
+            fut = self._wait_fut_map.get(packet.seq)
+            if fut is not None and fut.done():  # timed out or cancelled, not removed yet
+                fut = None
+            if packet.ret_code != 0 and fut is not None:
+                return fut.set_exception(
                     AssertionError(packet.ret_code, packet.extra)
                 )
             elif packet.ret_code != 0:
@@ -136,16 +338,18 @@ class ClientNetwork(Connection):
                     f"Unexpected error on sso layer: {packet.ret_code}: {packet.extra}"
                 )
 
-            if packet.seq not in self._wait_fut_map:
+            if fut is None:
                 log.network.warning(
                     f"Unknown packet: {packet.cmd}({packet.seq}), ignore"
                 )
             else:
-                self._wait_fut_map[packet.seq].set_result(packet)
+                fut.set_result(packet)
         elif packet.seq == 0:
             raise AssertionError(packet.ret_code, packet.extra)
         else:  # server pushed
             log.network.debug(
                 f"{packet.seq}({packet.ret_code})<- {packet.cmd or packet.extra}"
             )
+            if after is not None:
+                await asyncio.wait([after])
             await self._push_store.put(packet)
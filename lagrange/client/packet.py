@@ -1,8 +1,13 @@
+import struct
+from contextlib import contextmanager
+from collections.abc import Iterator
+
 from typing_extensions import Literal, Self
 
 from lagrange.utils.binary.builder import BYTES_LIKE, Builder
 
 LENGTH_PREFIX = Literal["none", "u8", "u16", "u32", "u64"]
+_PREFIX_FMT = {"u8": "B", "u16": "H", "u32": "I", "u64": "Q"}
 
 
 class PacketBuilder(Builder):
@@ -43,3 +48,19 @@ class PacketBuilder(Builder):
         self, s: str, prefix: LENGTH_PREFIX = "u32", with_prefix: bool = True
     ) -> Self:
         return self.write_bytes(s.encode(), prefix=prefix, with_prefix=with_prefix)
+
+    @contextmanager
+    def length_prefixed(self, prefix: LENGTH_PREFIX = "u32", with_prefix: bool = True) -> Iterator[Self]:
+        """
+        write a length-prefixed section in place,
+        the length slot is reserved on enter and back-patched on exit
+        """
+        if prefix not in _PREFIX_FMT:
+            raise ArithmeticError("Invaild prefix")
+        fmt = _PREFIX_FMT[prefix]
+        offset = self.reserve(fmt)
+        yield self
+        length = len(self._buffer) - offset
+        if not with_prefix:
+            length -= struct.calcsize(f">{fmt}")
+        self.patch(offset, fmt, length)
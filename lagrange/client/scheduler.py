@@ -0,0 +1,122 @@
+"""
+Priority-aware admission of outbound requests
+"""
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Optional
+from collections.abc import AsyncIterator
+
+
+class Priority(IntEnum):
+    CONTROL = 0  # login, register, heartbeat
+    SEND_MESSAGE = 1
+    QUERY = 2
+    BULK = 3  # paginated syncs: member lists, friend list
+
+
+_CONTROL_PREFIX = (
+    "wtlogin.",
+    "trpc.login.",
+    "trpc.qq_new_tech.status_svc.",
+)
+_SEND_MESSAGE_CMD = {"MessageSvc.PbSendMsg"}
+# compared casefolded, oidb commands go out as 0xFD4_1
+_BULK_CMD = {
+    "oidbsvctrpctcp.0xfd4_1",  # friend list pages
+}
+
+DEFAULT_LIMITS: dict[Priority, Optional[int]] = {
+    Priority.CONTROL: None,  # never queued
+    Priority.SEND_MESSAGE: 16,
+    Priority.QUERY: 16,
+    Priority.BULK: 4,
+}
+
+
+def classify(cmd: str) -> Priority:
+    if cmd.startswith(_CONTROL_PREFIX):
+        return Priority.CONTROL
+    elif cmd in _SEND_MESSAGE_CMD:
+        return Priority.SEND_MESSAGE
+    elif cmd.casefold() in _BULK_CMD:
+        return Priority.BULK
+    return Priority.QUERY
+
+
+class SendScheduler:
+    """
+    admit requests in priority order, each class has its own concurrency limit
+    and the classes below CONTROL share `max_in_flight`, control traffic is always admitted
+    """
+
+    def __init__(self, limits: Optional[dict[Priority, Optional[int]]] = None, max_in_flight: int = 32):
+        self._limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self._max_in_flight = max_in_flight
+        self._running = dict.fromkeys(Priority, 0)
+        self._in_flight = 0  # CONTROL excluded
+        self._queues: dict[Priority, deque[asyncio.Future[None]]] = {p: deque() for p in Priority}
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight + self._running[Priority.CONTROL]
+
+    def running(self) -> dict[Priority, int]:
+        return dict(self._running)
+
+    def queue_depths(self) -> dict[Priority, int]:
+        return {p: len(q) for p, q in self._queues.items()}
+
+    def _can_run(self, priority: Priority) -> bool:
+        if priority is Priority.CONTROL:
+            return True
+        limit = self._limits[priority]
+        return self._in_flight < self._max_in_flight and (limit is None or self._running[priority] < limit)
+
+    def _take(self, priority: Priority):
+        self._running[priority] += 1
+        if priority is not Priority.CONTROL:
+            self._in_flight += 1
+
+    def _release(self, priority: Priority):
+        self._running[priority] -= 1
+        if priority is not Priority.CONTROL:
+            self._in_flight -= 1
+        self._wakeup()
+
+    def _wakeup(self):
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue and self._can_run(priority):
+                fut = queue.popleft()
+                if not fut.done():
+                    self._take(priority)
+                    fut.set_result(None)
+
+    async def _acquire(self, priority: Priority):
+        if not self._queues[priority] and self._can_run(priority):
+            self._take(priority)
+            return
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._queues[priority].append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():  # admitted right before the cancel
+                self._release(priority)
+            else:
+                try:
+                    self._queues[priority].remove(fut)
+                except ValueError:
+                    pass
+            raise
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority) -> AsyncIterator[None]:
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release(priority)
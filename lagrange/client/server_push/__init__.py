@@ -1,10 +1,19 @@
 from .binder import PushDeliver
-from .msg import msg_push_handler
+from .msg import MsgPushFilter, msg_push_handler, msg_push_key
 from .service import server_kick_handler
 
+__all__ = [
+    "MsgPushFilter",
+    "PushDeliver",
+    "bind_services",
+    "msg_push_handler",
+    "msg_push_key",
+    "server_kick_handler",
+]
+
 
 def bind_services(pd: PushDeliver):
-    pd.subscribe("trpc.msg.olpush.OlPushService.MsgPush", msg_push_handler)
+    pd.subscribe("trpc.msg.olpush.OlPushService.MsgPush", msg_push_handler, msg_push_key)
     pd.subscribe(
         "trpc.qq_new_tech.status_svc.StatusService.KickNT", server_kick_handler
     )
@@ -1,5 +1,5 @@
-from typing import Any, Callable, TYPE_CHECKING
-from collections.abc import Coroutine
+from typing import Any, Callable, Optional, TYPE_CHECKING
+from collections.abc import Coroutine, Hashable
 
 from lagrange.client.wtlogin.sso import SSOPacket
 
@@ -15,9 +15,23 @@ class PushDeliver:
         self._handle_map: dict[
             str, Callable[["Client", SSOPacket], Coroutine[None, None, Any]]
         ] = {}
+        self._key_map: dict[str, Callable[["Client", SSOPacket], Optional[Hashable]]] = {}
 
-    def subscribe(self, cmd: str, func: Callable[["Client", SSOPacket], Coroutine[None, None, Any]]):
+    def subscribe(
+        self,
+        cmd: str,
+        func: Callable[["Client", SSOPacket], Coroutine[None, None, Any]],
+        key: Optional[Callable[["Client", SSOPacket], Optional[Hashable]]] = None,
+    ):
+        """key: returns the conversation of a push, pushes of one conversation are handled in order"""
         self._handle_map[cmd] = func
+        if key:
+            self._key_map[cmd] = key
+
+    def key_of(self, cmd: str, sso: SSOPacket) -> Optional[Hashable]:
+        if cmd in self._key_map:
+            return self._key_map[cmd](self._client, sso)
+        return None
 
     async def execute(self, cmd: str, sso: SSOPacket):
         if cmd not in self._handle_map:
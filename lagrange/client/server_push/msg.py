@@ -1,9 +1,11 @@
 import json
 import re
+from dataclasses import dataclass, field
 from urllib.parse import parse_qsl
-from typing import TYPE_CHECKING, TypeVar, Union
+from typing import TYPE_CHECKING, Callable, TypeVar, Union
 
 from lagrange.client.message.decoder import parse_grp_msg, parse_friend_msg
+from lagrange.pb.message.heads import ResponseHead
 from lagrange.pb.message.msg_push import MsgPush
 from lagrange.pb.status.group import (
     GroupRenamedBody,
@@ -58,21 +60,79 @@ T = TypeVar("T", bound=ProtoStruct)
 
 
 def unpack(buf2: bytes, decoder: type[T]) -> tuple[int, T]:
-    reader = Reader(buf2)
+    reader = Reader(buf2, zero_copy=True)
     grp_id = reader.read_u32()
     reader.read_u8()
     return grp_id, decoder.decode(reader.read_bytes_with_length("u16", False))
 
 
+GRP_MSG_TYPE = 82
+FRD_MSG_TYPES = (166, 208, 529)
+
+
+@dataclass
+class MsgPushFilter:
+    """
+    drop message pushes by their heads, before the message body is decoded
+    and any media url is resolved, only group and friend messages are checked
+    """
+
+    ignore_self: bool = False  # own group messages synced from other devices
+    ignore_uins: set[int] = field(default_factory=set)  # senders
+    ignore_groups: set[int] = field(default_factory=set)  # blocklisted or muted groups
+    # (client, content_head.type, response_head) -> False to drop
+    predicates: list[Callable[["Client", int, ResponseHead], bool]] = field(default_factory=list)
+    dropped: int = 0
+
+    def accept(self, client: "Client", typ: int, head: ResponseHead) -> bool:
+        if typ == GRP_MSG_TYPE:
+            if self.ignore_self and head.from_uin == client.uin:
+                return self._drop()
+            if head.rsp_grp and head.rsp_grp.gid in self.ignore_groups:
+                return self._drop()
+        elif typ not in FRD_MSG_TYPES:
+            return True
+        if head.from_uin in self.ignore_uins:
+            return self._drop()
+        for predicate in self.predicates:
+            if not predicate(client, typ, head):
+                return self._drop()
+        return True
+
+    def _drop(self) -> bool:
+        self.dropped += 1
+        return False
+
+
+def _decode_push(sso: SSOPacket) -> MsgPush:
+    """decoded once, by the shard key or the handler, whichever runs first"""
+    if not isinstance(sso.decoded, MsgPush):
+        sso.decoded = MsgPush.decode(sso.data)
+    return sso.decoded
+
+
+def msg_push_key(client: "Client", sso: SSOPacket) -> tuple[str, Union[int, str]]:
+    head = _decode_push(sso).body.response_head  # message body is lazy, not decoded here
+    if head.rsp_grp and head.rsp_grp.gid:
+        return "grp", head.rsp_grp.gid
+    peer = head.to_uid if head.from_uid == client.uid else head.from_uid
+    if peer:
+        return "frd", peer
+    return "grp", head.from_uin  # group events carry the group in from_uin
+
+
 async def msg_push_handler(client: "Client", sso: SSOPacket):
-    pkg = MsgPush.decode(sso.data).body
+    pkg = _decode_push(sso).body
     typ = pkg.content_head.type
     sub_typ = pkg.content_head.sub_type
 
     logger.debug(f"msg_push received, type: {typ}.{sub_typ}")
-    if typ == 82:  # grp msg
+    if not client.msg_push_filter.accept(client, typ, pkg.response_head):
+        logger.debug(f"msg_push from {pkg.response_head.from_uin} filtered")
+        return
+    if typ == GRP_MSG_TYPE:  # grp msg
         return await parse_grp_msg(client, pkg)
-    elif typ in [166, 208, 529]:  # frd msg
+    elif typ in FRD_MSG_TYPES:  # frd msg
         if pkg.message:
             return await parse_friend_msg(client, pkg)
     elif typ == 33:  # member joined
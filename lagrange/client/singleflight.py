@@ -0,0 +1,56 @@
+"""
+Coalescing of identical concurrent requests
+"""
+
+import asyncio
+from typing import Any, Callable, Generic, TypeVar
+from collections.abc import Awaitable, Hashable
+
+T = TypeVar("T")
+
+# (cmd, sub_cmd) of read-only oidb requests, safe to share one response;
+# credential fetches (cookies, client key) are left out, every caller gets its own ticket
+IDEMPOTENT_OIDB: frozenset[tuple[int, int]] = frozenset(
+    {
+        (0xFE5, 2),  # group list
+        (0xFE7, 4),  # group members / member info
+        (0xFD4, 1),  # friend list
+        (0xFE1, 8),  # user info
+        (0x88D, 0),  # group last seq
+        (0x10C0, 1),  # group requests
+        (0x9067, 202),  # rkey
+    }
+)
+
+
+class SingleFlight(Generic[T]):
+    """
+    callers of `do` with the same key while a call is in flight share its result,
+    the call runs on its own task so a cancelled caller does not cancel the others
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, asyncio.Future[T]] = {}
+        self.calls = 0  # calls actually made
+        self.hits = 0  # callers that joined a call in flight
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def _landed(self, key: Hashable, fut: "asyncio.Future[Any]"):
+        if self._flights.get(key) is fut:
+            del self._flights[key]
+        if not fut.cancelled():
+            fut.exception()  # retrieved, even if every caller is gone
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        if key in self._flights:
+            self.hits += 1
+            fut = self._flights[key]
+        else:
+            self.calls += 1
+            fut = asyncio.ensure_future(func())
+            self._flights[key] = fut
+            fut.add_done_callback(lambda f: self._landed(key, f))
+        return await asyncio.shield(fut)
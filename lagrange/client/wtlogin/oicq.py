@@ -1,12 +1,13 @@
 import hashlib
 import os
+from typing import Optional
 
 from lagrange.client.packet import PacketBuilder
 from lagrange.info import AppInfo, DeviceInfo, SigInfo
 from lagrange.utils.binary.protobuf import proto_decode, proto_encode
 from lagrange.utils.binary.reader import Reader
 from lagrange.utils.crypto.ecdh import ecdh
-from lagrange.utils.crypto.tea import qqtea_decrypt, qqtea_encrypt
+from lagrange.utils.crypto.tea import TEACipher, qqtea_decrypt, qqtea_encrypt, tea_cipher
 from lagrange.utils.log import log
 from lagrange.utils.operator import timestamp
 
@@ -41,9 +42,10 @@ def build_code2d_packet(uin: int, cmd_id: int, app_info: AppInfo, body: bytes) -
 def build_login_packet(uin: int, cmd: str, app_info: AppInfo, body: bytes) -> bytes:
     enc_body = qqtea_encrypt(body, ecdh["secp192k1"].share_key)
 
-    frame_body = (
-        PacketBuilder()
-        .write_u16(8001)
+    frame = PacketBuilder().write_u8(2)
+    length = frame.reserve("H")
+    (
+        frame.write_u16(8001)
         .write_u16(2064 if cmd == "wtlogin.login" else 2066)
         .write_u16(0)
         .write_u32(uin)
@@ -62,16 +64,9 @@ def build_login_packet(uin: int, cmd: str, app_info: AppInfo, body: bytes) -> by
         .write_bytes(ecdh["secp192k1"].public_key)
         .write_bytes(enc_body)
         .write_u8(3)
-    ).pack()
-
-    frame = (
-        PacketBuilder()
-        .write_u8(2)
-        .write_u16(len(frame_body) + 3)  # + 2 + 1
-        .write_bytes(frame_body)
-    ).pack()
-
-    return frame
+    )
+    frame.patch(length, "H", len(frame))  # whole frame, the 0x02 and the length itself included
+    return frame.pack()
 
 
 def build_uni_packet(
@@ -83,7 +78,9 @@ def build_uni_packet(
     device_info: DeviceInfo,
     sig_info: SigInfo,
     body: bytes,
+    cipher: Optional[TEACipher] = None,
 ) -> bytes:
+    """cipher: prepared TEA cipher of sig_info.d2_key, looked up from the key if omitted"""
     trace = f"00-{os.urandom(16).hex()}-{os.urandom(8).hex()}-01"
 
     head: dict = {15: trace, 16: sig_info.uid}
@@ -94,38 +91,38 @@ def build_uni_packet(
             3: bytes.fromhex(sign["extra"]),
         }
 
-    sso_header = (
-        PacketBuilder()
-        .write_u32(seq)
-        .write_u32(app_info.sub_app_id)
-        .write_u32(2052)  # locale id
-        .write_bytes(bytes.fromhex("020000000000000000000000"))
-        .write_bytes(sig_info.tgt, "u32")
-        .write_string(cmd, "u32")
-        .write_bytes(b"", "u32")
-        .write_bytes(bytes.fromhex(device_info.guid), "u32")
-        .write_bytes(b"", "u32")
-        .write_string(app_info.current_version, "u16")
-        .write_bytes(proto_encode(head), "u32")
-    ).pack()
-
-    sso_packet = (
-        PacketBuilder().write_bytes(sso_header, "u32").write_bytes(body, "u32")
-    ).pack()
-
-    encrypted = qqtea_encrypt(sso_packet, sig_info.d2_key)
-
-    service = (
-        PacketBuilder()
-        .write_u32(12)
-        .write_u8(1 if sig_info.d2 else 2)
-        .write_bytes(sig_info.d2, "u32")
-        .write_u8(0)
-        .write_string(str(uin), "u32")
-        .write_bytes(encrypted)
-    ).pack()
-
-    return PacketBuilder().write_bytes(service, "u32").pack()
+    sso_packet = PacketBuilder()
+    with sso_packet.length_prefixed("u32"):  # sso header
+        (
+            sso_packet.write_u32(seq)
+            .write_u32(app_info.sub_app_id)
+            .write_u32(2052)  # locale id
+            .write_bytes(bytes.fromhex("020000000000000000000000"))
+            .write_bytes(sig_info.tgt, "u32")
+            .write_string(cmd, "u32")
+            .write_bytes(b"", "u32")
+            .write_bytes(bytes.fromhex(device_info.guid), "u32")
+            .write_bytes(b"", "u32")
+            .write_string(app_info.current_version, "u16")
+            .write_bytes(proto_encode(head), "u32")
+        )
+    sso_packet.write_bytes(body, "u32")
+
+    if cipher is None:
+        cipher = tea_cipher(sig_info.d2_key)
+    encrypted = cipher.encrypt(sso_packet.buffer)
+
+    service = PacketBuilder()
+    with service.length_prefixed("u32"):
+        (
+            service.write_u32(12)
+            .write_u8(1 if sig_info.d2 else 2)
+            .write_bytes(sig_info.d2, "u32")
+            .write_u8(0)
+            .write_string(str(uin), "u32")
+            .write_bytes(encrypted)
+        )
+    return service.pack()
 
 
 def decode_login_response(buf: bytes, sig: SigInfo):
@@ -142,7 +139,7 @@ def decode_login_response(buf: bytes, sig: SigInfo):
         sig.d2_key = tlv.get(0x305) or sig.d2_key
         sig.tgtgt = hashlib.md5(sig.d2_key).digest()
         sig.temp_pwd = tlv[0x106]
-        sig.uid = proto_decode(tlv[0x543]).into((9, 11, 1), bytes).decode()
+        sig.uid = proto_decode(tlv[0x543], 0).into((9, 11, 1), bytes).decode()
         sig.info_updated()
 
         log.login.debug("SigInfo got")
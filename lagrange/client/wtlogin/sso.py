@@ -2,10 +2,11 @@ import struct
 import zlib
 from dataclasses import dataclass, field
 from io import BytesIO
+from typing import Any, Union
 
 from lagrange.utils.binary.reader import Reader
 from lagrange.utils.crypto.ecdh import ecdh
-from lagrange.utils.crypto.tea import qqtea_decrypt
+from lagrange.utils.crypto.tea import TEACipher, qqtea_decrypt, tea_cipher
 
 
 @dataclass
@@ -16,6 +17,7 @@ class SSOPacket:
     session_id: bytes
     cmd: str = field(default="")
     data: bytes = field(default=b"")
+    decoded: Any = field(default=None, repr=False, compare=False)  # data decoded once, shared by its consumers
 
 
 def parse_lv(buffer: BytesIO):  # u32 len only
@@ -23,7 +25,7 @@ def parse_lv(buffer: BytesIO):  # u32 len only
     return buffer.read(length - 4)
 
 
-def parse_sso_header(raw: bytes, d2_key: bytes) -> tuple[int, str, bytes]:
+def parse_sso_header(raw: bytes, d2_key: Union[bytes, TEACipher]) -> tuple[int, str, bytes]:
     buf = BytesIO(raw)
     # parse sso header
     buf.read(4)
@@ -33,7 +35,8 @@ def parse_sso_header(raw: bytes, d2_key: bytes) -> tuple[int, str, bytes]:
     if flag == 0:  # no encrypted
         dec = buf.read()
     elif flag == 1:  # enc with d2key
-        dec = qqtea_decrypt(buf.read(), d2_key)
+        cipher = tea_cipher(d2_key) if isinstance(d2_key, (bytes, bytearray)) else d2_key
+        dec = cipher.decrypt(buf.read())
     elif flag == 2:  # enc with \x00*16
         dec = qqtea_decrypt(buf.read(), bytes(16))
     else:
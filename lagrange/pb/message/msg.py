@@ -6,6 +6,6 @@ from .rich_text import RichText
 
 
 class Message(ProtoStruct):
-    body: Optional[RichText] = proto_field(1, default=None)
+    body: Optional[RichText] = proto_field(1, default=None, lazy=True)
     buf2: bytes = proto_field(2, default=b"")
     buf3: bytes = proto_field(3, default=b"")
@@ -9,7 +9,7 @@ from .msg import Message
 class MsgPushBody(ProtoStruct):
     response_head: ResponseHead = proto_field(1)
     content_head: ContentHead = proto_field(2)
-    message: Optional[Message] = proto_field(3, default=None)
+    message: Optional[Message] = proto_field(3, default=None, lazy=True)
 
 
 class MsgPush(ProtoStruct):
@@ -38,9 +38,29 @@ class Builder:
         return self
 
     def pack(self, typ: Optional[int] = None) -> bytes:
+        data = self.data
         if typ is not None:
-            return struct.pack(">HH", typ, len(self.data)) + self.data
-        return self.data
+            return struct.pack(">HH", typ, len(data)) + data
+        return data
+
+    def pack_into(self, buffer: bytearray, offset: int = 0) -> int:
+        """copy the packed data into a preallocated buffer at `offset`, return the end offset"""
+        data = self.data
+        end = offset + len(data)
+        if end > len(buffer):
+            raise ValueError(f"buffer too small, {end} bytes needed, {len(buffer)} available")
+        buffer[offset:end] = data
+        return end
+
+    def reserve(self, struct_fmt: str) -> int:
+        """reserve a zero-filled slot for `struct_fmt`, return its offset, fill it with `patch` later"""
+        offset = len(self._buffer)
+        self._buffer += bytes(struct.calcsize(f">{struct_fmt}"))
+        return offset
+
+    def patch(self, offset: int, struct_fmt: str, *args) -> Self:
+        struct.pack_into(f">{struct_fmt}", self._buffer, offset, *args)
+        return self
 
     def write_bool(self, v: bool) -> Self:
         return self._pack("?", v)
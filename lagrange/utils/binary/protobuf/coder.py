@@ -1,4 +1,4 @@
-from typing import Union, TypeVar, TYPE_CHECKING, cast
+from typing import Any, Union, TypeVar, TYPE_CHECKING, cast, get_args, get_origin
 from collections.abc import Mapping, Sequence
 from typing_extensions import Self, TypeAlias
 
@@ -18,6 +18,111 @@ ProtoEncodable: TypeAlias = Union[
 TProtoEncodable = TypeVar("TProtoEncodable", bound="ProtoEncodable")
 
 
+_VARINT_CACHE = [bytes((i,)) for i in range(128)]
+
+
+def encode_varint(v: int) -> bytes:
+    if v < 128:
+        return _VARINT_CACHE[v]
+    buffer = bytearray()
+    while v > 127:
+        buffer.append((v & 127) | 128)
+        v >>= 7
+    buffer.append(v)
+    return bytes(buffer)
+
+
+def decode_varint(data: bytes, pos: int) -> tuple[int, int]:
+    """read a varint at `pos`, return (value, next_pos)"""
+    byte = data[pos]
+    if byte < 128:
+        return byte, pos + 1
+    value = byte & 127
+    shift = 7
+    while True:
+        pos += 1
+        byte = data[pos]
+        value |= (byte & 127) << shift
+        if byte < 128:
+            return value, pos + 1
+        shift += 7
+
+
+def _scan_varint(data: Union[bytes, memoryview], pos: int, end: int) -> tuple[int, int]:
+    """same as decode_varint, return pos -1 instead of raising if truncated"""
+    value = 0
+    shift = 0
+    while pos < end:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 127) << shift
+        if byte < 128:
+            return value, pos
+        shift += 7
+    return 0, -1
+
+
+def is_message(data: Union[bytes, memoryview]) -> bool:
+    """
+    check the wire structure of a length-delimited value without decoding it,
+    True if proto_decode can parse its top layer
+    """
+    pos, end = 0, len(data)
+    while pos < end:
+        leaf = data[pos]
+        if leaf < 128:
+            pos += 1
+        else:
+            leaf, pos = _scan_varint(data, pos, end)
+            if pos < 0:
+                return False
+        if leaf < 8:  # tag 0
+            return False
+        wire_type = leaf & 0b111
+        if wire_type == 0:
+            _, pos = _scan_varint(data, pos, end)
+            if pos < 0:
+                return False
+        elif wire_type == 2:
+            length, pos = _scan_varint(data, pos, end)
+            if pos < 0:
+                return False
+            pos += length
+            if pos > end:
+                return False
+        elif wire_type == 5:
+            pos += 4
+            if pos > end:
+                return False
+        else:
+            return False
+    return True
+
+
+def _into(value: Any, tp: Any) -> Any:
+    """decode undecoded messages along `tp`"""
+    origin = get_origin(tp) or tp
+    if origin is list:
+        if not isinstance(value, list):
+            value = [value]
+        if args := get_args(tp):
+            return [_into(v, args[0]) for v in value]
+        return value
+    if origin is dict:
+        if isinstance(value, (bytes, memoryview)):
+            value = proto_decode(value, 0).proto
+        if args := get_args(tp):
+            ret = {}
+            for k, v in value.items():
+                if isinstance(v, list) and get_origin(args[1]) is not list:  # repeated elem
+                    ret[k] = [_into(i, args[1]) for i in v]
+                else:
+                    ret[k] = _into(v, args[1])
+            return ret
+        return value
+    return value
+
+
 class ProtoDecoded:
     def __init__(self, proto: Proto):
         self.proto = proto
@@ -26,29 +131,26 @@ class ProtoDecoded:
         return self.proto[item]
 
     def into(self, field: Union[int, tuple[int, ...]], tp: type[TProtoEncodable]) -> TProtoEncodable:
+        """
+        get the value on a tag path and convert it to `tp`,
+        messages left undecoded (e.g. decoded with max_layer=0) are decoded along the path
+        """
         if isinstance(field, int):
-            return cast(tp, self.proto[field])
-        else:
-            data = self.proto
-            for f in field:
-                data = data[f]  # type: ignore
-            return cast(tp, data)
+            field = (field,)
+        data: Any = self.proto
+        for f in field:
+            if isinstance(data, (bytes, memoryview)):
+                data = proto_decode(data, 0).proto
+            data = data[f]
+        return cast(tp, _into(data, tp))
 
 
 class ProtoBuilder(Builder):
     def write_varint(self, v: int) -> Self:
-        if v >= 127:
-            buffer = bytearray()
-
-            while v > 127:
-                buffer.append((v & 127) | 128)
-                v >>= 7
-
-            buffer.append(v)
-            self.write_bytes(buffer)
+        if v < 128:
+            self._buffer.append(v)
         else:
-            self.write_u8(v)
-
+            self._buffer += encode_varint(v)
         return self
 
     def write_length_delimited(self, v: LengthDelimited) -> Self:
@@ -63,17 +165,7 @@ class ProtoBuilder(Builder):
 
 class ProtoReader(Reader):
     def read_varint(self) -> int:
-        value = 0
-        count = 0
-
-        while True:
-            byte = self.read_u8()
-            value |= (byte & 127) << (count * 7)
-            count += 1
-
-            if (byte & 128) <= 0:
-                break
-
+        value, self._pos = decode_varint(self._buffer, self._pos)
         return value
 
     def read_length_delimited(self) -> bytes:
@@ -123,29 +215,37 @@ def _encode(builder: ProtoBuilder, tag: int, value: ProtoEncodable):
         raise AssertionError
 
 
-def proto_decode(data: bytes, max_layer=-1) -> ProtoDecoded:
-    reader = ProtoReader(data)
+def proto_decode(data: Union[bytes, memoryview], max_layer=-1) -> ProtoDecoded:
+    if not isinstance(data, memoryview):  # nested values are sliced as views
+        data = memoryview(data)
     proto = {}
+    pos, end = 0, len(data)
 
-    while reader.remain > 0:
-        leaf = reader.read_varint()
+    while pos < end:
+        leaf, pos = decode_varint(data, pos)
         tag = leaf >> 3
         wire_type = leaf & 0b111
 
         assert tag > 0, f"Invalid tag: {tag}"
 
         if wire_type == 0:
-            value = reader.read_varint()
+            value, pos = decode_varint(data, pos)
         elif wire_type == 2:
-            value = reader.read_length_delimited()
-
-            if max_layer > 0 or max_layer < 0 and len(value) > 1:
-                try:  # serialize nested
-                    value = proto_decode(value, max_layer - 1).proto
-                except Exception:
-                    pass
+            length, pos = decode_varint(data, pos)
+            value = data[pos : pos + length]
+            pos += length
+            if len(value) != length:
+                raise ValueError("length of data does not match")
+
+            if (max_layer > 0 or max_layer < 0 and length > 1) and is_message(value):  # serialize nested
+                value = proto_decode(value, max_layer - 1).proto
+            else:
+                value = bytes(value)
         elif wire_type == 5:
-            value = reader.read_u32()
+            if pos + 4 > end:
+                raise ValueError("length of data does not match")
+            value = int.from_bytes(data[pos : pos + 4], "big")
+            pos += 4
         else:
             raise AssertionError(wire_type)
 
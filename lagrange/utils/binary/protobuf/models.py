@@ -1,13 +1,15 @@
 import sys
 from dataclasses import MISSING
-from types import GenericAlias
+from types import GenericAlias, MemberDescriptorType
 from typing import cast, TypeVar, Union, Any, Callable, overload, get_origin, get_args, ForwardRef
 from collections.abc import Mapping
 from typing_extensions import Self, TypeAlias, dataclass_transform
 from typing import Optional, ClassVar
 import typing
 
-from .coder import Proto, proto_decode, proto_encode
+from lagrange.utils.log import log
+
+from .coder import Proto, proto_decode, proto_encode, encode_varint, decode_varint
 
 _ProtoTypes = Union[str, list, dict, bytes, int, float, bool, "ProtoStruct"]
 
@@ -28,12 +30,13 @@ class ProtoField:
     name: str
     type: Any
 
-    def __init__(self, tag: int, default: Any, default_factory: Any):
+    def __init__(self, tag: int, default: Any, default_factory: Any, lazy: bool = False):
         if tag <= 0:
             raise ValueError("Tag must be a positive integer")
         self.tag = tag
         self.default = default
         self.default_factory = default_factory
+        self.lazy = lazy
         self._unevaluated = False
 
     def ensure_annotation(self, name: str, type_: Any) -> None:
@@ -67,6 +70,7 @@ def proto_field(
     repr: bool = True,
     metadata: Optional[Mapping[Any, Any]] = None,
     kw_only: bool = ...,
+    lazy: bool = False,
 ) -> T:
     ...
 
@@ -80,6 +84,7 @@ def proto_field(
     repr: bool = True,
     metadata: Optional[Mapping[Any, Any]] = None,
     kw_only: bool = ...,
+    lazy: bool = False,
 ) -> T:
     ...
 
@@ -92,6 +97,7 @@ def proto_field(
     repr: bool = True,
     metadata: Optional[Mapping[Any, Any]] = None,
     kw_only: bool = ...,
+    lazy: bool = False,
 ) -> Any:
     ...
 
@@ -105,8 +111,13 @@ def proto_field(
     repr: bool = True,
     metadata: Optional[Mapping[Any, Any]] = None,
     kw_only: bool = False,
+    lazy: bool = False,
 ) -> "Any":
-    return ProtoField(tag, default, default_factory)
+    """
+    lazy: only for `ProtoStruct` and `list[ProtoStruct]` fields,
+        keep the raw slice on decode and decode it on first access
+    """
+    return ProtoField(tag, default, default_factory, lazy)
 
 
 def _decode(typ: type[_ProtoTypes], raw):
@@ -167,22 +178,320 @@ def check_type(value: Any, typ: Any) -> bool:
     return True if value is None else False  # proto3 std
 
 
+def _decode_str(raw) -> str:
+    return str(raw, "utf-8", "ignore")
+
+
+def _decode_dict(raw) -> dict:
+    return proto_decode(raw).proto
+
+
+def _decode_bool(raw) -> bool:
+    return raw == 1
+
+
+def _decode_raw(raw):
+    if isinstance(raw, memoryview):
+        return bytes(raw)
+    return raw
+
+
+def _decode_instance_of(typ: type) -> Callable[[Any], Any]:
+    def _decoder(raw):
+        raw = _decode_raw(raw)
+        if isinstance(raw, typ):
+            return raw
+        raise NotImplementedError(f"unknown type '{typ}' and data {raw}")
+
+    return _decoder
+
+
+def _compile_value_decoder(typ: Any) -> Callable[[Any], Any]:
+    if isinstance(typ, str):
+        raise ValueError(
+            f"ForwardRef '{typ}' not resolved. "
+            f"Please call ProtoStruct.update_forwardref({{'{typ}': {typ}}}) before decoding"
+        )
+    if isinstance(typ, type) and issubclass(typ, ProtoStruct):
+        return typ.decode
+    elif typ is str:
+        return _decode_str
+    elif typ is dict:
+        return _decode_dict
+    elif typ is bool:
+        return _decode_bool
+    elif typ is bytes or typ is int:
+        return _decode_instance_of(typ)
+    return lambda raw: _decode(typ, _decode_raw(raw))
+
+
+def _write_value(buf: bytearray, value: Any, varint_head: bytes, ld_head: bytes):
+    if isinstance(value, int):  # bool is a subclass of int
+        if value < 0:
+            raise NotImplementedError
+        buf += varint_head
+        buf += encode_varint(int(value))
+        return
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    elif isinstance(value, ProtoStruct):
+        value = value.encode()
+    elif isinstance(value, dict):
+        value = proto_encode(value)
+    elif isinstance(value, float):
+        raise NotImplementedError
+    elif not isinstance(value, (bytes, bytearray)):
+        raise Exception("Unsupported wire type in protobuf")
+    buf += ld_head
+    buf += encode_varint(len(value))
+    buf += value
+
+
+class _LazyField:
+    """
+    Placeholder of a lazy field on the class,
+    the raw slice is decoded on first access and the result is cached on the instance
+    """
+
+    __slots__ = ("name", "tag", "key", "slot")
+
+    def __init__(self, name: str, tag: int, slot: Optional[MemberDescriptorType] = None):
+        self.name = name
+        self.tag = tag
+        self.key = _lazy_key(name)
+        self.slot = slot  # the slot this descriptor replaced on slotted classes
+
+    def __get__(self, obj: Optional["ProtoStruct"], owner: Any = None) -> Any:
+        if obj is None:
+            return self
+        try:
+            if self.slot is not None:
+                return self.slot.__get__(obj, owner)
+            return obj.__dict__[self.name]
+        except (AttributeError, KeyError):
+            pass
+        try:
+            raw = getattr(obj, self.key)
+        except AttributeError:
+            raise AttributeError(f"'{type(obj).__name__}' object has no attribute '{self.name}'") from None
+        _, value_decoder, repeated, _ = type(obj)._get_codec().decoders[self.tag]
+        if repeated:
+            value = [value_decoder(v) for v in raw]
+        else:
+            value = value_decoder(raw)
+        self.__set__(obj, value)
+        return value
+
+    def __set__(self, obj: "ProtoStruct", value: Any) -> None:
+        if hasattr(obj, self.key):  # drop the raw slice, encode must see the new value
+            delattr(obj, self.key)
+        if self.slot is not None:
+            self.slot.__set__(obj, value)
+        else:
+            obj.__dict__[self.name] = value
+
+    def __delete__(self, obj: "ProtoStruct") -> None:
+        if self.slot is not None:
+            self.slot.__delete__(obj)
+        else:
+            del obj.__dict__[self.name]
+
+
+def _lazy_key(name: str) -> str:
+    return f"_lazy_{name}"
+
+
+_UNHANDLED = (None, None, False, False)
+
+
+class _CompiledCodec:
+    """
+    Per-class codec built from `__proto_fields__`,
+    walks the wire format directly into attributes without the intermediate dict
+    """
+
+    __slots__ = ("cls", "decoders", "defaults", "encoders")
+
+    def __init__(self, cls: type["ProtoStruct"]):
+        self.cls = cls
+        # tag -> (name, value_decoder, repeated, lazy)
+        self.decoders: dict[int, tuple[str, Callable[[Any], Any], bool, bool]] = {}
+        # (name, default, default_factory)
+        self.defaults: list[tuple[str, Any, Any]] = []
+        # (name, varint_head, length_delimited_head, lazy_key)
+        self.encoders: list[tuple[str, bytes, bytes, Optional[str]]] = []
+
+        for name, field in cls.__proto_fields__.items():
+            if field.tag in self.decoders:
+                raise ValueError(f"duplicate tag: {field.tag}")
+            typ = field.type_without_optional
+            if typ is list:
+                value_decoder, repeated = _decode_raw, True
+            elif isinstance(typ, GenericAlias) and get_origin(typ) is list:
+                value_decoder, repeated = _compile_value_decoder(get_args(typ)[0]), True
+            else:
+                value_decoder, repeated = _compile_value_decoder(typ), False
+            if field.lazy:
+                if repeated:
+                    typ = get_args(typ)[0] if typ is not list else None
+                if not (isinstance(typ, type) and issubclass(typ, ProtoStruct)):
+                    raise TypeError(f"lazy field '{name}' must be a ProtoStruct or list[ProtoStruct]")
+            self.decoders[field.tag] = (name, value_decoder, repeated, field.lazy)
+            self.defaults.append((name, field.default, field.default_factory))
+            self.encoders.append(
+                (
+                    name,
+                    encode_varint(field.tag << 3),
+                    encode_varint(field.tag << 3 | 2),
+                    _lazy_key(name) if field.lazy else None,
+                )
+            )
+
+    def decode(self, data: Union[bytes, memoryview]) -> "ProtoStruct":
+        if not isinstance(data, memoryview):  # nested fields are sliced as views, copy only on leaves
+            data = memoryview(data)
+        decoders = self.decoders
+        values: dict[str, Any] = {}
+        pending: dict[str, Any] = {}
+        unhandled: Proto = {}
+        pos, end = 0, len(data)
+
+        while pos < end:
+            leaf, pos = decode_varint(data, pos)
+            tag = leaf >> 3
+            wire_type = leaf & 0b111
+
+            assert tag > 0, f"Invalid tag: {tag}"
+
+            name, value_decoder, repeated, lazy = decoders.get(tag, _UNHANDLED)
+            if wire_type == 0:
+                raw, pos = decode_varint(data, pos)
+            elif wire_type == 2:
+                length, pos = decode_varint(data, pos)
+                if pos + length > end:
+                    raise ValueError("length of data does not match")
+                raw = data[pos : pos + length]
+                pos += length
+                if lazy:  # keep the view, decode on access
+                    if not repeated:
+                        pending[name] = raw
+                    elif name in pending:
+                        pending[name].append(raw)
+                    else:
+                        pending[name] = [raw]
+                    continue
+            elif wire_type == 5:
+                if pos + 4 > end:
+                    raise ValueError("length of data does not match")
+                raw = int.from_bytes(data[pos : pos + 4], "big")
+                pos += 4
+            else:
+                raise AssertionError(wire_type)
+
+            if name is None:
+                unhandled[tag] = _decode_raw(raw)
+            elif repeated:
+                if name in values:
+                    values[name].append(value_decoder(raw))
+                else:
+                    values[name] = [value_decoder(raw)]
+            else:
+                values[name] = value_decoder(raw)
+
+        if unhandled and self.cls.__proto_debug__:
+            log.utils.debug(f"unhandled tags '{unhandled}' on {self.cls}")
+        if self.cls.__proto_strict__:
+            for name, value in values.items():
+                typ = self.cls.__proto_fields__[name].type
+                if not check_type(value, typ):
+                    raise TypeError(f"'{value}' is not a instance of type '{typ}'")
+
+        obj = self.cls.__new__(self.cls)
+        undefined_params: list[str] = []
+        for name, default, default_factory in self.defaults:
+            if name in values:
+                setattr(obj, name, values[name])
+            elif name in pending:
+                setattr(obj, _lazy_key(name), pending[name])
+            elif default is not MISSING:
+                setattr(obj, name, default)
+            elif default_factory is not MISSING:
+                setattr(obj, name, default_factory())
+            else:
+                undefined_params.append(name)
+        if undefined_params:
+            fields = self.cls.__proto_fields__
+            raise AttributeError(
+                f"Missing required parameters: {', '.join(f'{n}({fields[n].tag})' for n in undefined_params)}"
+            )
+        return obj
+
+    def encode(self, obj: "ProtoStruct") -> bytes:
+        buf = bytearray()
+        for name, varint_head, ld_head, lazy_key in self.encoders:
+            if lazy_key is not None and (value := getattr(obj, lazy_key, None)) is not None:
+                # not accessed, write back the raw slice
+                for v in value if isinstance(value, list) else (value,):
+                    buf += ld_head
+                    buf += encode_varint(len(v))
+                    buf += v
+                continue
+            value = getattr(obj, name)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                for v in value:
+                    if v is not None:
+                        _write_value(buf, v, varint_head, ld_head)
+            else:
+                _write_value(buf, value, varint_head, ld_head)
+        return bytes(buf)
+
+
 _unevaluated_classes: set[type["ProtoStruct"]] = set()
 
 
+class _ProtoMeta(type):
+    """
+    generate `__slots__` from the annotated proto fields,
+    pass `slots=False` in the class kwargs to keep the instance `__dict__`
+    """
+
+    def __new__(mcs, name: str, bases: tuple[type, ...], namespace: dict[str, Any], **kwargs):
+        if bases and kwargs.get("slots", True) and "__slots__" not in namespace:
+            inherited = {s for b in bases for c in b.__mro__ for s in c.__dict__.get("__slots__", ())}
+            declared: dict[str, ProtoField] = {}
+            slots: list[str] = []
+            for attr in namespace.get("__annotations__", {}):
+                field = namespace.get(attr)
+                if not isinstance(field, ProtoField):
+                    continue
+                declared[attr] = namespace.pop(attr)  # a class attribute would conflict with the slot
+                for slot in (attr, _lazy_key(attr)) if field.lazy else (attr,):
+                    if slot not in inherited:
+                        slots.append(slot)
+            namespace["__slots__"] = tuple(slots)
+            namespace["__proto_declared__"] = declared
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+
 @dataclass_transform(kw_only_default=True, field_specifiers=(proto_field,))
-class ProtoStruct:
+class ProtoStruct(metaclass=_ProtoMeta):
+    __slots__ = ()
     __proto_fields__: ClassVar[dict[str, ProtoField]]
     __proto_debug__: ClassVar[bool]
+    __proto_compiled__: ClassVar[bool] = True  # set False to use the reflective codec for debugging
+    __proto_strict__: ClassVar[bool] = False  # set True to type check decoded values too, for development
+    __proto_codec__: ClassVar[Optional[_CompiledCodec]] = None
 
     def __init__(self, __from_raw: bool = False, /, **kwargs):
         undefined_params: list[ProtoField] = []
         for name, field in self.__proto_fields__.items():
             if name in kwargs:
                 value = kwargs.pop(name)
-                if __from_raw:
+                if __from_raw:  # trusted wire data, _decode already produced the right type
                     value = _decode(field.type_without_optional, value)
-                if not check_type(value, field.type):
+                if (not __from_raw or self.__proto_strict__) and not check_type(value, field.type):
                     raise TypeError(
                         f"'{value}' is not a instance of type '{field.type}'"
                     )
@@ -208,9 +517,10 @@ class ProtoStruct:
                     fields[f.name] = f
 
         cls_annotations = cls.__dict__.get('__annotations__', {})
+        declared = cls.__dict__.get("__proto_declared__", {})
         cls_fields: list[ProtoField] = []
         for name, typ in cls_annotations.items():
-            field = getattr(cls, name, MISSING)
+            field = declared[name] if name in declared else getattr(cls, name, MISSING)
             if field is MISSING:
                 raise TypeError(f'{name!r} should define its proto_field!')
             field.ensure_annotation(name, typ)
@@ -220,7 +530,11 @@ class ProtoStruct:
 
         for f in cls_fields:
             fields[f.name] = f
-            if f.default is MISSING:
+            attr = cls.__dict__.get(f.name)
+            if f.lazy:
+                slot = attr if isinstance(attr, MemberDescriptorType) else None
+                setattr(cls, f.name, _LazyField(f.name, f.tag, slot))
+            elif attr is f and f.default is MISSING:
                 delattr(cls, f.name)
 
         for name, value in cls.__dict__.items():
@@ -243,21 +557,46 @@ class ProtoStruct:
                 field._unevaluated = False
             except NameError:
                 pass
+        cls.__proto_codec__ = None
+        cls._compile()
+
+    @classmethod
+    def _compile(cls) -> Optional[_CompiledCodec]:
+        """build the compiled codec, return None if ForwardRef not resolved yet"""
+        if any(f._unevaluated for f in cls.__proto_fields__.values()):
+            return None
+        cls.__proto_codec__ = _CompiledCodec(cls)
+        return cls.__proto_codec__
+
+    @classmethod
+    def _get_codec(cls) -> _CompiledCodec:
+        codec = cls.__dict__.get("__proto_codec__")
+        if codec is None:
+            codec = _CompiledCodec(cls)  # raise if ForwardRef not resolved
+            cls.__proto_codec__ = codec
+        return codec
 
     def __init_subclass__(cls, **kwargs):
         cls.__proto_debug__ = kwargs.pop("debug") if "debug" in kwargs else False
+        if "compiled" in kwargs:
+            cls.__proto_compiled__ = kwargs.pop("compiled")
+        if "strict" in kwargs:
+            cls.__proto_strict__ = kwargs.pop("strict")
+        kwargs.pop("slots", None)  # handled by the metaclass
         cls._process_field()
+        cls.__proto_codec__ = None
+        cls._compile()
         super().__init_subclass__(**kwargs)
 
     def __repr__(self) -> str:
         attrs = ""
-        for k, v in vars(self).items():
-            if k.startswith("_"):
-                continue
-            attrs += f"{k}={v!r}, "
+        for k in self.__proto_fields__:
+            attrs += f"{k}={getattr(self, k)!r}, "
         return f"{self.__class__.__name__}({attrs[:-2]})"
 
     def encode(self) -> bytes:
+        if self.__proto_compiled__:
+            return self._get_codec().encode(self)
         pb_dict: NT = {}
 
         def _encode(v: _ProtoTypes) -> NT:
@@ -280,6 +619,8 @@ class ProtoStruct:
     def decode(cls, data: bytes) -> Self:
         if not data:
             return None  # type: ignore
+        if cls.__proto_compiled__:
+            return cls._get_codec().decode(data)  # type: ignore
         pb_dict: Proto = proto_decode(data, 0).proto
 
         kwargs = {
@@ -289,7 +630,7 @@ class ProtoStruct:
         }
 
         if pb_dict and cls.__proto_debug__:  # unhandled tags
-            print(f"DEBUG: unhandled tags '{pb_dict}' on {cls}")
+            log.utils.debug(f"unhandled tags '{pb_dict}' on {cls}")
         return cls(True, **kwargs)
 
 
@@ -8,9 +8,16 @@ BYTES_LIKE: TypeAlias = Union[bytes, bytearray, memoryview]
 
 
 class Reader:
-    def __init__(self, buffer: BYTES_LIKE):
+    """
+    zero_copy: wrap the buffer with memoryview, read_bytes* return views instead of copies,
+        call bytes() on the result when a real bytes is needed
+    """
+
+    def __init__(self, buffer: BYTES_LIKE, *, zero_copy: bool = False):
         if not isinstance(buffer, (bytes, bytearray, memoryview)):
             raise TypeError("Invalid data: " + str(buffer))
+        if zero_copy and not isinstance(buffer, memoryview):
+            buffer = memoryview(buffer)
         self._buffer = buffer
         self._pos = 0
 
@@ -50,7 +57,7 @@ class Reader:
         return v
 
     def read_string(self, length: int) -> str:
-        return self.read_bytes(length).decode("utf-8")
+        return str(self.read_bytes(length), "utf-8")
 
     def read_bytes_with_length(self, prefix: LENGTH_PREFIX, with_prefix=True) -> bytes:
         if with_prefix:
@@ -76,7 +83,7 @@ class Reader:
         return v
 
     def read_string_with_length(self, prefix: LENGTH_PREFIX, with_prefix=True) -> str:
-        return self.read_bytes_with_length(prefix, with_prefix).decode("utf-8")
+        return str(self.read_bytes_with_length(prefix, with_prefix), "utf-8")
 
     def read_tlv(self) -> dict[int, bytes]:
         result = {}
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from .point import EllipticPoint
 
 
@@ -21,6 +23,7 @@ class EllipticCurve:
         self._H = H
         self._size = size
         self._pack_size = pack_size
+        self._g_table: Optional[list[tuple[int, int, int]]] = None  # window table of G, built on first use
 
     @property
     def P(self) -> int:
@@ -1,9 +1,54 @@
 import hashlib
 import math
-import random
+import secrets
+from typing import Union
+
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 
 from .curve import EllipticCurve, EllipticPoint
 
+# curves the cryptography backend can do natively, secp192k1 is not among them
+_NATIVE_CURVES: dict[str, type[ec.EllipticCurve]] = {"prime256v1": ec.SECP256R1}
+
+_Jacobian = tuple[int, int, int]  # (X, Y, Z), x = X / Z^2, y = Y / Z^3
+_INFINITY: _Jacobian = (1, 1, 0)
+_WINDOW = 4
+
+
+class NativeECDHProvider:
+    """ECDH on the cryptography backend, same interface as `ECDHProvider`"""
+
+    def __init__(self, curve: EllipticCurve, native: ec.EllipticCurve):
+        self._curve = curve
+        self._native = native
+        self._private = ec.generate_private_key(native)
+
+    def key_exchange(self, bob_pub: bytes, hashed: bool) -> bytes:
+        length = len(bob_pub)
+        if length != self._curve.size * 2 + 1 and length != self._curve.size + 1:
+            raise AssertionError("Length of public key does not match")
+        try:
+            peer = ec.EllipticCurvePublicKey.from_encoded_point(self._native, bytes(bob_pub))
+        except ValueError as e:
+            raise AssertionError("Incorrect public key") from e
+        x = self._private.exchange(ec.ECDH(), peer)
+        if hashed:
+            x = hashlib.md5(x[0 : self._curve.pack_size]).digest()
+        return x
+
+    def pack_public(self, compress: bool) -> bytes:
+        return self._private.public_key().public_bytes(
+            Encoding.X962, PublicFormat.CompressedPoint if compress else PublicFormat.UncompressedPoint
+        )
+
+
+def create_provider(name: str, curve: EllipticCurve) -> Union["ECDHProvider", NativeECDHProvider]:
+    """the cryptography backend where the curve is supported, pure Python otherwise"""
+    if name in _NATIVE_CURVES:
+        return NativeECDHProvider(curve, _NATIVE_CURVES[name]())
+    return ECDHProvider(curve)
+
 
 class ECDHProvider:
     def __init__(self, curve: EllipticCurve):
@@ -68,14 +113,7 @@ class ECDHProvider:
         return self._create_shared(sec, self._curve.G)
 
     def _create_secret(self) -> int:
-        result = 0
-
-        while result < 1 or result >= self._curve.N:
-            buffer = bytearray(random.Random().randbytes(self._curve.size + 1))
-            buffer[self._curve.size] = 0
-            result = int.from_bytes(buffer, "little")
-
-        return result
+        return secrets.randbelow(self._curve.N - 1) + 1
 
     def _create_shared(self, sec: int, pub: EllipticPoint) -> EllipticPoint:
         if sec % self._curve.N == 0 or pub.is_default:
@@ -86,20 +124,90 @@ class ECDHProvider:
         if not self._curve.check_on(pub):
             raise AssertionError("Incorrect public key")
 
-        pr = EllipticPoint(0, 0)
-        pa = pub
-        while sec > 0:
-            if (sec & 1) > 0:
-                pr = _point_add(self._curve, pr, pa)
-
-            pa = _point_add(self._curve, pa, pa)
-            sec >>= 1
+        pr = _scalar_mult(self._curve, sec, pub)
 
         if not self._curve.check_on(pr):
             raise AssertionError("Incorrect result assertion")
         return pr
 
 
+def _jacobian_double(curve: EllipticCurve, p: _Jacobian) -> _Jacobian:
+    x, y, z = p
+    if not z or not y:
+        return _INFINITY
+    mod = curve.P
+    yy = y * y % mod
+    s = 4 * x * yy % mod
+    m = 3 * x * x
+    if curve.A:
+        m += curve.A * pow(z, 4, mod)
+    m %= mod
+    nx = (m * m - 2 * s) % mod
+    ny = (m * (s - nx) - 8 * yy * yy) % mod
+    return nx, ny, 2 * y * z % mod
+
+
+def _jacobian_add(curve: EllipticCurve, p1: _Jacobian, p2: _Jacobian) -> _Jacobian:
+    x1, y1, z1 = p1
+    x2, y2, z2 = p2
+    if not z1:
+        return p2
+    if not z2:
+        return p1
+    mod = curve.P
+    z1z1 = z1 * z1 % mod
+    z2z2 = z2 * z2 % mod
+    u1 = x1 * z2z2 % mod
+    u2 = x2 * z1z1 % mod
+    s1 = y1 * z2 * z2z2 % mod
+    s2 = y2 * z1 * z1z1 % mod
+    if u1 == u2:
+        if s1 != s2:
+            return _INFINITY
+        return _jacobian_double(curve, p1)
+    h = u2 - u1
+    r = s2 - s1
+    hh = h * h % mod
+    hhh = h * hh % mod
+    v = u1 * hh % mod
+    nx = (r * r - hhh - 2 * v) % mod
+    ny = (r * (v - nx) - s1 * hhh) % mod
+    return nx, ny, h * z1 * z2 % mod
+
+
+def _window_table(curve: EllipticCurve, point: EllipticPoint) -> list[_Jacobian]:
+    """[0P, 1P, ... (2^w - 1)P], the generator's table is kept on the curve"""
+    is_g = point == curve.G
+    if is_g and curve._g_table is not None:
+        return curve._g_table
+    base: _Jacobian = (point.x % curve.P, point.y % curve.P, 1)
+    table = [_INFINITY, base]
+    for _ in range(2, 1 << _WINDOW):
+        table.append(_jacobian_add(curve, table[-1], base))
+    if is_g:
+        curve._g_table = table
+    return table
+
+
+def _scalar_mult(curve: EllipticCurve, k: int, point: EllipticPoint) -> EllipticPoint:
+    """fixed window multiplication in jacobian coordinates, one inversion at the end"""
+    table = _window_table(curve, point)
+    mask = (1 << _WINDOW) - 1
+    acc = _INFINITY
+    for shift in range((k.bit_length() - 1) // _WINDOW * _WINDOW, -1, -_WINDOW):
+        for _ in range(_WINDOW):
+            acc = _jacobian_double(curve, acc)
+        digit = (k >> shift) & mask
+        if digit:
+            acc = _jacobian_add(curve, acc, table[digit])
+    x, y, z = acc
+    if not z:
+        return EllipticPoint(0, 0)  # default
+    z_inv = pow(z, -1, curve.P)
+    z_inv2 = z_inv * z_inv % curve.P
+    return EllipticPoint(x * z_inv2 % curve.P, y * z_inv2 * z_inv % curve.P)
+
+
 def _point_add(
     curve: EllipticCurve, p1: EllipticPoint, p2: EllipticPoint
 ) -> EllipticPoint:
@@ -1,5 +1,7 @@
+from typing import Union
+
 from .curve import CURVE
-from .ecdh import ECDHProvider
+from .ecdh import ECDHProvider, NativeECDHProvider, create_provider
 
 ECDH_PRIME_PUBLIC = bytes.fromhex(
     "04"
@@ -14,7 +16,7 @@ ECDH_SECP_PUBLIC = bytes.fromhex(
 
 
 class BaseECDH:
-    _provider: ECDHProvider
+    _provider: Union[ECDHProvider, NativeECDHProvider]
     _public_key: bytes
     _share_key: bytes
     _compress_key: bool
@@ -33,7 +35,7 @@ class BaseECDH:
 
 class ECDHPrime(BaseECDH):  # exchange key
     def __init__(self):
-        self._provider = ECDHProvider(CURVE["prime256v1"])
+        self._provider = create_provider("prime256v1", CURVE["prime256v1"])
         self._public_key = self._provider.pack_public(False)
         self._share_key = self._provider.key_exchange(ECDH_PRIME_PUBLIC, False)
         self._compress_key = False
@@ -41,7 +43,7 @@ class ECDHPrime(BaseECDH):  # exchange key
 
 class ECDHSecp(BaseECDH):  # login and others
     def __init__(self):
-        self._provider = ECDHProvider(CURVE["secp192k1"])
+        self._provider = create_provider("secp192k1", CURVE["secp192k1"])
         self._public_key = self._provider.pack_public(True)
         self._share_key = self._provider.key_exchange(ECDH_SECP_PUBLIC, True)
         self._compress_key = True
@@ -1,7 +1,12 @@
 import struct
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Protocol
 
-__all__ = ["qqtea_encrypt", "qqtea_decrypt"]
+__all__ = ["qqtea_encrypt", "qqtea_decrypt", "tea_cipher", "TEACipher", "TEA_BACKEND"]
+
+_OP = 0xFFFFFFFF
+_SUMS = tuple((0x9E3779B9 * (i + 1)) & _OP for i in range(16))
+_SUMS_REVERSED = _SUMS[::-1]
 
 
 def _xor(a, b):
@@ -93,23 +98,103 @@ class _TEA:
         return ret[pos + 1 : -7]
 
 
-def qqtea_encrypt(data: bytes, key: bytes) -> bytes:
-    return _TEA(key).encrypt(data)
+class _WordTEA:
+    """
+    QQ TEA over u32 words: the buffer is unpacked once, the chaining and the
+    16 rounds run on ints, the result is packed once at the end
+    """
 
+    __slots__ = ("secret_key", "_k")
 
-def qqtea_decrypt(data: bytes, key: bytes) -> bytes:
-    return _TEA(key).decrypt(data)
+    def __init__(self, secret_key: bytes):
+        self.secret_key = secret_key
+        self._k = struct.unpack(">4I", secret_key[:16])
+
+    def encrypt(self, data: bytes) -> bytes:
+        filln = (8 - (len(data) + 2)) % 8 + 2
+        buf = bytes(((filln - 2) | 0xF8,)) + b"\xdc" * filln + data + b"\x00" * 7
+        count = len(buf) // 4
+        words = struct.unpack(f">{count}I", buf)
+        k0, k1, k2, k3 = self._k
+        out = [0] * count
+        tr0 = tr1 = to0 = to1 = 0
+        for i in range(0, count, 2):
+            v0 = o0 = words[i] ^ tr0
+            v1 = o1 = words[i + 1] ^ tr1
+            for s in _SUMS:
+                v0 = (v0 + (((v1 << 4) + k0) ^ (v1 + s) ^ ((v1 >> 5) + k1))) & _OP
+                v1 = (v1 + (((v0 << 4) + k2) ^ (v0 + s) ^ ((v0 >> 5) + k3))) & _OP
+            out[i] = tr0 = v0 ^ to0
+            out[i + 1] = tr1 = v1 ^ to1
+            to0, to1 = o0, o1
+        return struct.pack(f">{count}I", *out)
+
+    def decrypt(self, text: bytes) -> Optional[bytes]:
+        count = len(text) // 4
+        words = struct.unpack(f">{count}I", text)
+        k0, k1, k2, k3 = self._k
+        out = [0] * count
+        p0 = p1 = pre0 = pre1 = 0  # the first block is deciphered as is
+        for i in range(0, count, 2):
+            c0, c1 = words[i], words[i + 1]
+            v0, v1 = c0 ^ p0, c1 ^ p1
+            for s in _SUMS_REVERSED:
+                v1 = (v1 - (((v0 << 4) + k2) ^ (v0 + s) ^ ((v0 >> 5) + k3))) & _OP
+                v0 = (v0 - (((v1 << 4) + k0) ^ (v1 + s) ^ ((v1 >> 5) + k1))) & _OP
+            p0, p1 = v0, v1
+            out[i] = v0 ^ pre0
+            out[i + 1] = v1 ^ pre1
+            pre0, pre1 = c0, c1
+        ret = struct.pack(f">{count}I", *out)
+        if ret[-7:] != b"\0" * 7:
+            return None
+        return ret[(ret[0] & 0x07) + 3 : -7]
+
+
+class TEACipher(Protocol):
+    secret_key: bytes
+
+    def encrypt(self, data: bytes) -> bytes: ...
 
+    def decrypt(self, text: bytes) -> Optional[bytes]: ...
+
+
+TEA_BACKEND = "python"
+_Cipher: type = _WordTEA
 
 try:
     from ftea import TEA as FTEA
 
-    def qqtea_encrypt(data: bytes, key: bytes) -> bytes:
-        return FTEA(key).encrypt_qq(data)
+    class _FTEACipher:
+        __slots__ = ("secret_key", "encrypt", "decrypt")
 
-    def qqtea_decrypt(data: bytes, key: bytes) -> bytes:
-        return FTEA(key).decrypt_qq(data)
+        def __init__(self, secret_key: bytes):
+            tea = FTEA(secret_key)
+            self.secret_key = secret_key
+            self.encrypt = tea.encrypt_qq
+            self.decrypt = tea.decrypt_qq
+
+    TEA_BACKEND = "ftea"
+    _Cipher = _FTEACipher
 
 except ImportError:
     # Leave the pure Python version in place.
     pass
+
+
+@lru_cache(maxsize=32)
+def _cached_cipher(key: bytes) -> TEACipher:
+    return _Cipher(key)
+
+
+def tea_cipher(key: bytes) -> TEACipher:
+    """cipher of the selected backend with the key prepared, cached per key"""
+    return _cached_cipher(bytes(key))
+
+
+def qqtea_encrypt(data: bytes, key: bytes) -> bytes:
+    return tea_cipher(key).encrypt(data)
+
+
+def qqtea_decrypt(data: bytes, key: bytes) -> bytes:
+    return tea_cipher(key).decrypt(data)
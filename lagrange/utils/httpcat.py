@@ -1,9 +1,13 @@
 import asyncio
 import gzip
 import json
+import os
+import time
 import zlib
-from dataclasses import dataclass
-from typing import Optional, overload, Literal
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import BinaryIO, Optional, Union, overload, Literal
+from collections.abc import AsyncIterator
 from urllib import parse
 
 from .log import log
@@ -46,7 +50,223 @@ class HttpResponse:
         return self.decompressed_body.decode(encoding, errors)
 
 
+class HttpStreamResponse:
+    """
+    response whose body is read from the connection as it is iterated,
+    only valid inside the `HttpCat.stream` block that produced it
+    """
+
+    def __init__(
+        self, code: int, status: str, header: dict[str, str], cookies: dict[str, str], body: AsyncIterator[bytes]
+    ):
+        self.code = code
+        self.status = status
+        self.header = header
+        self.cookies = cookies
+        self._body = body
+        self.consumed = False  # the whole body was read from the connection
+
+    def _decoder(self):
+        encoding = self.header.get("Content-Encoding", "identity")
+        if encoding == "gzip":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            return zlib.decompressobj()
+        elif encoding == "identity":
+            return None
+        raise TypeError("Unsuppoted compress type:", encoding)
+
+    async def iter_raw(self) -> AsyncIterator[bytes]:
+        async for chunk in self._body:
+            yield chunk
+        self.consumed = True
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        """decompressed body, chunk by chunk"""
+        decoder = self._decoder()
+        async for chunk in self.iter_raw():
+            if decoder:
+                chunk = decoder.decompress(chunk)
+            if chunk:
+                yield chunk
+        if decoder and (tail := decoder.flush()):
+            yield tail
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self.iter_chunks()
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_chunks()])
+
+    async def download_to(self, target: Union[str, os.PathLike, BinaryIO]) -> int:
+        """write the decompressed body to a path or a binary file object, returns the bytes written"""
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "wb") as f:
+                return await self.download_to(f)
+        written = 0
+        async for chunk in self.iter_chunks():
+            target.write(chunk)
+            written += len(chunk)
+        return written
+
+
+_ConnKey = tuple[str, int, bool]  # host, port, ssl
+_IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+class _NoResponseError(ConnectionResetError):
+    """the connection failed before the first byte of the response"""
+
+
+@dataclass
+class PoolStats:
+    opened: int = 0
+    reused: int = 0
+    expired: int = 0  # idle past the timeout
+    unhealthy: int = 0  # closed by the peer while idle, found on checkout
+    waited: int = 0  # checkouts that waited for the per-host cap
+    retried: int = 0  # requests retried on a fresh connection after a stale one
+
+
+@dataclass
+class _PooledConn:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    last_used: float = field(default_factory=time.monotonic)
+    owner: Optional["_HostPool"] = None  # pool it was checked out of, its slot goes back there
+
+    def healthy(self) -> bool:
+        # a peer that hung up while we were idle leaves eof or an error on the reader
+        return not (self.writer.is_closing() or self.reader.at_eof() or self.reader.exception())
+
+    def close(self):
+        self.writer.close()
+
+
+class _HostPool:
+    def __init__(self, cap: int):
+        self.loop = asyncio.get_running_loop()  # streams belong to the loop that opened them
+        self.slots = asyncio.Semaphore(cap)
+        self.idle: list[_PooledConn] = []
+        self.reaper: Optional[asyncio.TimerHandle] = None
+
+
+class ConnectionPool:
+    """
+    keep-alive connections shared by `HttpCat.request`, keyed by (host, port, ssl),
+    at most `max_per_host` connections (idle and in use) per key,
+    idle ones are closed after `idle_timeout` seconds and checked for a half-closed peer on checkout
+    """
+
+    def __init__(self, max_per_host: int = 8, idle_timeout: float = 30.0):
+        if max_per_host < 1:
+            raise ValueError("max_per_host must be at least 1")
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.stats = PoolStats()
+        self._hosts: dict[_ConnKey, _HostPool] = {}
+
+    def idle_count(self) -> dict[_ConnKey, int]:
+        return {key: len(host.idle) for key, host in self._hosts.items() if host.idle}
+
+    def _host(self, key: _ConnKey) -> _HostPool:
+        host = self._hosts.get(key)
+        if not host or host.loop is not asyncio.get_running_loop():
+            if host:
+                self._drop_idle(host)
+            host = self._hosts[key] = _HostPool(self.max_per_host)
+        return host
+
+    def _drop_idle(self, host: _HostPool):
+        if host.reaper:
+            host.reaper.cancel()
+            host.reaper = None
+        while host.idle:
+            host.idle.pop().close()
+
+    def _take_idle(self, host: _HostPool) -> Optional[_PooledConn]:
+        now = time.monotonic()
+        while host.idle:
+            conn = host.idle.pop()  # most recently used first
+            if now - conn.last_used > self.idle_timeout:
+                self.stats.expired += 1
+            elif not conn.healthy():
+                self.stats.unhealthy += 1
+            else:
+                self.stats.reused += 1
+                return conn
+            conn.close()
+        return None
+
+    def _reap(self, host: _HostPool):
+        """close the idle connections past the timeout, so a host never contacted again keeps none open"""
+        host.reaper = None
+        now = time.monotonic()
+        keep = []
+        for conn in host.idle:
+            if now - conn.last_used >= self.idle_timeout:
+                self.stats.expired += 1
+                conn.close()
+            elif not conn.healthy():
+                self.stats.unhealthy += 1
+                conn.close()
+            else:
+                keep.append(conn)
+        host.idle[:] = keep
+        self._arm_reaper(host)
+
+    def _arm_reaper(self, host: _HostPool):
+        if host.idle and not host.reaper:
+            oldest = min(conn.last_used for conn in host.idle)
+            delay = max(oldest + self.idle_timeout - time.monotonic(), 0)
+            host.reaper = host.loop.call_later(delay, self._reap, host)
+
+    async def acquire(self, key: _ConnKey, conn_timeout: float = 0) -> tuple[_PooledConn, bool]:
+        """a connection and whether it was reused, hand it back with `release`"""
+        host = self._host(key)
+        if host.slots.locked():
+            self.stats.waited += 1
+        await host.slots.acquire()
+        try:
+            if conn := self._take_idle(host):
+                conn.owner = host
+                return conn, True
+            opening = asyncio.open_connection(key[0], key[1], ssl=key[2])
+            reader, writer = await (asyncio.wait_for(opening, conn_timeout) if conn_timeout else opening)
+        except BaseException:
+            host.slots.release()
+            raise
+        self.stats.opened += 1
+        return _PooledConn(reader, writer, owner=host), False
+
+    def release(self, conn: _PooledConn, reusable: bool):
+        host, conn.owner = conn.owner, None
+        if host is None or host.loop is not asyncio.get_running_loop():
+            conn.close()
+            return
+        # a host pool replaced while the connection was out only gets its slot back
+        if reusable and conn.healthy() and host in self._hosts.values():
+            conn.last_used = time.monotonic()
+            host.idle.append(conn)
+            self._arm_reaper(host)
+        else:
+            conn.close()
+        host.slots.release()
+
+    def close(self):
+        for host in self._hosts.values():
+            self._drop_idle(host)
+        self._hosts.clear()
+
+
+async def _empty() -> AsyncIterator[bytes]:
+    return
+    yield
+
+
 class HttpCat:
+    pool = ConnectionPool()  # process wide, used by `request` unless keep_alive=False
+
     def __init__(
         self,
         host: str,
@@ -104,30 +324,53 @@ class HttpCat:
     @classmethod
     async def _read_all(cls, header: dict, reader: asyncio.StreamReader) -> bytes:
         if header.get("Transfer-Encoding") == "chunked":
-            bs = bytearray()
+            return b"".join([chunk async for chunk in cls._iter_body(header, reader, 1 << 20)])
+        elif "Content-Length" in header:
+            return await reader.readexactly(int(header["Content-Length"]))
+        else:
+            return await reader.read()
+
+    @classmethod
+    async def _iter_body(cls, header: dict, reader: asyncio.StreamReader, chunk_size: int) -> AsyncIterator[bytes]:
+        """`_read_all`, chunk_size bytes at most at a time"""
+        if header.get("Transfer-Encoding") == "chunked":
             while True:
                 len_hex = await cls._read_line(reader)
-                if len_hex:
-                    length = int(len_hex, 16)
-                    if length:
-                        bs += await reader.readexactly(length)
-                    else:
-                        break
-                else:
-                    if header.get("Connection") == "close":  # cloudflare?
-                        break
+                if not len_hex:
+                    if header.get("Connection") == "close":
+                        return
                     raise ConnectionResetError("Connection reset by peer")
-            return bytes(bs)
+                length = int(len_hex.split(";", 1)[0], 16)
+                if not length:
+                    await reader.readline()  # the empty line after the last chunk
+                    return
+                while length:
+                    piece = await reader.readexactly(min(length, chunk_size))
+                    length -= len(piece)
+                    yield piece
+                await reader.readline()
         elif "Content-Length" in header:
-            return await reader.readexactly(int(header["Content-Length"]))
+            remain = int(header["Content-Length"])
+            while remain:
+                piece = await reader.readexactly(min(remain, chunk_size))
+                remain -= len(piece)
+                yield piece
         else:
-            return await reader.read()
+            while piece := await reader.read(chunk_size):
+                yield piece
+
+    @staticmethod
+    def _has_body(method: str, code: int) -> bool:
+        return not (method.upper() == "HEAD" or code in (204, 304) or code // 100 == 1)
 
     @classmethod
-    async def _parse_response(cls, reader: asyncio.StreamReader) -> HttpResponse:
-        stat = await cls._read_line(reader)
+    async def _parse_head(cls, reader: asyncio.StreamReader) -> tuple[int, str, dict[str, str], dict[str, str]]:
+        try:
+            stat = await cls._read_line(reader)
+        except ConnectionError as e:
+            raise _NoResponseError(*e.args) from e
         if not stat:
-            raise ConnectionResetError
+            raise _NoResponseError
         _, code, status = stat.split(" ", 2)
         header = {}
         cookies = {}
@@ -142,8 +385,15 @@ class HttpCat:
                     header[k.title()] = v
             else:
                 break
+        return int(code), status, header, cookies
+
+    @classmethod
+    async def _parse_response(cls, reader: asyncio.StreamReader, head_only=False) -> HttpResponse:
+        code, status, header, cookies = await cls._parse_head(reader)
+        if not cls._has_body("HEAD" if head_only else "GET", code):  # nothing to wait for
+            return HttpResponse(code, status, header, b"", cookies)
         return HttpResponse(
-            int(code), status, header, await cls._read_all(header, reader), cookies
+            code, status, header, await cls._read_all(header, reader), cookies
         )
 
     @classmethod
@@ -214,7 +464,7 @@ class HttpCat:
 
         if wait_rsp:
             try:
-                return await cls._parse_response(reader)
+                return await cls._parse_response(reader, method.upper() == "HEAD")
             finally:
                 if header["Connection"] == "close":
                     loop.call_soon(writer.close)
@@ -230,25 +480,170 @@ class HttpCat:
         follow_redirect=True,
         conn_timeout=0,
         loop: Optional[asyncio.AbstractEventLoop] = None,
+        keep_alive=True,
+        pool: Optional[ConnectionPool] = None,
+        retry_stale=False,
     ) -> HttpResponse:
+        """
+        keep_alive: reuse connections of `pool` (`HttpCat.pool` if None),
+            False for a new connection closed afterwards
+        retry_stale: a reused connection that fails is retried once on a fresh one for idempotent methods,
+            True to also retry other methods if nothing of the response arrived, for requests safe to repeat
+        """
         address, path, ssl = cls._parse_url(url)
-        if conn_timeout:
-            reader, writer = await asyncio.wait_for(
-                asyncio.open_connection(*address, ssl=ssl), conn_timeout
+        if keep_alive:
+            resp = await cls._pooled_request(
+                pool or cls.pool, (*address, ssl), method, path, header, body, cookies, conn_timeout, retry_stale
             )
         else:
-            reader, writer = await asyncio.open_connection(*address, ssl=ssl)
-        resp = await cls._request(
-            address[0], reader, writer, method, path, header, body, cookies, True, loop
-        )
+            if conn_timeout:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(*address, ssl=ssl), conn_timeout
+                )
+            else:
+                reader, writer = await asyncio.open_connection(*address, ssl=ssl)
+            resp = await cls._request(
+                address[0], reader, writer, method, path, header, body, cookies, True, loop
+            )
         _logger.debug(f"request({method})[{resp.code}]: {url}")
         if resp.code // 100 == 3 and follow_redirect:
             return await cls.request(
-                method, resp.header["Location"], header, body, cookies
+                method,
+                resp.header["Location"],
+                header,
+                body,
+                cookies,
+                keep_alive=keep_alive,
+                pool=pool,
+                retry_stale=retry_stale,
             )
         else:
             return resp
 
+    @classmethod
+    async def _pooled_request(
+        cls,
+        pool: ConnectionPool,
+        key: _ConnKey,
+        method: str,
+        path: str,
+        header: Optional[dict[str, str]],
+        body: Optional[bytes],
+        cookies: Optional[dict[str, str]],
+        conn_timeout: float,
+        retry_stale: bool = False,
+    ) -> HttpResponse:
+        header = {"Connection": "keep-alive", **(header or {})}
+        retry = method.upper() in _IDEMPOTENT_METHODS
+        while True:
+            conn, reused = await pool.acquire(key, conn_timeout)
+            reusable = False
+            sent = False
+            try:
+                await cls._request(key[0], conn.reader, conn.writer, method, path, header, body, cookies, False)
+                sent = True
+                resp = await cls._parse_response(conn.reader, method.upper() == "HEAD")
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                # closed by the peer between the health check and the request
+                unanswered = not sent or isinstance(e, _NoResponseError)
+                if reused and (retry or (retry_stale and unanswered)):
+                    retry = retry_stale = False
+                    pool.stats.retried += 1
+                    continue
+                raise
+            else:
+                reusable = cls._reusable(method, header, resp.code, resp.header)
+                return resp
+            finally:
+                pool.release(conn, reusable)
+
+    @classmethod
+    def _reusable(cls, method: str, header: dict[str, str], code: int, rsp_header: dict[str, str]) -> bool:
+        if header["Connection"].lower() == "close" or rsp_header.get("Connection", "").lower() == "close":
+            return False
+        # a body delimited by the peer closing the connection leaves nothing to reuse
+        return (
+            not cls._has_body(method, code)
+            or "Content-Length" in rsp_header
+            or rsp_header.get("Transfer-Encoding") == "chunked"
+        )
+
+    @classmethod
+    @asynccontextmanager
+    async def stream(
+        cls,
+        method: str,
+        url: str,
+        header: Optional[dict[str, str]] = None,
+        body: Optional[bytes] = None,
+        cookies: Optional[dict[str, str]] = None,
+        follow_redirect=True,
+        conn_timeout=0,
+        chunk_size=64 * 1024,
+        keep_alive=True,
+    ) -> AsyncIterator[HttpStreamResponse]:
+        """
+        like `request`, but the body is left on the connection to be iterated:
+            async with HttpCat.stream("GET", url) as rsp:
+                await rsp.download_to("file")
+        the connection goes back to the pool only if the body was read to the end
+        """
+        for _ in range(10):  # redirects
+            address, path, ssl = cls._parse_url(url)
+            key = (*address, ssl)
+            req_header = {"Connection": "keep-alive" if keep_alive else "close", **(header or {})}
+            retry = method.upper() in _IDEMPOTENT_METHODS
+            while True:
+                if keep_alive:
+                    conn, reused = await cls.pool.acquire(key, conn_timeout)
+                else:
+                    opening = asyncio.open_connection(*address, ssl=ssl)
+                    conn = _PooledConn(*(await (asyncio.wait_for(opening, conn_timeout) if conn_timeout else opening)))
+                    reused = False
+                try:
+                    await cls._request(
+                        address[0], conn.reader, conn.writer, method, path, req_header, body, cookies, False
+                    )
+                    code, status, rsp_header, rsp_cookies = await cls._parse_head(conn.reader)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    cls._release(conn, False, keep_alive)
+                    if reused and retry:
+                        retry = False
+                        cls.pool.stats.retried += 1
+                        continue
+                    raise
+                except BaseException:
+                    cls._release(conn, False, keep_alive)
+                    raise
+
+            chunks = cls._iter_body(rsp_header, conn.reader, chunk_size) if cls._has_body(method, code) else _empty()
+            rsp = HttpStreamResponse(code, status, rsp_header, rsp_cookies, chunks)
+            if not cls._has_body(method, code):
+                rsp.consumed = True
+            reusable = False
+            try:
+                _logger.debug(f"stream({method})[{code}]: {url}")
+                if code // 100 == 3 and follow_redirect:
+                    async for _ in rsp.iter_raw():  # drain
+                        pass
+                    reusable = cls._reusable(method, req_header, code, rsp_header)
+                    url = parse.urljoin(url, rsp_header["Location"])
+                    continue
+                yield rsp
+                reusable = rsp.consumed and cls._reusable(method, req_header, code, rsp_header)
+                return
+            finally:
+                cls._release(conn, reusable, keep_alive)
+        raise ConnectionError("too many redirects")
+
+    @classmethod
+    def _release(cls, conn: _PooledConn, reusable: bool, keep_alive: bool):
+        if keep_alive:
+            cls.pool.release(conn, reusable)
+        else:
+            conn.close()
+
     async def send_request(
         self, method: str, path: str, body=None, follow_redirect=True, conn_timeout=0
     ) -> HttpResponse:
@@ -293,9 +688,15 @@ class HttpCat:
         self._stop_flag = False
         return self
 
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
+    async def close(self):
         self._stop_flag = True
         if self._reader and self._writer:
             self._writer.close()
-            await self._writer.wait_closed()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):  # already broken
+                pass
             self._reader, self._writer = None, None
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -1,7 +1,11 @@
+import asyncio
 import time
 import json
+from collections import deque
+from typing import Literal, Optional, Union
+from collections.abc import Sequence
 
-from .httpcat import HttpCat
+from .httpcat import ConnectionPool, HttpCat, HttpResponse
 from .log import log
 
 _logger = log.fork("sign_provider")
@@ -46,24 +50,252 @@ SIGN_PKG_LIST = [
 ]
 
 
-def sign_provider(upstream_url: str):
-    async def get_sign(cmd: str, seq: int, buf: bytes) -> dict:
+class _LatencyWindow:
+    """latencies of the last `size` signs"""
+
+    def __init__(self, size: int = 256):
+        self._samples: deque[float] = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, ms: float):
+        self._samples.append(ms)
+        self.count += 1
+
+    def percentiles(self, *ps: float) -> list[float]:
+        ordered = sorted(self._samples)
+        if not ordered:
+            return [0.0 for _ in ps]
+        return [ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)] for p in ps]
+
+
+class _Upstream:
+    """one sign server, its load, latency and circuit breaker"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.ewma: Optional[float] = None  # ms
+        self.failures = 0  # in a row
+        self.open_until = 0.0  # breaker open until, monotonic; 0 when closed
+        self.trial = False  # a half-open trial request is running
+
+    def state(self, now: float) -> str:
+        if not self.open_until:
+            return "closed"
+        return "open" if now < self.open_until else "half_open"
+
+    def available(self, now: float) -> bool:
+        state = self.state(now)
+        return state == "closed" or (state == "half_open" and not self.trial)
+
+    def observe(self, ms: float, alpha: float):
+        self.ewma = ms if self.ewma is None else alpha * ms + (1 - alpha) * self.ewma
+
+    def succeed(self, ms: float, alpha: float, now: float):
+        self.observe(ms, alpha)
+        if self.state(now) != "open":  # a late answer of a request sent before the ejection does not count
+            self.failures = 0
+            self.open_until = 0.0
+
+    def fail(self, now: float, threshold: int, cooldown: float):
+        self.failures += 1
+        if self.failures >= threshold or self.open_until:  # a failed trial opens it again
+            if not self.open_until or now >= self.open_until:
+                _logger.warning(f"sign upstream {self.url} ejected for {cooldown}s after {self.failures} failures")
+            self.open_until = now + cooldown
+
+
+class SignProvider:
+    """
+    sign over keep-alive connections of `pool` (the shared `HttpCat.pool` if None) to one or more upstreams,
+    or of a pool of its own with up to `pool_size` connections per upstream, closed with the provider;
+    `conn_timeout` bounds connecting and `timeout` the whole request
+
+    requests go to the upstream with the least outstanding requests (or the lowest
+    EWMA latency weighted by its load with `balance="ewma"`), a request still running
+    after `hedge_after` seconds is also sent to a second upstream and the first answer wins,
+    the other one is left to finish in the background,
+    a failed request is retried once on another upstream,
+    `failure_threshold` failures in a row eject an upstream for `cooldown` seconds,
+    then one trial request decides whether it is back
+    """
+
+    def __init__(
+        self,
+        upstream_url: Union[str, Sequence[str]],
+        pool: Optional[ConnectionPool] = None,
+        pool_size: Optional[int] = None,
+        conn_timeout: float = 3,
+        timeout: float = 10,
+        report_every: int = 100,
+        balance: Literal["least_outstanding", "ewma"] = "least_outstanding",
+        hedge_after: Optional[float] = 0.5,
+        failure_threshold: int = 3,
+        cooldown: float = 30,
+        ewma_alpha: float = 0.3,
+    ):
+        urls = [upstream_url] if isinstance(upstream_url, str) else list(upstream_url)
+        if not urls:
+            raise ValueError("no sign upstream")
+        if balance not in ("least_outstanding", "ewma"):
+            raise ValueError(f"unknown balance: {balance}")
+        if pool is not None and pool_size is not None:
+            raise ValueError("pass either pool or pool_size")
+        self._upstreams = [_Upstream(url) for url in urls]
+        self._own_pool = pool_size is not None
+        self._pool = ConnectionPool(max_per_host=pool_size) if pool_size is not None else pool
+        self._conn_timeout = conn_timeout
+        self._timeout = timeout
+        self._stragglers: set[asyncio.Future[HttpResponse]] = set()
+        self._balance = balance
+        self._hedge_after = hedge_after
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._alpha = ewma_alpha
+        self._latency = _LatencyWindow()
+        self._report_every = report_every
+        self.hedged = 0  # requests sent to a second upstream
+        self.hedge_wins = 0  # ... and answered by it first
+        self.failovers = 0  # requests retried on another upstream after a failure
+
+    def latency_percentiles(self) -> dict[str, float]:
+        """of the recent signs, in ms"""
+        p50, p90, p99 = self._latency.percentiles(50, 90, 99)
+        return {"p50": p50, "p90": p90, "p99": p99}
+
+    def upstreams(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": u.url,
+                "state": u.state(now),
+                "outstanding": u.outstanding,
+                "ewma_ms": u.ewma,
+                "failures": u.failures,
+            }
+            for u in self._upstreams
+        ]
+
+    def _score(self, upstream: _Upstream) -> tuple[float, float]:
+        ewma = upstream.ewma or 0.0
+        if self._balance == "ewma":
+            return ewma * (upstream.outstanding + 1), upstream.outstanding
+        return upstream.outstanding, ewma
+
+    def _pick(self, exclude: Optional[_Upstream] = None) -> Optional[_Upstream]:
+        now = time.monotonic()
+        candidates = [u for u in self._upstreams if u is not exclude and u.available(now)]
+        if candidates:
+            return min(candidates, key=self._score)
+        if exclude is not None:  # nothing to hedge to
+            return None
+        # every upstream is ejected, try the one closest to coming back rather than failing outright
+        return min(self._upstreams, key=lambda u: u.open_until)
+
+    async def _attempt(self, upstream: _Upstream, body: bytes) -> HttpResponse:
+        is_trial = upstream.state(time.monotonic()) != "closed"
+        if is_trial:
+            upstream.trial = True
+        upstream.outstanding += 1
+        start_time = time.perf_counter()
+        try:
+            ret = await asyncio.wait_for(
+                HttpCat.request(
+                    "POST",
+                    upstream.url,
+                    {"Content-Type": "application/json"},
+                    body,
+                    follow_redirect=False,
+                    conn_timeout=self._conn_timeout,
+                    pool=self._pool,
+                    retry_stale=True,  # signing twice is harmless, the server may close idle connections first
+                ),
+                self._timeout,
+            )
+            if ret.code != 200:
+                raise ConnectionError(ret.code, ret.body)
+        except Exception as e:
+            _logger.debug(f"sign upstream {upstream.url} failed: {e!r}")
+            upstream.fail(time.monotonic(), self._failure_threshold, self._cooldown)
+            raise
+        else:
+            upstream.succeed((time.perf_counter() - start_time) * 1000, self._alpha, time.monotonic())
+            return ret
+        finally:
+            upstream.outstanding -= 1
+            if is_trial:
+                upstream.trial = False
+
+    def _let_finish(self, task: "asyncio.Future[HttpResponse]"):
+        """
+        an attempt nobody waits for anymore (a lost hedge) runs to its end instead of being cancelled,
+        so its keep-alive connection goes back to the pool and its latency still counts
+        """
+        self._stragglers.add(task)
+        task.add_done_callback(self._straggler_done)
+
+    def _straggler_done(self, task: "asyncio.Future[HttpResponse]"):
+        self._stragglers.discard(task)
+        if not task.cancelled():
+            task.exception()  # already counted by _attempt
+
+    async def _post(self, body: bytes) -> HttpResponse:
+        first = self._pick()
+        assert first
+        tasks = [asyncio.ensure_future(self._attempt(first, body))]
+        hedge: Optional[asyncio.Future[HttpResponse]] = None
+        try:
+            if self._hedge_after is not None and len(self._upstreams) > 1:
+                done, _ = await asyncio.wait(tasks, timeout=self._hedge_after)
+                if not done and (second := self._pick(exclude=first)):
+                    self.hedged += 1
+                    hedge = asyncio.ensure_future(self._attempt(second, body))
+                    tasks.append(hedge)
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if (error := task.exception()) is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                if not pending and len(tasks) == 1 and (second := self._pick(exclude=first)):
+                    self.failovers += 1  # failed before the hedge budget, try another upstream once
+                    tasks.append(asyncio.ensure_future(self._attempt(second, body)))
+                    pending = {tasks[-1]}
+            assert error
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    self._let_finish(task)
+
+    async def __call__(self, cmd: str, seq: int, buf: bytes) -> dict:
         if cmd not in SIGN_PKG_LIST:
             return {}
 
         params = {"cmd": cmd, "seq": seq, "src": buf.hex()}
         body = json.dumps(params).encode("utf-8")
-        headers = {
-            "Content-Type": "application/json"
-        }
-        start_time = time.time()
-        ret = await HttpCat.request("POST", upstream_url, body=body, header=headers)
-        _logger.debug(
-            f"signed for [{cmd}:{seq}]({round((time.time() - start_time) * 1000, 2)}ms)"
-        )
-        if ret.code != 200:
-            raise ConnectionError(ret.code, ret.body)
-
+        start_time = time.perf_counter()
+        ret = await self._post(body)
+        cost = (time.perf_counter() - start_time) * 1000
+        self._latency.add(cost)
+        _logger.debug(f"signed for [{cmd}:{seq}]({round(cost, 2)}ms)")
+        if self._report_every and not self._latency.count % self._report_every:
+            _logger.debug(
+                "sign latency {p50:.2f}/{p90:.2f}/{p99:.2f}ms (p50/p90/p99), ".format(**self.latency_percentiles())
+                + f"{self.hedged} hedged, {self.hedge_wins} won by the hedge"
+            )
         return ret.json()["value"]
 
-    return get_sign
\ No newline at end of file
+    async def close(self):
+        for task in list(self._stragglers):
+            task.cancel()
+        if self._own_pool and self._pool:  # a pool passed in, or the shared HttpCat.pool, has other users
+            self._pool.close()
+
+
+def sign_provider(upstream_url: Union[str, Sequence[str]], **kwargs) -> SignProvider:
+    """upstream_url: one url or a list of them, see `SignProvider` for the options"""
+    return SignProvider(upstream_url, **kwargs)
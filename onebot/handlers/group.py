@@ -36,7 +36,7 @@ from onebot.event.RequestEvent import (
     GroupRequestEvent
 )
 
-from config import Config, logger
+from config import logger
 
 import ws
 import json
@@ -47,8 +47,6 @@ from .decorator import init_handler
 async def GroupMessageEventHandler(client: Client, converter: MessageConverter, event: GroupMessage):
     content = await converter.convert_to_segments(event.msg_chain, "grp", group_id=event.grp_id)
     message_id = generate_message_id(event.grp_id, event.seq)
-    if Config.ignore_self and event.uin == client.uin:
-        return
     logger.onebot.info(f"Received message ({message_id}/{event.seq}) from group ({event.grp_id}): {event.msg}")
     msg_chain = event.msg_chain
     event_content = event.__dict__
@@ -0,0 +1,122 @@
+import pytest
+
+from lagrange.client.packet import PacketBuilder
+from lagrange.client.wtlogin import oicq
+from lagrange.info import DeviceInfo, SigInfo
+from lagrange.info.app import app_list
+from lagrange.utils.binary.reader import Reader
+from lagrange.utils.crypto.ecdh import ecdh
+from lagrange.utils.crypto.tea import qqtea_decrypt, qqtea_encrypt
+
+UIN = 10001
+
+
+def test_reserve_patch():
+    builder = PacketBuilder().write_u8(1)
+    offset = builder.reserve("I")
+    builder.write_bytes(b"abc")
+    assert offset == 1
+    assert builder.pack() == b"\x01\x00\x00\x00\x00abc"
+    builder.patch(offset, "I", 0xDEADBEEF)
+    assert builder.pack() == b"\x01\xde\xad\xbe\xefabc"
+
+
+def test_pack_into():
+    buffer = bytearray(b"\xff" * 12)
+    end = PacketBuilder().write_u16(1).write_bytes(b"abc").pack_into(buffer, 2)
+    end = PacketBuilder().write_u8(9).pack_into(buffer, end)
+    assert end == 8
+    assert buffer == b"\xff\xff\x00\x01abc\x09\xff\xff\xff\xff"
+
+
+def test_pack_into_encrypted():
+    key = bytes(range(16))
+    buffer = bytearray(64)
+    builder = PacketBuilder(encrypt_key=key).write_bytes(b"secret")
+    end = builder.pack_into(buffer)
+    assert qqtea_decrypt(bytes(buffer[:end]), key) == b"secret"
+
+
+def test_pack_into_too_small():
+    buffer = bytearray(4)
+    with pytest.raises(ValueError):
+        PacketBuilder().write_bytes(b"abcd").pack_into(buffer, 1)
+    assert buffer == bytes(4)  # left untouched
+
+
+@pytest.mark.parametrize("prefix", ["u8", "u16", "u32", "u64"])
+@pytest.mark.parametrize("with_prefix", [True, False])
+def test_length_prefixed_matches_write_bytes(prefix: str, with_prefix: bool):
+    builder = PacketBuilder()
+    with builder.length_prefixed(prefix, with_prefix):
+        builder.write_u32(7).write_bytes(b"section")
+    expected = PacketBuilder().write_bytes(
+        PacketBuilder().write_u32(7).write_bytes(b"section").pack(), prefix, with_prefix
+    )
+    assert builder.pack() == expected.pack()
+
+
+def test_length_prefixed_invalid_prefix():
+    with pytest.raises(ArithmeticError):
+        with PacketBuilder().length_prefixed("none"):
+            pass
+
+
+def _nested_uni_packet(seq: int, cmd: str, head: bytes, sig: SigInfo, device: DeviceInfo, body: bytes) -> bytes:
+    """the uni packet as it was built before, one buffer per nesting level"""
+    app = app_list["linux"]
+    sso_header = (
+        PacketBuilder()
+        .write_u32(seq)
+        .write_u32(app.sub_app_id)
+        .write_u32(2052)
+        .write_bytes(bytes.fromhex("020000000000000000000000"))
+        .write_bytes(sig.tgt, "u32")
+        .write_string(cmd, "u32")
+        .write_bytes(b"", "u32")
+        .write_bytes(bytes.fromhex(device.guid), "u32")
+        .write_bytes(b"", "u32")
+        .write_string(app.current_version, "u16")
+        .write_bytes(head, "u32")
+    ).pack()
+    sso_packet = PacketBuilder().write_bytes(sso_header, "u32").write_bytes(body, "u32").pack()
+    service = (
+        PacketBuilder()
+        .write_u32(12)
+        .write_u8(1 if sig.d2 else 2)
+        .write_bytes(sig.d2, "u32")
+        .write_u8(0)
+        .write_string(str(UIN), "u32")
+        .write_bytes(qqtea_encrypt(sso_packet, sig.d2_key))
+    ).pack()
+    return PacketBuilder().write_bytes(service, "u32").pack()
+
+
+def test_uni_packet_layout(monkeypatch):
+    monkeypatch.setattr(oicq.os, "urandom", bytes)  # fixed trace id
+    sig = SigInfo.new()
+    sig.tgt, sig.d2, sig.d2_key, sig.uid = b"tgt", b"d2", bytes(range(16)), "u_uid"
+    device = DeviceInfo.generate(UIN)
+    packet = oicq.build_uni_packet(UIN, 42, "Cmd.Test", {}, app_list["linux"], device, sig, b"body")
+
+    trace = f"00-{bytes(16).hex()}-{bytes(8).hex()}-01"
+    head = oicq.proto_encode({15: trace, 16: sig.uid})
+    expected = _nested_uni_packet(42, "Cmd.Test", head, sig, device, b"body")
+    # the TEA padding is random, compare everything up to the payload and the decrypted payload
+    assert Reader(packet).read_u32() == len(packet) == len(expected)
+    prefix = 4 + 4 + 1 + 4 + len(sig.d2) + 1 + 4 + len(str(UIN))
+    assert packet[:prefix] == expected[:prefix]
+    assert qqtea_decrypt(packet[prefix:], sig.d2_key) == qqtea_decrypt(expected[prefix:], sig.d2_key)
+
+
+def test_login_packet_length():
+    packet = oicq.build_login_packet(UIN, "wtlogin.login", app_list["linux"], b"body")
+    reader = Reader(packet)
+    assert reader.read_u8() == 2
+    assert reader.read_u16() == len(packet)
+    assert reader.read_u16() == 8001
+    assert reader.read_u16() == 2064
+    assert packet[-1] == 3
+    pub = ecdh["secp192k1"].public_key
+    start = packet.index(pub) + len(pub)
+    assert qqtea_decrypt(packet[start:-1], ecdh["secp192k1"].share_key) == b"body"
@@ -0,0 +1,78 @@
+import secrets
+
+import pytest
+
+from lagrange.utils.crypto.ecdh import ecdh as ecdh_keys
+from lagrange.utils.crypto.ecdh.curve import CURVE, EllipticPoint
+from lagrange.utils.crypto.ecdh.ecdh import (
+    ECDHProvider,
+    NativeECDHProvider,
+    _point_add,
+    _scalar_mult,
+    create_provider,
+)
+
+
+def _double_and_add(curve, k: int, point: EllipticPoint) -> EllipticPoint:
+    """the affine double-and-add the window multiplication replaced"""
+    pr, pa = EllipticPoint(0, 0), point
+    while k > 0:
+        if k & 1:
+            pr = _point_add(curve, pr, pa)
+        pa = _point_add(curve, pa, pa)
+        k >>= 1
+    return pr
+
+
+@pytest.mark.parametrize("name", ["secp192k1", "prime256v1"])
+def test_scalar_mult_matches_double_and_add(name: str):
+    curve = CURVE[name]
+    other = _double_and_add(curve, 12345, curve.G)
+    for k in [1, 2, 15, 16, 17, curve.N - 1, *(secrets.randbelow(curve.N - 1) + 1 for _ in range(4))]:
+        for point in (curve.G, other):
+            expected = _double_and_add(curve, k, point)
+            result = _scalar_mult(curve, k, point)
+            assert (result.x, result.y) == (expected.x, expected.y)
+
+
+def test_create_provider_backend():
+    assert isinstance(create_provider("prime256v1", CURVE["prime256v1"]), NativeECDHProvider)
+    assert isinstance(create_provider("secp192k1", CURVE["secp192k1"]), ECDHProvider)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+@pytest.mark.parametrize("hashed", [False, True])
+def test_native_agrees_with_pure(compress: bool, hashed: bool):
+    curve = CURVE["prime256v1"]
+    native = create_provider("prime256v1", curve)
+    pure = ECDHProvider(curve)
+    assert len(native.pack_public(compress)) == len(pure.pack_public(compress))
+    shared = native.key_exchange(pure.pack_public(False), hashed)
+    assert shared == pure.key_exchange(native.pack_public(False), hashed)
+    if compress:
+        assert native.key_exchange(pure.pack_public(True), hashed) == shared
+
+
+def test_pure_exchange_secp192k1():
+    curve = CURVE["secp192k1"]
+    alice, bob = ECDHProvider(curve), ECDHProvider(curve)
+    shared = alice.key_exchange(bob.pack_public(True), True)
+    assert len(shared) == 16
+    assert shared == bob.key_exchange(alice.pack_public(True), True)
+    assert shared == bob.key_exchange(alice.pack_public(False), True)
+
+
+@pytest.mark.parametrize("provider", [ECDHProvider, lambda c: create_provider("prime256v1", c)])
+def test_invalid_public_key(provider):
+    curve = CURVE["prime256v1"]
+    with pytest.raises(AssertionError):
+        provider(curve).key_exchange(b"\x04" + bytes(10), False)
+    with pytest.raises(AssertionError):
+        provider(curve).key_exchange(b"\x04" + bytes(range(64)), False)  # not on the curve
+
+
+def test_module_keys():
+    assert len(ecdh_keys["secp192k1"].public_key) == 25
+    assert len(ecdh_keys["secp192k1"].share_key) == 16
+    assert len(ecdh_keys["prime256v1"].public_key) == 65
+    assert len(ecdh_keys["prime256v1"].share_key) == 32
@@ -0,0 +1,307 @@
+import asyncio
+from dataclasses import dataclass
+
+import pytest
+
+from lagrange.client.client import Client
+from lagrange.client.event import Events, Overflow
+from lagrange.client.events import BaseEvent
+from lagrange.info import DeviceInfo, SigInfo
+from lagrange.info.app import app_list
+
+
+@dataclass
+class Ping(BaseEvent):
+    n: int
+
+
+@dataclass
+class Chatter(Ping):
+    pass
+
+
+class _Recorder:
+    def __init__(self, gate: bool = False):
+        self.handled: list[tuple[str, int]] = []
+        self.gate = asyncio.Event()
+        if not gate:
+            self.gate.set()
+        self.peak = 0
+        self.active = 0
+
+    async def __call__(self, _client, event: Ping):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await self.gate.wait()
+            await asyncio.sleep(0)
+            self.handled.append((type(event).__name__, event.n))
+        finally:
+            self.active -= 1
+
+
+async def _drain(events: Events):
+    while events.running or events.queue_depth:
+        await asyncio.sleep(0.001)
+    events.stop()
+
+
+def _bounded(recorder: _Recorder, **kwargs) -> Events:
+    events = Events(**kwargs)
+    events.subscribe(Ping, recorder)
+    events.subscribe(Chatter, recorder)
+    return events
+
+
+def test_unbounded_runs_a_task_per_event():
+    async def main():
+        recorder = _Recorder(gate=True)
+        events = _bounded(recorder)
+        for n in range(5):
+            events.emit(Ping(n), None)  # type: ignore
+        await asyncio.sleep(0)
+        running = events.running
+        recorder.gate.set()
+        await _drain(events)
+        return running, recorder.handled
+
+    running, handled = asyncio.run(main())
+    assert running == 5
+    assert sorted(handled) == [("Ping", n) for n in range(5)]
+
+
+def test_bounded_concurrency():
+    async def main():
+        recorder = _Recorder()
+        events = _bounded(recorder, max_concurrency=2)
+        for n in range(10):
+            await events.dispatch(Ping(n), None)  # type: ignore
+        await _drain(events)
+        return recorder, events.stats
+
+    recorder, stats = asyncio.run(main())
+    assert recorder.peak == 2
+    assert sorted(recorder.handled) == [("Ping", n) for n in range(10)]
+    assert (stats.emitted, stats.queued, stats.dropped) == (10, 10, 0)
+
+
+async def _fill(events: Events, *queued: Ping):
+    """one event running on the only worker, `queued` waiting behind it"""
+    await events.dispatch(Ping(0), None)  # type: ignore
+    await asyncio.sleep(0)
+    for event in queued:
+        await events.dispatch(event, None)  # type: ignore
+
+
+def test_block_waits_for_space():
+    async def main():
+        recorder = _Recorder(gate=True)
+        events = _bounded(recorder, max_concurrency=1, max_queue=1)
+        await _fill(events, Ping(1))
+        blocked = asyncio.create_task(events.dispatch(Ping(2), None))  # type: ignore
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        assert events.stats.blocked == 1
+        recorder.gate.set()
+        await blocked
+        await _drain(events)
+        return recorder.handled, events.stats
+
+    handled, stats = asyncio.run(main())
+    assert handled == [("Ping", 0), ("Ping", 1), ("Ping", 2)]
+    assert stats.dropped == 0
+
+
+def test_drop_oldest():
+    async def main():
+        recorder = _Recorder(gate=True)
+        events = _bounded(recorder, max_concurrency=1, max_queue=2, overflow=Overflow.DROP_OLDEST)
+        await _fill(events, Ping(1), Ping(2), Ping(3))
+        recorder.gate.set()
+        await _drain(events)
+        return recorder.handled, events.stats
+
+    handled, stats = asyncio.run(main())
+    assert handled == [("Ping", 0), ("Ping", 2), ("Ping", 3)]
+    assert stats.dropped == 1 and stats.dropped_by_type["Ping"] == 1
+
+
+def test_drop_type():
+    async def main():
+        recorder = _Recorder(gate=True)
+        events = _bounded(recorder, max_concurrency=1, max_queue=2, overflow="drop_type", droppable=[Chatter])
+        await _fill(events, Chatter(1), Ping(2), Ping(3), Chatter(4))  # Ping(3) evicts Chatter(1)
+        await events.dispatch(Chatter(5), None)  # type: ignore
+        blocked = asyncio.create_task(events.dispatch(Ping(6), None))  # type: ignore
+        await asyncio.sleep(0.01)
+        assert not blocked.done()  # nothing droppable left to evict
+        recorder.gate.set()
+        await blocked
+        await _drain(events)
+        return recorder.handled, events.stats
+
+    handled, stats = asyncio.run(main())
+    assert handled == [("Ping", 0), ("Ping", 2), ("Ping", 3), ("Ping", 6)]
+    assert stats.dropped_by_type == {"Chatter": 3}
+
+
+@pytest.mark.parametrize(
+    "overflow, handled", [(Overflow.BLOCK, [0, 1]), (Overflow.DROP_OLDEST, [0, 2]), (Overflow.DROP_TYPE, [0, 1])]
+)
+def test_emit_never_waits(overflow: Overflow, handled: list[int]):
+    async def main():
+        recorder = _Recorder(gate=True)
+        events = _bounded(recorder, max_concurrency=1, max_queue=1, overflow=overflow)
+        await _fill(events, Ping(1))
+        events.emit(Ping(2), None)  # type: ignore
+        depth = events.queue_depth
+        recorder.gate.set()
+        await _drain(events)
+        return depth, recorder.handled, events.stats
+
+    depth, result, stats = asyncio.run(main())
+    assert depth == 1  # the bound holds, where the policy blocks the emitted event is dropped
+    assert [n for _, n in result] == handled
+    assert stats.dropped == 1
+
+
+@pytest.mark.parametrize("kwargs", [{"max_concurrency": 0}, {"max_queue": 0}])
+def test_invalid_limits(kwargs):
+    with pytest.raises(ValueError):
+        Events(**kwargs)
+
+
+def _run(events: Events, *emitted: Ping, client=None):
+    """dispatch on a fresh loop, only for unbounded `Events`"""
+
+    async def main():
+        for event in emitted:
+            await events.dispatch(event, client)  # type: ignore
+        await _drain(events)
+
+    asyncio.run(main())
+
+
+def test_handlers_run_in_order():
+    calls = []
+
+    def handler(name: str, fail: bool = False):
+        async def handle(_client, event):
+            calls.append(name)
+            if fail:
+                raise RuntimeError(name)
+
+        return handle
+
+    events = Events()
+    events.subscribe(Ping, handler("default"))
+    events.subscribe(Ping, handler("late"), order=10)
+    events.subscribe(Ping, handler("early", fail=True), order=-1)  # a failing handler does not stop the rest
+    events.subscribe(Ping, handler("default2"))
+    _run(events, Ping(1))
+    assert calls == ["early", "default", "default2", "late"]
+
+
+def test_subscribe_twice_rejected():
+    recorder = _Recorder()
+    events = Events()
+    events.subscribe(Ping, recorder)
+    with pytest.raises(AssertionError):
+        events.subscribe(Ping, recorder)
+
+
+def test_unsubscribe():
+    first, second = _Recorder(), _Recorder()
+    events = Events()
+    events.subscribe(Ping, first)
+    events.subscribe(Ping, second)
+    assert events.unsubscribe(Ping, first) is first
+    with pytest.raises(KeyError):
+        events.unsubscribe(Ping, first)
+    _run(events, Ping(1))
+    assert (first.handled, second.handled) == ([], [("Ping", 1)])
+
+    assert events.unsubscribe(Ping) is second  # the only one left, as before several handlers per event
+    with pytest.raises(KeyError):
+        events.unsubscribe(Ping)
+    with pytest.raises(KeyError):
+        events.unsubscribe(Chatter, first)
+
+    events.subscribe(Ping, first, order=1)
+    events.subscribe(Ping, second)
+    assert events.unsubscribe(Ping) == [second, first]
+
+
+@pytest.mark.parametrize("bounded", [None, 2])
+def test_filters(bounded):
+    recorder = _Recorder()
+    events = _bounded(recorder, max_concurrency=bounded)
+    seen = []
+
+    def odd_only(client, event: Ping) -> bool:
+        seen.append(client)
+        return event.n % 2 == 1
+
+    async def main():
+        events.add_filter(Ping, odd_only)  # covers the Chatter subclass too
+        for event in (Ping(1), Ping(2), Chatter(3), Chatter(4)):
+            await events.dispatch(event, "client")  # type: ignore
+        await _drain(events)
+        assert sorted(recorder.handled) == [("Chatter", 3), ("Ping", 1)]
+        assert seen == ["client"] * 4
+        assert (events.stats.filtered, events.stats.emitted) == (2, 2)
+        if bounded:
+            assert events.stats.queued == 2  # dropped before reaching the queue
+
+        events.remove_filter(odd_only)
+        await events.dispatch(Ping(6), "client")  # type: ignore
+        await _drain(events)
+        assert ("Ping", 6) in recorder.handled
+
+    asyncio.run(main())
+
+
+def test_middlewares_wrap_handlers():
+    calls = []
+
+    def middleware(name: str, skip: bool = False):
+        async def wrap(client, event, call_next):
+            calls.append(f"{name} in")
+            if not skip:
+                await call_next()
+            calls.append(f"{name} out")
+
+        return wrap
+
+    async def handler(_client, event):
+        calls.append("handler")
+
+    events = Events()
+    events.subscribe(Ping, handler)
+    events.add_middleware(middleware("outer"))
+    events.add_middleware(middleware("inner"))
+    _run(events, Ping(1))
+    assert calls == ["outer in", "inner in", "handler", "inner out", "outer out"]
+
+    calls.clear()
+    gate = middleware("gate", skip=True)
+    events.add_middleware(gate)
+    _run(events, Ping(2))
+    assert "handler" not in calls
+    events.remove_middleware(gate)
+
+
+def test_client_shutdown_stops_the_workers():
+    async def main():
+        events = Events(max_concurrency=2)
+        client = Client(1, app_list["linux"], DeviceInfo.generate(1), SigInfo.new(), events=events)
+        events.subscribe(Ping, _Recorder())
+        await events.dispatch(Ping(1), client)
+        workers = list(events._workers)
+        client._task_clear()
+        await asyncio.sleep(0)
+        return workers, events._workers
+
+    workers, left = asyncio.run(main())
+    assert len(workers) == 2 and all(task.cancelled() for task in workers)
+    assert left == []
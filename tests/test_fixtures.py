@@ -0,0 +1,56 @@
+from io import BytesIO
+
+import pytest
+
+from benchmarks import fixtures
+from lagrange.client.highway.frame import read_frame
+from lagrange.client.network import _parse_packet
+from lagrange.pb.message.msg_push import MsgPush
+from lagrange.pb.service.group import GetGrpMemberInfoRsp
+from lagrange.pb.service.oidb import OidbResponse
+
+# the sso frames are TEA encrypted with random padding, only the plain payloads rebuild byte for byte
+DETERMINISTIC = [name for name in fixtures.FIXTURES if not name.startswith("sso_")]
+
+
+@pytest.mark.parametrize("name", DETERMINISTIC)
+def test_bin_files_up_to_date(name: str):
+    assert fixtures.load(name) == fixtures.FIXTURES[name]()
+
+
+def test_load_missing():
+    with pytest.raises(FileNotFoundError):
+        fixtures.load("no_such_fixture")
+
+
+@pytest.mark.parametrize("name", ["msg_push_text", "msg_push_image", "msg_push_quote", "msg_push_mini_app"])
+def test_msg_push_decodes(name: str):
+    push = MsgPush.decode(fixtures.load(name))
+    assert push.body.content_head.type == 82
+    assert push.body.response_head.rsp_grp.gid == fixtures.GRP_ID
+    assert push.body.message.body.content
+
+
+def test_member_list_decodes():
+    rsp = OidbResponse.decode(fixtures.load("member_list_page"))
+    page = GetGrpMemberInfoRsp.decode(rsp.data)
+    assert (rsp.cmd, rsp.sub_cmd) == (0xFE7, 3)
+    assert len(page.body) == 50
+    assert page.body[3].nickname == "member 3"
+
+
+def test_highway_frame_decodes():
+    head, body = read_frame(BytesIO(fixtures.load("highway_resp_frame")))
+    assert head.msg_head.command == "PicUp.DataUp"
+    assert body == b""
+
+
+def test_sso_frames_parse():
+    # strip the length prefix, like the read loop does
+    push = _parse_packet(fixtures.load("sso_push")[4:], fixtures.D2_KEY)
+    assert (push.seq, push.cmd) == (-1, "trpc.msg.olpush.OlPushService.MsgPush")
+    assert push.data == fixtures.msg_push_text()
+
+    rsp = _parse_packet(fixtures.load("sso_member_list_zlib")[4:], fixtures.D2_KEY)
+    assert rsp.cmd == "OidbSvcTrpcTcp.0xfe7_3"
+    assert rsp.data == fixtures.member_list_page()  # zlib inflated
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import struct
+from io import BytesIO
+
+import pytest
+
+from benchmarks.fixtures import UIN
+from benchmarks.fixtures.highway_server import HighwayServer
+from lagrange.client.client import Client
+from lagrange.info import DeviceInfo, SigInfo
+from lagrange.info.app import app_list
+
+BS = 1024
+DATA = os.urandom(BS * 10 + 100)  # 11 blocks, the last one short
+LAST = struct.pack("!Q", BS * 10)
+
+
+def _upload(*servers: HighwayServer, connections: int, upload=None):
+    """returns the final ext and the session key the upload left behind"""
+
+    async def main():
+        sig = SigInfo.new()
+        sig.tgt = bytes(64)
+        session = Client(UIN, app_list["linux"], DeviceInfo.generate(UIN), sig)._highway
+        if upload:
+            session._bdh_parallel_uploader = upload(session)
+        for server in servers:
+            await server.start()
+        try:
+            ext = await session.upload_controller(
+                BytesIO(DATA),
+                cmd_id=1004,
+                ticket=bytes(16),
+                ext=b"ext-initial",
+                addrs=[s.addr for s in servers],
+                bs=BS,
+                connections=connections,
+            )
+        finally:
+            for server in servers:
+                await server.stop()
+        return ext, session._session_key
+
+    return asyncio.run(main())
+
+
+def test_sequential_upload():
+    server = HighwayServer()
+    assert _upload(server, connections=1) == (b"ext" + LAST, b"ticket" + LAST)
+    assert server.assembled() == DATA
+    assert server.connections == 1
+    assert server.ext_seen[:2] == [b"ext-initial", b"ext" + bytes(8)]  # each block carries the previous answer
+
+
+def test_parallel_upload_matches_sequential():
+    server = HighwayServer(delay=0.005)
+    assert _upload(server, connections=4) == (b"ext" + LAST, b"ticket" + LAST)
+    assert server.assembled() == DATA
+    assert server.connections == 4
+    assert len(server.received) == 11
+
+
+def test_parallel_upload_stays_on_one_server():
+    servers = HighwayServer(delay=0.005), HighwayServer(delay=0.005)
+    assert _upload(*servers, connections=4)[0] == b"ext" + LAST
+    assert servers[0].assembled() == DATA
+    assert servers[0].connections == 4
+    assert servers[1].connections == 0  # blocks of one upload are not split across hosts
+
+
+def test_dead_server_fails_the_upload():
+    dying, other = HighwayServer(delay=0.005, fail_after=2), HighwayServer()
+    with pytest.raises(ConnectionError):
+        _upload(dying, other, connections=4)
+    assert len(dying.received) == 2
+    assert other.connections == 0
+    # the parallel sessions, then the sequential upload starting over, which only moves on after a timeout
+    assert dying.connections == 5
+
+
+def test_parallel_upload_over_the_connection_that_got_through():
+    server = HighwayServer(delay=0.005, max_connections=1)
+    assert _upload(server, connections=4)[0] == b"ext" + LAST
+    assert server.assembled() == DATA
+    assert server.connections == 4
+
+
+def test_falls_back_to_sequential():
+    server = HighwayServer()
+
+    def upload(session):
+        async def fail(cmd, addrs, files, *args, **kwargs):
+            for f in files:
+                f.read(BS * 3)  # partly sent, the fallback starts over from the top
+            raise ConnectionError("cannot upload, all server failure")
+
+        return fail
+
+    assert _upload(server, connections=4, upload=upload) == (b"ext" + LAST, b"ticket" + LAST)
+    assert server.assembled() == DATA
+    assert server.connections == 1
+
+
+def test_all_servers_fail():
+    server = HighwayServer(fail_after=0)
+    with pytest.raises(ConnectionError):
+        _upload(server, connections=4)
+    assert not server.received
@@ -0,0 +1,317 @@
+import asyncio
+import gzip
+from io import BytesIO
+from typing import Optional
+
+import pytest
+
+from lagrange.utils.httpcat import ConnectionPool, HttpCat
+
+BODY = b"hello, " * 100
+
+
+def _chunked(data: bytes, size: int = 100) -> bytes:
+    out = b""
+    for i in range(0, len(data), size):
+        part = data[i : i + size]
+        out += f"{len(part):x};ext=1\r\n".encode() + part + b"\r\n"
+    return out + b"0\r\n\r\n"
+
+
+class _Server:
+    """keep-alive http server, the path picks the response"""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests: list[str] = []
+        self.port = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    def _response(self, method: str, path: str) -> tuple[bytes, bool]:
+        """raw response and whether to hang up afterwards"""
+        keep = b"Connection: keep-alive\r\n"
+        if path == "/len":
+            body = b"" if method == "HEAD" else BODY
+            return b"HTTP/1.1 200 OK\r\n" + keep + f"Content-Length: {len(BODY)}\r\n\r\n".encode() + body, False
+        if path in ("/slow", "/arm"):
+            return b"HTTP/1.1 200 OK\r\n" + keep + b"Content-Length: 2\r\n\r\nok", False
+        if path == "/chunked":
+            return b"HTTP/1.1 200 OK\r\n" + keep + b"Transfer-Encoding: chunked\r\n\r\n" + _chunked(BODY), False
+        if path == "/gzip":
+            head = b"HTTP/1.1 200 OK\r\n" + keep + b"Content-Encoding: gzip\r\nTransfer-Encoding: chunked\r\n\r\n"
+            return head + _chunked(gzip.compress(BODY)), False
+        if path == "/redirect":
+            return b"HTTP/1.1 302 Found\r\n" + keep + b"Location: /chunked\r\nContent-Length: 3\r\n\r\nbye", False
+        if path == "/close":  # body delimited by the hang up
+            return b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n" + BODY, True
+        if path == "/bye":  # says keep-alive, hangs up anyway
+            return b"HTTP/1.1 200 OK\r\n" + keep + b"Content-Length: 2\r\n\r\nok", True
+        if path == "/empty":
+            return b"HTTP/1.1 204 No Content\r\n" + keep + b"\r\n", False
+        return b"HTTP/1.1 404 Not Found\r\n" + keep + b"Content-Length: 0\r\n\r\n", False
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        armed = False
+        try:
+            while line := await reader.readline():
+                if armed:  # hang up on the next request, after the pool health check passed
+                    break
+                method, path, _ = line.decode().split(" ", 2)
+                length = 0
+                while (header := await reader.readline()) not in (b"\r\n", b""):
+                    k, v = header.decode().rstrip("\r\n").split(": ", 1)
+                    if k.title() == "Content-Length":
+                        length = int(v)
+                await reader.readexactly(length)
+                self.requests.append(path)
+                if path == "/slow":
+                    await asyncio.sleep(0.02)
+                armed = path == "/arm"
+                data, hang_up = self._response(method, path)
+                writer.write(data)
+                await writer.drain()
+                if hang_up:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def __aenter__(self) -> "_Server":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *_):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        while self._writers:
+            await asyncio.sleep(0)
+
+
+@pytest.fixture
+def pool(monkeypatch) -> ConnectionPool:
+    pool = ConnectionPool(max_per_host=2)
+    monkeypatch.setattr(HttpCat, "pool", pool)
+    return pool
+
+
+def test_keep_alive_reuse(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            for _ in range(3):
+                rsp = await HttpCat.request("GET", server.url("/len"))
+                assert rsp.body == BODY
+            return server.connections
+
+    assert asyncio.run(main()) == 1
+    assert (pool.stats.opened, pool.stats.reused) == (1, 2)
+
+
+def test_explicit_pool(pool: ConnectionPool):
+    async def main():
+        own = ConnectionPool()
+        async with _Server() as server:
+            await HttpCat.request("GET", server.url("/len"), pool=own)
+            await HttpCat.request("GET", server.url("/len"), pool=own)
+        return own
+
+    own = asyncio.run(main())
+    assert own.stats.reused == 1
+    assert pool.stats.opened == 0
+
+
+def test_per_host_cap(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            await asyncio.gather(*(HttpCat.request("GET", server.url("/slow")) for _ in range(6)))
+            return server.connections
+
+    assert asyncio.run(main()) == 2
+    assert pool.stats.waited > 0
+
+
+def test_not_reused_when_closing(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            rsp = await HttpCat.request("GET", server.url("/close"))
+            assert rsp.body == BODY
+            await HttpCat.request("GET", server.url("/len"))
+            await HttpCat.request("GET", server.url("/len"), keep_alive=False)
+            return server.connections
+
+    assert asyncio.run(main()) == 3
+    assert pool.stats.opened == 2
+
+
+def test_peer_hang_up_detected(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            await HttpCat.request("GET", server.url("/bye"))
+            await asyncio.sleep(0.02)
+            (conn,) = pool._hosts[("127.0.0.1", server.port, False)].idle
+            assert not conn.healthy()
+            rsp = await HttpCat.request("GET", server.url("/len"))
+            assert rsp.body == BODY
+            return server.connections
+
+    assert asyncio.run(main()) == 2
+    assert pool.stats.unhealthy == 1
+
+
+def test_idle_reaper(pool: ConnectionPool):
+    pool.idle_timeout = 0.05
+
+    async def main():
+        async with _Server() as server:
+            await HttpCat.request("GET", server.url("/len"))
+            assert sum(pool.idle_count().values()) == 1
+            await asyncio.sleep(0.1)
+            return pool.idle_count()
+
+    assert asyncio.run(main()) == {}  # closed without another checkout
+    assert pool.stats.expired == 1
+
+
+def test_release_to_replaced_host(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            key = ("127.0.0.1", server.port, False)
+            conn, _ = await pool.acquire(key)
+            old = conn.owner
+            pool._hosts.clear()  # e.g. replaced by another loop
+            fresh, _ = await pool.acquire(key)
+            pool.release(conn, True)
+            assert conn.writer.is_closing()  # only the slot goes back, to its own host pool
+            assert old.slots._value == pool.max_per_host
+            assert pool._hosts[key].idle == []
+            pool.release(fresh, True)
+            assert pool.idle_count() == {key: 1}
+            pool.close()
+
+    asyncio.run(main())
+
+
+def test_bodiless_responses(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            head = await asyncio.wait_for(HttpCat.request("HEAD", server.url("/len")), 1)
+            empty = await asyncio.wait_for(HttpCat.request("GET", server.url("/empty")), 1)
+            await HttpCat.request("GET", server.url("/len"))
+            return head, empty, server.connections
+
+    head, empty, connections = asyncio.run(main())
+    assert (head.code, head.body, empty.code, empty.body) == (200, b"", 204, b"")
+    assert connections == 1
+
+
+@pytest.mark.parametrize(
+    "method, retry_stale, retried", [("GET", False, True), ("POST", False, False), ("POST", True, True)]
+)
+def test_stale_connection_retry(pool: ConnectionPool, method: str, retry_stale: bool, retried: bool):
+    async def main():
+        async with _Server() as server:
+            await HttpCat.request("GET", server.url("/arm"))
+            return await HttpCat.request(method, server.url("/len"), body=b"x", retry_stale=retry_stale)
+
+    if retried:  # idempotent, retried once on a fresh connection
+        assert asyncio.run(main()).body == BODY
+        assert pool.stats.retried == 1
+    else:
+        with pytest.raises((ConnectionError, asyncio.IncompleteReadError)):
+            asyncio.run(main())
+
+
+def test_request_reads_chunked_body(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            chunked = await HttpCat.request("GET", server.url("/chunked"))
+            compressed = await HttpCat.request("GET", server.url("/gzip"))
+            return chunked, compressed, server.connections
+
+    chunked, compressed, connections = asyncio.run(main())
+    assert chunked.body == BODY
+    assert compressed.decompressed_body == BODY
+    assert connections == 1
+
+
+def test_stream_reused_after_full_read(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            async with HttpCat.stream("GET", server.url("/chunked"), chunk_size=64) as rsp:
+                chunks = [chunk async for chunk in rsp]
+                assert rsp.consumed
+            async with HttpCat.stream("GET", server.url("/len")) as rsp:
+                assert await rsp.read() == BODY
+            return chunks, server.connections
+
+    chunks, connections = asyncio.run(main())
+    assert b"".join(chunks) == BODY
+    assert len(chunks) > 1 and max(map(len, chunks)) <= 100  # yielded as it arrives
+    assert connections == 1
+    assert pool.stats.reused == 1
+
+
+def test_stream_gzip(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            async with HttpCat.stream("GET", server.url("/gzip")) as rsp:
+                raw = b"".join([chunk async for chunk in rsp.iter_raw()])
+            async with HttpCat.stream("GET", server.url("/gzip")) as rsp:
+                body = await rsp.read()
+            return raw, body
+
+    raw, body = asyncio.run(main())
+    assert gzip.decompress(raw) == BODY  # iter_raw leaves the body compressed
+    assert body == BODY
+
+
+def test_partial_read_not_reused(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            async with HttpCat.stream("GET", server.url("/chunked"), chunk_size=64) as rsp:
+                async for _ in rsp:
+                    break
+                assert not rsp.consumed
+            assert pool.idle_count() == {}  # the rest of the body is still on it
+            async with HttpCat.stream("GET", server.url("/chunked")) as rsp:
+                assert await rsp.read() == BODY
+            return server.connections
+
+    assert asyncio.run(main()) == 2
+
+
+def test_download_to(pool: ConnectionPool, tmp_path):
+    async def main():
+        async with _Server() as server:
+            async with HttpCat.stream("GET", server.url("/gzip")) as rsp:
+                to_path = await rsp.download_to(tmp_path / "body")
+            buf = BytesIO()
+            async with HttpCat.stream("GET", server.url("/chunked")) as rsp:
+                to_file = await rsp.download_to(buf)
+            return to_path, to_file, buf.getvalue()
+
+    to_path, to_file, written = asyncio.run(main())
+    assert to_path == to_file == len(BODY)
+    assert (tmp_path / "body").read_bytes() == written == BODY
+
+
+def test_stream_follows_redirect(pool: ConnectionPool):
+    async def main():
+        async with _Server() as server:
+            async with HttpCat.stream("GET", server.url("/redirect")) as rsp:
+                body = await rsp.read()
+            return rsp.code, body, server.requests, server.connections
+
+    code, body, requests, connections = asyncio.run(main())
+    assert (code, body) == (200, BODY)
+    assert requests == ["/redirect", "/chunked"]
+    assert connections == 1  # the drained redirect went back to the pool
@@ -0,0 +1,224 @@
+import asyncio
+from typing import Optional
+
+import pytest
+
+from benchmarks.fixtures import D2_KEY, sso_frame
+from lagrange.client.network import ClientNetwork, FrameError
+from lagrange.client.wtlogin.sso import SSOPacket
+from lagrange.info import SigInfo
+
+
+async def _noop(*_):
+    pass
+
+
+def _network(**kwargs) -> ClientNetwork:
+    sig = SigInfo.new()
+    sig.d2_key = D2_KEY
+    return ClientNetwork(sig, asyncio.Queue(), _noop, _noop, **kwargs)
+
+
+def _frame(seq: int, payload: bytes = b"payload", cmd: str = "Test.Cmd", compress_type: int = 0) -> bytes:
+    """a frame as on_message reads it, without the length prefix"""
+    return sso_frame(cmd, payload, compress_type, seq)[4:]
+
+
+async def _receive(network: ClientNetwork, raw: bytes):
+    reader = asyncio.StreamReader()
+    reader.feed_data(raw)
+    network._reader = reader
+    await network.on_message(len(raw))
+
+
+async def _settle(network: ClientNetwork):
+    if network._push_tail is not None:
+        await asyncio.wait([network._push_tail])
+
+
+def _waiting(network: ClientNetwork, *seqs: int) -> list[asyncio.Future[SSOPacket]]:
+    loop = asyncio.get_running_loop()
+    futs = [loop.create_future() for _ in seqs]
+    network._wait_fut_map.update(zip(seqs, futs))
+    return futs
+
+
+@pytest.mark.parametrize("threshold", [0, 1])
+def test_response_resolves_waiter(threshold: int):
+    async def main():
+        network = _network(offload_threshold=threshold)
+        (fut,) = _waiting(network, 7)
+        await _receive(network, _frame(7, b"x" * 100))
+        await _settle(network)
+        packet = await fut
+        assert (packet.seq, packet.cmd, packet.data) == (7, "Test.Cmd", b"x" * 100)
+        return network.frame_stats
+
+    stats = asyncio.run(main())
+    assert (stats.inline_frames, stats.offloaded_frames) == ((1, 0) if threshold == 0 else (0, 1))
+
+
+def test_pushes_keep_wire_order():
+    async def main():
+        network = _network(offload_threshold=1000)
+        await _receive(network, _frame(-1, bytes(5000), compress_type=1))  # offloaded
+        await _receive(network, _frame(-2))  # inline, queued behind the first
+        await _settle(network)
+        store = network._push_store
+        return [store.get_nowait().seq for _ in range(store.qsize())]
+
+    assert asyncio.run(main()) == [-1, -2]
+
+
+def test_offloaded_failure_fails_its_request():
+    async def main():
+        network = _network(offload_threshold=1)
+        fut, other = _waiting(network, 7, 8)
+        await _receive(network, _frame(7, compress_type=99))
+        await _settle(network)
+        assert isinstance(fut.exception(), FrameError)
+        assert fut.exception().seq == 7
+        assert not other.done()
+        other.cancel()
+
+    asyncio.run(main())
+
+
+def test_undecryptable_frame_fails_every_request():
+    async def main():
+        network = _network(offload_threshold=1)
+        futs = _waiting(network, 7, 8)
+        raw = _frame(7)
+        await _receive(network, raw[:-8] + bytes(8))  # the last TEA block no longer decrypts
+        await _settle(network)
+        return [fut.exception() for fut in futs]
+
+    errors = asyncio.run(main())
+    assert all(errors)
+
+
+class _Writer:
+    def __init__(self, fail: Optional[Exception] = None, delay: float = 0):
+        self.rounds: list[list[int]] = []
+        self.fail = fail
+        self.delay = delay
+
+    def writelines(self, data):
+        self.rounds.append([len(b) for b in data])
+
+    async def drain(self):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise self.fail
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+def _connected(writer: _Writer, **kwargs) -> ClientNetwork:
+    network = _network(**kwargs)
+    network._writer = writer
+    network.conn_event.set()
+    return network
+
+
+def test_writes_batched_up_to_budget():
+    async def main():
+        writer = _Writer()
+        network = _connected(writer, write_batch_bytes=100)
+        await asyncio.gather(*(network.write(bytes(n)) for n in (30, 30, 30, 30, 500, 10, 10)))
+        await network.stop()
+        return writer.rounds
+
+    # a frame over the budget still goes out, alone
+    assert asyncio.run(main()) == [[30, 30, 30], [30], [500], [10, 10]]
+
+
+def test_write_waits_for_connection():
+    async def main():
+        writer = _Writer()
+        network = _network()
+        network._writer = writer
+        task = asyncio.create_task(network.write(b"abc"))
+        await asyncio.sleep(0.01)
+        assert not task.done() and writer.rounds == []
+        network.conn_event.set()
+        await task
+        await network.stop()
+        return writer.rounds
+
+    assert asyncio.run(main()) == [[3]]
+
+
+def test_write_failure_fails_the_batch():
+    async def main():
+        network = _connected(_Writer(ConnectionResetError()))
+        results = await asyncio.gather(network.write(b"a"), network.write(b"b"), return_exceptions=True)
+        await network.stop()
+        return results
+
+    assert [type(r) for r in asyncio.run(main())] == [ConnectionResetError, ConnectionResetError]
+
+
+def test_stop_mid_drain_cancels_the_batch():
+    async def main():
+        network = _connected(_Writer(delay=1))
+        writes = [asyncio.create_task(network.write(bytes(n))) for n in (1, 2)]
+        await asyncio.sleep(0.01)  # both taken into the batch, the drain still running
+        assert network._outbox == []
+        queued = asyncio.create_task(network.write(b"late"))
+        await asyncio.sleep(0)
+        await network.stop()
+        return await asyncio.wait_for(asyncio.gather(*writes, queued, return_exceptions=True), 1)
+
+    assert [type(r) for r in asyncio.run(main())] == [asyncio.CancelledError] * 3
+
+
+def _answer(network: ClientNetwork, seq: int):
+    return network._dispatch(SSOPacket(seq=seq, ret_code=0, extra="", session_id=b"", cmd="Test.Cmd"))
+
+
+def test_request_times_out():
+    async def main():
+        network = _connected(_Writer())
+        with pytest.raises(asyncio.TimeoutError):
+            await network.send(b"req", 5, timeout=0.02)  # type: ignore
+        assert network._wait_fut_map == {}
+        assert network._expire_handle is None
+        await network.stop()
+
+    asyncio.run(main())
+
+
+def test_earlier_deadline_rearms_timer():
+    async def main():
+        network = _connected(_Writer())
+        slow = asyncio.create_task(network.send(b"req", 1, timeout=5))  # type: ignore
+        fast = asyncio.create_task(network.send(b"req", 2, timeout=0.02))  # type: ignore
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(fast, 1)
+        assert not slow.done()
+        await _answer(network, 1)
+        packet = await slow
+        await network.stop()
+        return packet.seq
+
+    assert asyncio.run(main()) == 1
+
+
+def test_answered_requests_leave_the_heap():
+    async def main():
+        network = _connected(_Writer())
+        for seq in range(1, 301):
+            task = asyncio.create_task(network.send(b"req", seq, timeout=10))  # type: ignore
+            await asyncio.sleep(0)
+            await _answer(network, seq)
+            await task
+        size = len(network._deadlines)
+        await network.stop()
+        return size
+
+    assert asyncio.run(main()) < 100  # compacted, not one entry per request sent
@@ -0,0 +1,237 @@
+from typing import Optional
+
+import pytest
+
+from lagrange.utils.binary.protobuf import ProtoStruct, proto_decode, proto_encode, proto_field
+from lagrange.utils.binary.protobuf import models
+from lagrange.utils.binary.protobuf.coder import is_message
+from lagrange.utils.binary.reader import Reader
+
+
+class Inner(ProtoStruct):
+    a: int = proto_field(1, default=0)
+    s: str = proto_field(2, default="")
+
+
+class Outer(ProtoStruct):
+    x: int = proto_field(1)
+    inner: Optional[Inner] = proto_field(2, default=None)
+    items: list[Inner] = proto_field(3, default_factory=list)
+    blob: bytes = proto_field(4, default=b"")
+    flag: bool = proto_field(5, default=False)
+    nums: list[int] = proto_field(6, default_factory=list)
+
+
+def _outer() -> Outer:
+    return Outer(
+        x=300, inner=Inner(a=1, s="hi"), items=[Inner(a=2), Inner(s="x")], blob=b"\x00\x01", flag=True, nums=[1, 2, 3]
+    )
+
+
+@pytest.fixture
+def reflective(monkeypatch):
+    for cls in (Inner, Outer):
+        monkeypatch.setattr(cls, "__proto_compiled__", False)
+
+
+def test_compiled_roundtrip():
+    assert Outer.__proto_codec__ is not None
+    decoded = Outer.decode(_outer().encode())
+    assert repr(decoded) == repr(_outer())
+    assert decoded.inner.s == "hi"
+    assert [i.a for i in decoded.items] == [2, 0]
+
+
+def test_compiled_matches_reflective(reflective):
+    compiled = Outer._get_codec().encode(_outer())
+    assert _outer().encode() == compiled  # reflective encode
+    assert repr(Outer.decode(compiled)) == repr(Outer._get_codec().decode(compiled))
+
+
+def test_defaults_and_unknown_tags():
+    data = proto_encode({1: 7, 99: b"extra"})
+    decoded = Outer.decode(data)
+    assert (decoded.x, decoded.inner, decoded.items, decoded.blob) == (7, None, [], b"")
+
+
+def test_unknown_tags_logged_at_debug(capsys, monkeypatch):
+    monkeypatch.setattr(Outer, "__proto_debug__", True)
+    Outer.decode(proto_encode({1: 7, 99: 1}))
+    assert capsys.readouterr().out == ""  # through the logger, never printed
+
+
+def test_single_item_repeated_field():
+    decoded = Outer.decode(Outer(x=1, nums=[5], items=[Inner(a=9)]).encode())
+    assert decoded.nums == [5]
+    assert [i.a for i in decoded.items] == [9]
+
+
+def test_wire_compatible_with_proto_dict():
+    data = _outer().encode()
+    proto = proto_decode(data).proto
+    assert proto[1] == 300
+    assert proto[2][1] == 1
+    assert proto[6] == [1, 2, 3]
+
+
+class Lazy(ProtoStruct):
+    head: int = proto_field(1, default=0)
+    inner: Optional[Inner] = proto_field(2, default=None, lazy=True)
+    items: list[Inner] = proto_field(3, default_factory=list, lazy=True)
+
+
+def test_lazy_fields_decode_on_access():
+    obj = Lazy.decode(Lazy(head=1, inner=Inner(a=5, s="lazy"), items=[Inner(a=1), Inner(a=2)]).encode())
+    assert obj.head == 1
+    assert isinstance(obj._lazy_inner, memoryview)
+    assert obj.inner.s == "lazy"
+    assert not hasattr(obj, "_lazy_inner")  # decoded once, the result is kept
+    assert obj.inner is obj.inner
+    assert [i.a for i in obj.items] == [1, 2]
+
+
+def test_lazy_untouched_written_back():
+    data = Lazy(head=1, inner=Inner(a=5, s="lazy"), items=[Inner(a=1)]).encode()
+    obj = Lazy.decode(data)
+    assert obj.encode() == data
+    assert hasattr(obj, "_lazy_inner")  # encoding does not decode the slice
+
+
+def test_lazy_field_assignment_replaces_slice():
+    obj = Lazy.decode(Lazy(inner=Inner(a=5)).encode())
+    obj.inner = Inner(a=6)
+    assert Lazy.decode(obj.encode()).inner.a == 6
+
+
+def test_lazy_field_missing_uses_default():
+    obj = Lazy.decode(Lazy(head=3).encode())
+    assert obj.inner is None
+    assert obj.items == []
+
+
+def test_lazy_needs_message_type():
+    with pytest.raises(TypeError):
+
+        class Bad(ProtoStruct):
+            s: str = proto_field(1, default="", lazy=True)
+
+
+def test_reader_zero_copy():
+    data = bytearray(b"\x00\x03abcrest")
+    reader = Reader(data, zero_copy=True)
+    reader.read_u8()
+    view = reader.read_bytes_with_length("u8", False)
+    assert isinstance(view, memoryview)
+    assert bytes(view) == b"abc"
+    data[2] = ord("x")
+    assert bytes(view) == b"xbc"  # a view of the buffer, not a copy
+    assert isinstance(Reader(bytes(data)).read_bytes(2), bytes)
+
+
+def test_decode_over_memoryview():
+    data = _outer().encode()
+    view = memoryview(b"\xff" + data)[1:]
+    decoded = Outer.decode(view)
+    assert repr(decoded) == repr(_outer())
+    assert type(decoded.blob) is bytes and type(decoded.inner.s) is str  # leaves are copied out
+    proto = proto_decode(view).proto
+    assert proto[1] == 300 and type(proto[4]) is bytes
+
+
+def test_is_message():
+    assert is_message(_outer().encode())
+    assert is_message(b"")
+    assert not is_message(b"hello, world")
+    assert not is_message(b"\x08")  # truncated varint value
+    assert not is_message(b"\x0a\x05ab")  # length past the end
+    assert not is_message(b"\x00\x01")  # tag 0
+    assert not is_message(b"\x0b")  # start group wire type
+
+
+def test_strings_stay_bytes():
+    proto = proto_decode(proto_encode({1: "plain text", 2: {1: 5}})).proto
+    assert proto[1] == b"plain text"
+    assert proto[2] == {1: 5}
+
+
+def test_shallow_decode_into():
+    data = proto_encode({1: {2: {3: 7}}, 4: [{1: 1}, {1: 2}]})
+    decoded = proto_decode(data, 0)
+    assert isinstance(decoded[1], bytes)
+    assert decoded.into((1, 2, 3), int) == 7
+    assert decoded.into((1, 2), dict[int, int]) == {3: 7}
+    assert decoded.into(4, list[dict[int, int]]) == [{1: 1}, {1: 2}]
+
+
+class Loose(ProtoStruct, slots=False):
+    a: int = proto_field(1, default=0)
+
+
+def test_slots_generated():
+    obj = _outer()
+    assert not hasattr(obj, "__dict__")
+    assert set(Outer.__slots__) == {"x", "inner", "items", "blob", "flag", "nums"}
+    assert set(Lazy.__slots__) >= {"inner", "_lazy_inner"}
+    with pytest.raises(AttributeError):
+        obj.unknown = 1
+
+
+def test_slots_opt_out():
+    obj = Loose(a=1)
+    obj.extra = 2
+    assert obj.__dict__["extra"] == 2
+    assert Loose.decode(obj.encode()).a == 1
+
+
+def test_slots_subclass():
+    class Child(Inner):
+        c: int = proto_field(3, default=0)
+
+    obj = Child.decode(Child(a=1, s="s", c=3).encode())
+    assert (obj.a, obj.s, obj.c) == (1, "s", 3)
+    assert not hasattr(obj, "__dict__")
+    assert Child.__slots__ == ("c",)  # inherited slots are not redeclared
+
+
+class Strict(ProtoStruct, strict=True):
+    a: int = proto_field(1, default=0)
+    inner: Optional[Inner] = proto_field(2, default=None)
+
+
+@pytest.fixture
+def checked(monkeypatch):
+    calls = []
+
+    def check_type(value, typ):
+        calls.append(typ)
+        return True
+
+    monkeypatch.setattr(models, "check_type", check_type)
+    return calls
+
+
+@pytest.mark.parametrize("compiled", [True, False])
+def test_decode_skips_check_type(monkeypatch, checked, compiled: bool):
+    for cls in (Inner, Outer):
+        monkeypatch.setattr(cls, "__proto_compiled__", compiled)
+    expected = _outer()
+    checked.clear()  # construction by hand is checked
+    decoded = Outer.decode(expected.encode())
+    assert checked == []
+    assert repr(decoded) == repr(expected)
+
+
+@pytest.mark.parametrize("compiled", [True, False])
+def test_strict_checks_decoded_values(monkeypatch, checked, compiled: bool):
+    monkeypatch.setattr(Strict, "__proto_compiled__", compiled)
+    data = Strict(a=5, inner=Inner(a=1)).encode()
+    checked.clear()
+    assert Strict.decode(data).a == 5
+    assert int in checked and Optional[Inner] in checked
+
+
+def test_construction_still_checked():
+    with pytest.raises(TypeError):
+        Inner(a="1")
+    with pytest.raises(AttributeError):
+        Outer()
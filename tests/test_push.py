@@ -0,0 +1,196 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fixtures import GRP_ID, load
+from lagrange.client import server_push
+from lagrange.client.dispatcher import PushDispatcher
+from lagrange.client.server_push import MsgPushFilter, msg
+from lagrange.client.wtlogin.sso import SSOPacket
+from lagrange.pb.message.heads import ContentHead, Grp, ResponseHead
+from lagrange.pb.message.msg_push import MsgPush, MsgPushBody
+
+PUSH_CMD = "trpc.msg.olpush.OlPushService.MsgPush"
+
+
+def _push(key: str, n: int) -> SSOPacket:
+    return SSOPacket(seq=-n, ret_code=0, extra=key, session_id=b"", cmd="Test.Push")
+
+
+def test_shards_keep_order_per_key():
+    async def main():
+        handled: list[tuple[str, int]] = []
+
+        async def handler(sso: SSOPacket):
+            if sso.extra == "slow":
+                await asyncio.sleep(0.01)
+            handled.append((sso.extra, -sso.seq))
+
+        # int keys, str hashes are randomized per process
+        dispatcher = PushDispatcher(handler, lambda sso: 1 if sso.extra == "slow" else 2, shards=4)
+        dispatcher.start()
+        for n in range(1, 4):
+            dispatcher.submit(_push("slow", n))
+            dispatcher.submit(_push("fast", n))
+        await asyncio.sleep(0.1)
+        dispatcher.stop()
+        return handled
+
+    handled = asyncio.run(main())
+    assert [n for key, n in handled if key == "slow"] == [1, 2, 3]
+    assert [n for key, n in handled if key == "fast"] == [1, 2, 3]
+    assert handled[:3] == [("fast", 1), ("fast", 2), ("fast", 3)]  # did not wait behind the slow conversation
+
+
+def test_unkeyed_and_failing_pushes():
+    async def main():
+        handled = []
+
+        async def handler(sso: SSOPacket):
+            handled.append(sso.extra)
+            if sso.extra == "boom":
+                raise RuntimeError("handler failed")
+
+        def key(sso: SSOPacket):
+            if sso.extra == "broken":
+                raise ValueError("cannot key")
+            return None
+
+        dispatcher = PushDispatcher(handler, key, shards=2)
+        assert dispatcher.shard_of(_push("broken", 1)) == 0
+        dispatcher.start()
+        for name in ("boom", "broken", "after"):
+            dispatcher.submit(_push(name, 1))
+        assert dispatcher.queue_depths() == [3, 0]
+        await asyncio.sleep(0.01)
+        dispatcher.stop()
+        return handled
+
+    assert asyncio.run(main()) == ["boom", "broken", "after"]  # a failing handler does not stop its shard
+
+
+def test_full_shard_holds_back_the_feeder():
+    async def main():
+        gate = asyncio.Event()
+        handled = []
+
+        async def handler(sso: SSOPacket):
+            await gate.wait()
+            handled.append(-sso.seq)
+
+        dispatcher = PushDispatcher(handler, lambda sso: 1, shards=2, max_queue=2)
+        dispatcher.start()
+        await dispatcher.put(_push("a", 1))
+        await asyncio.sleep(0)  # taken by the worker, which waits on the gate
+        await dispatcher.put(_push("a", 2))
+        await dispatcher.put(_push("a", 3))
+        with pytest.raises(asyncio.QueueFull):
+            dispatcher.submit(_push("a", 4))
+        blocked = asyncio.create_task(dispatcher.put(_push("a", 4)))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        assert dispatcher.queue_depths()[dispatcher.shard_of(_push("a", 4))] == 2
+        gate.set()
+        await blocked
+        await asyncio.sleep(0.01)
+        dispatcher.stop()
+        return handled
+
+    assert asyncio.run(main()) == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("kwargs", [{"shards": 0}, {"max_queue": 0}])
+def test_limits_must_be_positive(kwargs):
+    with pytest.raises(ValueError):
+        PushDispatcher(None, None, **kwargs)  # type: ignore
+
+
+def _client():
+    return SimpleNamespace(uid="u_self", uin=1)
+
+
+def test_msg_push_key_group():
+    sso = SSOPacket(seq=-1, ret_code=0, extra="", session_id=b"", cmd=PUSH_CMD, data=load("msg_push_text"))
+    assert msg.msg_push_key(_client(), sso) == ("grp", GRP_ID)  # type: ignore
+
+
+@pytest.mark.parametrize("from_uid, to_uid", [("u_peer", "u_self"), ("u_self", "u_peer")])
+def test_msg_push_key_friend(from_uid: str, to_uid: str):
+    data = MsgPush(
+        body=MsgPushBody(
+            response_head=ResponseHead(from_uin=2, from_uid=from_uid, to_uin=1, to_uid=to_uid),
+            content_head=ContentHead(type=166, seq=1, timestamp=0, rand=0),
+        )
+    ).encode()
+    sso = SSOPacket(seq=-1, ret_code=0, extra="", session_id=b"", cmd=PUSH_CMD, data=data)
+    assert msg.msg_push_key(_client(), sso) == ("frd", "u_peer")  # type: ignore
+
+
+def test_push_decoded_once(monkeypatch):
+    calls = []
+    decode = MsgPush.decode
+
+    def counting(data):
+        calls.append(data)
+        return decode(data)
+
+    monkeypatch.setattr(MsgPush, "decode", counting)
+    sso = SSOPacket(seq=-1, ret_code=0, extra="", session_id=b"", cmd=PUSH_CMD, data=load("msg_push_text"))
+    msg.msg_push_key(_client(), sso)  # type: ignore
+    push = msg._decode_push(sso)
+    assert len(calls) == 1
+    assert push is sso.decoded
+    assert push.body.response_head.rsp_grp.gid == GRP_ID
+
+
+def _head(from_uin: int = 2, gid: int = 0) -> ResponseHead:
+    return ResponseHead(from_uin=from_uin, from_uid="u_peer", to_uin=1, rsp_grp=Grp(gid=gid) if gid else None)
+
+
+def test_server_push_exports():
+    namespace: dict = {}
+    exec("from lagrange.client.server_push import *", namespace)
+    for name in ("MsgPushFilter", "PushDeliver", "bind_services", "msg_push_handler", "msg_push_key"):
+        assert namespace[name] is getattr(server_push, name)
+    assert "server_kick_handler" in namespace
+
+
+def test_filter_group_messages():
+    client = _client()
+    push_filter = MsgPushFilter(ignore_self=True, ignore_uins={3}, ignore_groups={100})
+    assert push_filter.accept(client, msg.GRP_MSG_TYPE, _head(gid=200))  # type: ignore
+    assert not push_filter.accept(client, msg.GRP_MSG_TYPE, _head(from_uin=1, gid=200))  # type: ignore
+    assert not push_filter.accept(client, msg.GRP_MSG_TYPE, _head(gid=100))  # type: ignore
+    assert not push_filter.accept(client, msg.GRP_MSG_TYPE, _head(from_uin=3, gid=200))  # type: ignore
+    assert push_filter.dropped == 3
+
+
+def test_filter_friend_messages_and_predicates():
+    client = _client()
+    push_filter = MsgPushFilter(ignore_self=True, ignore_uins={3}, ignore_groups={100})
+    push_filter.predicates.append(lambda c, typ, head: head.from_uin != 4)
+    assert push_filter.accept(client, 166, _head(from_uin=1))  # type: ignore  # ignore_self is for groups only
+    assert not push_filter.accept(client, 166, _head(from_uin=3))  # type: ignore
+    assert not push_filter.accept(client, 166, _head(from_uin=4))  # type: ignore
+    assert not push_filter.accept(client, msg.GRP_MSG_TYPE, _head(from_uin=4, gid=200))  # type: ignore
+    assert push_filter.dropped == 3
+
+
+def test_filter_ignores_other_pushes():
+    push_filter = MsgPushFilter(ignore_uins={3}, predicates=[lambda *_: False])
+    assert push_filter.accept(_client(), 33, _head(from_uin=3))  # type: ignore  # member joined
+    assert push_filter.dropped == 0
+
+
+def test_filtered_push_not_parsed(monkeypatch):
+    async def parse(*_):
+        raise AssertionError("filtered push reached the parser")
+
+    monkeypatch.setattr(msg, "parse_grp_msg", parse)
+    client = _client()
+    client.msg_push_filter = MsgPushFilter(ignore_groups={GRP_ID})
+    sso = SSOPacket(seq=-1, ret_code=0, extra="", session_id=b"", cmd=PUSH_CMD, data=load("msg_push_image"))
+    assert asyncio.run(msg.msg_push_handler(client, sso)) is None  # type: ignore
+    assert client.msg_push_filter.dropped == 1
+    assert hasattr(sso.decoded.body, "_lazy_message")  # the message body was never decoded
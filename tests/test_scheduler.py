@@ -0,0 +1,143 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from lagrange.client.client import Client
+from lagrange.client.scheduler import Priority, SendScheduler, classify
+from lagrange.client.wtlogin.sso import SSOPacket
+from lagrange.info import DeviceInfo, SigInfo
+from lagrange.info.app import app_list
+from lagrange.pb.service.oidb import OidbResponse
+
+UIN = 10001
+
+
+@pytest.mark.parametrize(
+    "cmd, priority",
+    [
+        ("wtlogin.login", Priority.CONTROL),
+        ("trpc.qq_new_tech.status_svc.StatusService.SsoHeartBeat", Priority.CONTROL),
+        ("MessageSvc.PbSendMsg", Priority.SEND_MESSAGE),
+        ("OidbSvcTrpcTcp.0xfe7_3", Priority.QUERY),
+        ("OidbSvcTrpcTcp.0xFE5_2", Priority.QUERY),  # group list, a single call
+        ("OidbSvcTrpcTcp.0xFD4_1", Priority.BULK),
+        ("OidbSvcTrpcTcp.0xfd4_1", Priority.BULK),
+    ],
+)
+def test_classify(cmd: str, priority: Priority):
+    assert classify(cmd) is priority
+
+
+def _sent_priorities(call) -> list[Priority]:
+    """priorities `call(client)` sent its requests with"""
+
+    async def main():
+        client = Client(UIN, app_list["linux"], DeviceInfo.generate(UIN), SigInfo.new())
+        sent = []
+
+        async def send_uni_packet(command: str, buf: bytes, priority=None) -> SSOPacket:
+            sent.append(classify(command) if priority is None else priority)
+            data = OidbResponse(cmd=0, sub_cmd=0, ret_code=0, err_msg="", data=b"").encode()
+            return SSOPacket(seq=1, ret_code=0, extra="", session_id=b"", cmd=command, data=data)
+
+        client.send_uni_packet = send_uni_packet  # type: ignore
+        with contextlib.suppress(AttributeError):  # the empty answer does not parse into every response
+            await call(client)
+        return sent
+
+    return asyncio.run(main())
+
+
+def test_only_paginated_syncs_are_bulk():
+    assert _sent_priorities(lambda c: c.get_grp_list()) == [Priority.QUERY]
+    assert _sent_priorities(lambda c: c.get_grp_member_info(1, "u")) == [Priority.QUERY]
+    assert _sent_priorities(lambda c: c.get_grp_members(1)) == [Priority.BULK]
+    assert _sent_priorities(lambda c: c.get_friend_list()) == [Priority.BULK]
+
+
+async def _hold(scheduler: SendScheduler, priority: Priority, order: list, release: asyncio.Event, name=None):
+    async with scheduler.slot(priority):
+        order.append(priority if name is None else name)
+        await release.wait()
+
+
+def test_admitted_in_priority_order():
+    async def main():
+        scheduler = SendScheduler(max_in_flight=1)
+        order: list = []
+        release = asyncio.Event()
+        first = asyncio.create_task(_hold(scheduler, Priority.BULK, order, release, "first"))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(_hold(scheduler, p, order, release, n))
+            for n, p in enumerate([Priority.BULK, Priority.QUERY, Priority.SEND_MESSAGE, Priority.QUERY])
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.queue_depths() == {
+            Priority.CONTROL: 0,
+            Priority.SEND_MESSAGE: 1,
+            Priority.QUERY: 2,
+            Priority.BULK: 1,
+        }
+        release.set()
+        await asyncio.gather(first, *waiters)
+        return order
+
+    # send message first, FIFO within a class
+    assert asyncio.run(main()) == ["first", 2, 1, 3, 0]
+
+
+def test_control_never_queued():
+    async def main():
+        scheduler = SendScheduler(max_in_flight=1)
+        release = asyncio.Event()
+        held = asyncio.create_task(_hold(scheduler, Priority.QUERY, [], release))
+        await asyncio.sleep(0)
+        async with scheduler.slot(Priority.CONTROL):
+            assert scheduler.running()[Priority.CONTROL] == 1
+            assert scheduler.in_flight == 2
+        release.set()
+        await held
+        return scheduler.in_flight
+
+    assert asyncio.run(main()) == 0
+
+
+def test_class_limit():
+    async def main():
+        scheduler = SendScheduler()
+        peak = 0
+
+        async def bulk():
+            nonlocal peak
+            async with scheduler.slot(Priority.BULK):
+                peak = max(peak, scheduler.running()[Priority.BULK])
+                # a query still gets through while bulk is at its limit
+                async with scheduler.slot(Priority.QUERY):
+                    pass
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(bulk() for _ in range(10)))
+        return peak
+
+    assert asyncio.run(main()) == 4
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def main():
+        scheduler = SendScheduler(max_in_flight=1)
+        release = asyncio.Event()
+        held = asyncio.create_task(_hold(scheduler, Priority.QUERY, [], release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(_hold(scheduler, Priority.QUERY, [], release))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depths()[Priority.QUERY] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.queue_depths()[Priority.QUERY] == 0
+        release.set()
+        await held
+        return scheduler.running()
+
+    assert all(n == 0 for n in asyncio.run(main()).values())
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from benchmarks.fixtures.sign_server import SignServer
+from lagrange.utils.httpcat import ConnectionPool, _PooledConn
+from lagrange.utils.sign import SignProvider
+
+CMD = "MessageSvc.PbSendMsg"
+
+
+async def _sign(provider: SignProvider, seq: int = 1) -> dict:
+    return await provider(CMD, seq, b"\x00" * 16)
+
+
+def _run(test, *servers: SignServer):
+    async def main():
+        for server in servers:
+            await server.start()
+        try:
+            return await test()
+        finally:
+            for server in servers:
+                await server.stop()
+
+    return asyncio.run(main())
+
+
+def test_signs_over_pooled_connections():
+    server = SignServer()
+
+    async def test():
+        provider = SignProvider(server.url, pool_size=2, report_every=0)
+        pool = provider._pool
+        for seq in range(5):
+            value = await _sign(provider, seq)
+            assert (value["cmd"], value["seq"]) == (CMD, seq)
+        assert server.connections == 1  # sequential signs reuse one keep-alive connection
+        await asyncio.gather(*(_sign(provider, seq) for seq in range(20)))
+        assert server.connections <= 2  # capped per host
+        assert pool.stats.reused >= 4
+        await provider.close()
+        assert pool.idle_count() == {}  # a pool of its own is closed with the provider
+
+    _run(test, server)
+    assert server.requests == 25
+
+
+def test_unsigned_command_skips_the_server():
+    server = SignServer()
+
+    async def test():
+        provider = SignProvider(server.url, ConnectionPool(), report_every=0)
+        assert await provider("OidbSvcTrpcTcp.0xfe5_2", 1, b"") == {}
+        await provider.close()
+
+    _run(test, server)
+    assert server.requests == 0
+
+
+def test_passed_pool_left_open():
+    server = SignServer()
+
+    async def test():
+        pool = ConnectionPool()
+        provider = SignProvider(server.url, pool, report_every=0)
+        await _sign(provider)
+        await provider.close()
+        return pool.idle_count()
+
+    assert list(_run(test, server).values()) == [1]  # still there for the other users of the pool
+
+
+def test_config_validation():
+    with pytest.raises(ValueError):
+        SignProvider([])
+    with pytest.raises(ValueError):
+        SignProvider("http://127.0.0.1/sign", ConnectionPool(), pool_size=2)
+    with pytest.raises(ValueError):
+        SignProvider("http://127.0.0.1/sign", balance="random")  # type: ignore
+
+
+def test_failover_and_ejection():
+    dead, healthy = SignServer(), SignServer()
+    dead.down = True
+
+    async def test():
+        provider = SignProvider(
+            [dead.url, healthy.url], ConnectionPool(), hedge_after=None, failure_threshold=2, report_every=0
+        )
+        for seq in range(6):
+            assert (await _sign(provider, seq))["seq"] == seq  # every sign still succeeds
+        states = [u["state"] for u in provider.upstreams()]
+        await provider.close()
+        return provider, states
+
+    provider, states = _run(test, dead, healthy)
+    assert states == ["open", "closed"]
+    assert provider.failovers == 2  # ejected after the second failure, not tried again
+    assert healthy.requests == 6
+
+
+def test_cooldown_trial():
+    flaky, healthy = SignServer(), SignServer()
+    flaky.down = True
+
+    async def test():
+        provider = SignProvider(
+            [flaky.url, healthy.url],
+            ConnectionPool(),
+            hedge_after=None,
+            failure_threshold=1,
+            cooldown=0.05,
+            report_every=0,
+        )
+        await _sign(provider)
+        assert provider.upstreams()[0]["state"] == "open"
+        await asyncio.sleep(0.06)
+        assert provider.upstreams()[0]["state"] == "half_open"
+
+        await _sign(provider)  # the trial fails, ejected again
+        assert provider.upstreams()[0]["state"] == "open"
+
+        flaky.down = False
+        await asyncio.sleep(0.06)
+        await _sign(provider)  # the trial succeeds
+        states = [u["state"] for u in provider.upstreams()]
+        await provider.close()
+        return states
+
+    assert _run(test, flaky, healthy) == ["closed", "closed"]
+    assert flaky.requests == 1
+
+
+def test_hedge_wins_and_loser_finishes():
+    slow, fast = SignServer(delay=0.2), SignServer(delay=0.001)
+
+    async def test():
+        pool = ConnectionPool()
+        provider = SignProvider([slow.url, fast.url], pool, hedge_after=0.02, report_every=0)
+        start = time.perf_counter()
+        await _sign(provider)
+        elapsed = time.perf_counter() - start
+        assert (provider.hedged, provider.hedge_wins) == (1, 1)
+        assert elapsed < 0.15
+        assert len(provider._stragglers) == 1
+
+        await asyncio.sleep(0.3)  # the lost attempt is not cancelled, it runs to its end
+        assert not provider._stragglers
+        slow_upstream = provider.upstreams()[0]
+        assert slow_upstream["ewma_ms"] is not None and slow_upstream["state"] == "closed"
+        assert len(pool.idle_count()) == 2  # both connections went back to the pool
+        await provider.close()
+
+    _run(test, slow, fast)
+    assert (slow.requests, fast.requests) == (1, 1)
+    assert slow.connections == 1
+
+
+def test_trial_flag_reset_only_by_the_trial():
+    server = SignServer(delay=0.05)
+
+    async def test():
+        provider = SignProvider(server.url, ConnectionPool(), report_every=0)
+        upstream = provider._upstreams[0]
+        body = json.dumps({"cmd": CMD, "seq": 1, "src": ""}).encode()
+        regular = asyncio.create_task(provider._attempt(upstream, body))
+        await asyncio.sleep(0.01)
+        upstream.open_until = time.monotonic() - 1  # ejected meanwhile, cooldown over
+        trial = asyncio.create_task(provider._attempt(upstream, body))
+        await asyncio.sleep(0.01)
+        assert upstream.trial
+        await regular
+        assert upstream.trial  # the regular request did not set it, it leaves it alone
+        await trial
+        assert not upstream.trial
+        assert upstream.state(time.monotonic()) == "closed"
+        await provider.close()
+
+    _run(test, server)
+
+
+def test_sign_retried_after_server_closed_idle_connection(monkeypatch):
+    server = SignServer(keep_alive=0.02)
+
+    async def test():
+        pool = ConnectionPool()
+        provider = SignProvider(server.url, pool, report_every=0)
+        await _sign(provider, 1)
+        await asyncio.sleep(0.05)  # closed by the server while idle
+        # the close lands right after the checkout, the health check cannot see it
+        monkeypatch.setattr(_PooledConn, "healthy", lambda self: True)
+        assert (await _sign(provider, 2))["seq"] == 2
+        await provider.close()
+        return pool.stats
+
+    stats = _run(test, server)
+    assert (stats.reused, stats.retried, stats.opened) == (1, 1, 2)
+    assert (server.requests, server.connections) == (2, 2)
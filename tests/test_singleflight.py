@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from lagrange.client.client import Client
+from lagrange.client.singleflight import IDEMPOTENT_OIDB, SingleFlight
+from lagrange.client.wtlogin.sso import SSOPacket
+from lagrange.info import DeviceInfo, SigInfo
+from lagrange.info.app import app_list
+from lagrange.pb.service.oidb import OidbRequest, OidbResponse
+
+UIN = 10001
+
+
+def test_concurrent_callers_share_a_call():
+    async def main():
+        flight: SingleFlight[int] = SingleFlight()
+        calls = []
+
+        async def fetch(n: int) -> int:
+            calls.append(n)
+            await asyncio.sleep(0.01)
+            return n
+
+        results = await asyncio.gather(
+            *(flight.do("a", lambda: fetch(1)) for _ in range(5)), flight.do("b", lambda: fetch(2))
+        )
+        assert flight.in_flight == 0
+        assert await flight.do("a", lambda: fetch(3)) == 3  # landed, the next call is a new round trip
+        return results, calls, flight
+
+    results, calls, flight = asyncio.run(main())
+    assert results == [1, 1, 1, 1, 1, 2]
+    assert calls == [1, 2, 3]
+    assert (flight.calls, flight.hits) == (3, 4)
+
+
+def test_exception_shared():
+    async def main():
+        flight: SingleFlight[int] = SingleFlight()
+
+        async def fail() -> int:
+            await asyncio.sleep(0.01)
+            raise ConnectionError("down")
+
+        return await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True), flight
+
+    results, flight = asyncio.run(main())
+    assert [type(r) for r in results] == [ConnectionError, ConnectionError]
+    assert flight.calls == 1
+
+
+def test_cancelled_caller_does_not_cancel_others():
+    async def main():
+        flight: SingleFlight[str] = SingleFlight()
+
+        async def fetch() -> str:
+            await asyncio.sleep(0.02)
+            return "ok"
+
+        first = asyncio.create_task(flight.do("k", fetch))
+        second = asyncio.create_task(flight.do("k", fetch))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        result = await second
+        assert first.cancelled()
+        return result
+
+    assert asyncio.run(main()) == "ok"
+
+
+def test_no_credential_commands_in_defaults():
+    assert (0x102A, 0) not in IDEMPOTENT_OIDB  # cookies
+    assert (0x102A, 1) not in IDEMPOTENT_OIDB  # client key
+    assert (0xFE5, 2) in IDEMPOTENT_OIDB
+
+
+@pytest.mark.parametrize(
+    "cmd, sub_cmd, bodies, expected",
+    [
+        (0xFE5, 2, [b"same", b"same", b"same"], 1),  # coalesced
+        (0xFE5, 2, [b"one", b"two", b"one"], 2),  # keyed by body
+        (0x102A, 1, [b"same", b"same"], 2),  # not in the allowlist
+    ],
+)
+def test_send_oidb_svc_coalesces(cmd: int, sub_cmd: int, bodies: list[bytes], expected: int):
+    async def main():
+        sig = SigInfo.new()
+        client = Client(UIN, app_list["linux"], DeviceInfo.generate(UIN), sig)
+        sent = []
+
+        async def send_uni_packet(command: str, buf: bytes, priority=None) -> SSOPacket:
+            req = OidbRequest.decode(buf)
+            sent.append(req.data)
+            await asyncio.sleep(0.01)
+            rsp = OidbResponse(cmd=req.cmd, sub_cmd=req.sub_cmd, data=req.data, ret_code=0, err_msg="")
+            return SSOPacket(seq=1, ret_code=0, extra="", session_id=b"", cmd=command, data=rsp.encode())
+
+        client.send_uni_packet = send_uni_packet  # type: ignore
+        results = await asyncio.gather(*(client.send_oidb_svc(cmd, sub_cmd, body) for body in bodies))
+        assert [r.data for r in results] == bodies
+        return sent
+
+    assert len(asyncio.run(main())) == expected
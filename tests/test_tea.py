@@ -0,0 +1,92 @@
+import asyncio
+import os
+import random
+
+import pytest
+
+from lagrange.client.network import ClientNetwork
+from lagrange.info import SigInfo
+from lagrange.utils.crypto import tea
+
+_rnd = random.Random(0)
+SIZES = [*range(24), *(_rnd.randint(24, 600) for _ in range(24))]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_word_tea_matches_reference(size: int):
+    key, data = os.urandom(16), os.urandom(size)
+    enc = tea._TEA(key).encrypt(data)
+    assert tea._WordTEA(key).encrypt(data) == enc
+    assert tea._WordTEA(key).decrypt(enc) == data
+    assert tea._TEA(key).decrypt(enc) == data
+
+
+def test_empty_input():
+    key = os.urandom(16)
+    enc = tea._WordTEA(key).encrypt(b"")
+    assert enc == tea._TEA(key).encrypt(b"")
+    assert len(enc) == 16  # padding only
+    assert tea._WordTEA(key).decrypt(enc) == b""
+
+
+@pytest.mark.parametrize("size", [0, 7, 8, 100])
+def test_tampered_padding(size: int):
+    key = os.urandom(16)
+    enc = bytearray(tea._TEA(key).encrypt(os.urandom(size)))
+    enc[-1] ^= 0x01  # the trailing zeros no longer decrypt to zeros
+    assert tea._TEA(key).decrypt(bytes(enc)) is None
+    assert tea._WordTEA(key).decrypt(bytes(enc)) is None
+
+
+@pytest.mark.parametrize("size", [16, 24, 64, 256])
+def test_garbage_like_reference(size: int):
+    key, garbage = os.urandom(16), os.urandom(size)
+    assert tea._WordTEA(key).decrypt(garbage) == tea._TEA(key).decrypt(garbage)
+
+
+def test_wrong_key():
+    data = os.urandom(64)
+    enc = tea._WordTEA(bytes(16)).encrypt(data)
+    assert tea._WordTEA(bytes(range(16))).decrypt(enc) != data
+
+
+@pytest.mark.skipif(tea.TEA_BACKEND != "ftea", reason="ftea not installed")
+@pytest.mark.parametrize("size", SIZES[::4])
+def test_ftea_matches_reference(size: int):
+    key, data = os.urandom(16), os.urandom(size)
+    enc = tea._TEA(key).encrypt(data)
+    assert tea.FTEA(key).encrypt_qq(data) == enc
+    assert tea.FTEA(key).decrypt_qq(enc) == data
+
+
+def test_cipher_cached_per_key():
+    key = os.urandom(16)
+    cipher = tea.tea_cipher(key)
+    assert tea.tea_cipher(bytes(key)) is cipher
+    assert tea.tea_cipher(bytearray(key)) is cipher  # mutable keys are copied into the cache key
+    assert tea.tea_cipher(os.urandom(16)) is not cipher
+
+
+def test_cipher_cache_bounded():
+    tea._cached_cipher.cache_clear()
+    for _ in range(100):
+        tea.tea_cipher(os.urandom(16))
+    assert tea._cached_cipher.cache_info().currsize == 32
+
+
+def test_qqtea_helpers():
+    key, data = os.urandom(16), os.urandom(100)
+    enc = tea.qqtea_encrypt(data, key)
+    assert tea.qqtea_decrypt(enc, key) == data
+    assert tea.tea_cipher(key).decrypt(enc) == data
+    assert tea._TEA(key).decrypt(enc) == data
+
+
+def test_network_cipher_follows_d2_key():
+    sig = SigInfo.new()
+    network = ClientNetwork(sig, asyncio.Queue(), None, None)  # type: ignore
+    first = network.d2_cipher
+    assert network.d2_cipher is first
+    sig.d2_key = os.urandom(16)
+    assert network.d2_cipher is not first
+    assert network.d2_cipher.secret_key == sig.d2_key